@@ -0,0 +1,293 @@
+'''
+Incremental re-runs of a pipeline over a refreshed copy of its input data.
+
+A run in incremental mode (with `settings.incremental_state_path` set) keeps, in that
+directory, a fingerprint of every input row (keyed by a record number column such as
+`star_record_no` or `pi_record_no`) and a lineage table mapping each row to the
+resources it contributed to (recorded by the output writers as resources are written):
+
+  fingerprints.tsv    KEY <tab> FINGERPRINT
+  lineage.tsv         KEY <tab> MODEL <tab> URI
+  lineage-PID.tsv     the lineage recorded during the current run, consolidated into
+                      lineage.tsv when the run is finished
+
+A later run compares the fingerprints of the refreshed input with the stored ones. The
+resources that any changed (or removed) row contributed to are removed from the output,
+and only the rows that contributed to those resources are modeled again, merging with
+the untouched output of the previous run. Unchanged rows that are modeled again only
+write the resources being regenerated: their other resources are still complete in the
+output of the previous run, and merging them again would duplicate any sub-objects
+that are assigned random ids.
+
+Lineage is attributed to the row currently being processed, so incremental runs
+require the serial `GraphExecutor` (which processes each row completely before reading
+the next).
+'''
+
+import os
+import csv
+import uuid
+import hashlib
+from contextlib import contextmanager
+from collections import defaultdict, namedtuple
+
+from bonobo.config import Configurable, Option
+
+import settings
+from pipeline.util import matching_files
+
+IncrementalPlan = namedtuple('IncrementalPlan', ('rows', 'changed', 'affected', 'fingerprints'))
+IncrementalPlan.__doc__ = '''
+The rows to model in an incremental run (`rows`), those of them that are new or changed
+(`changed`), the `(model, uri)` resources to regenerate (`affected`), and the
+fingerprints of all input rows (`fingerprints`).
+'''
+
+_current_row = None
+_active_plan = None
+
+def current_row():
+	'''Return the key of the input row currently being processed, if any.'''
+	return _current_row
+
+def set_current_row(key):
+	global _current_row
+	_current_row = key
+
+def set_active_plan(plan):
+	'''
+	Set the `IncrementalPlan` of the current run, which restricts the resources written
+	for unchanged rows (see `LineageRecorder.record`).
+	'''
+	global _active_plan
+	_active_plan = plan
+
+@contextmanager
+def no_current_row():
+	'''
+	Suspend the attribution of written resources to the current input row (e.g. while
+	buffered output is flushed).
+	'''
+	global _current_row
+	key = _current_row
+	_current_row = None
+	try:
+		yield
+	finally:
+		_current_row = key
+
+def row_fingerprint(row, previous=None):
+	'''
+	Return the fingerprint of the CSV `row` (a sequence of strings). If another row with
+	the same key already had the fingerprint `previous`, the two are combined.
+	'''
+	h = hashlib.sha1()
+	if previous:
+		h.update(previous.encode('ascii'))
+	h.update('\x1f'.join(row).encode('utf-8'))
+	return h.hexdigest()
+
+def csv_fingerprints(fs, pattern, field_names, key):
+	'''
+	Return a `dict` mapping the `key` column value of every row in the CSV files in the
+	`fs` filesystem that match `pattern` to the fingerprint of the row(s).
+	'''
+	i = field_names.index(key)
+	fingerprints = {}
+	for path in matching_files(fs, '/', pattern):
+		with fs.open(path, newline='') as csvfile:
+			for row in csv.reader(csvfile):
+				if len(row) > i:
+					k = row[i]
+					fingerprints[k] = row_fingerprint(row, fingerprints.get(k))
+	return fingerprints
+
+class IncrementalState:
+	'''
+	The fingerprints and lineage of the input rows of a pipeline, persisted in `directory`.
+	'''
+	def __init__(self, directory):
+		self.directory = directory
+
+	def _path(self, name):
+		return os.path.join(self.directory, name)
+
+	def fingerprints(self):
+		data = {}
+		path = self._path('fingerprints.tsv')
+		if os.path.exists(path):
+			with open(path, 'r', encoding='utf-8') as fh:
+				for line in fh:
+					k, fp = line.rstrip('\n').split('\t')
+					data[k] = fp
+		return data
+
+	def _read_lineage(self, path, lineage):
+		with open(path, 'r', encoding='utf-8') as fh:
+			for line in fh:
+				k, model, uri = line.rstrip('\n').split('\t')
+				lineage[k].add((model, uri))
+
+	def lineage(self):
+		'''Return a `dict` mapping row keys to the set of `(model, uri)` resources they contributed to.'''
+		lineage = defaultdict(set)
+		path = self._path('lineage.tsv')
+		if os.path.exists(path):
+			self._read_lineage(path, lineage)
+		return lineage
+
+	def recorded_lineage(self):
+		'''Return the lineage recorded (by all processes) during the current run.'''
+		lineage = defaultdict(set)
+		if os.path.isdir(self.directory):
+			for name in sorted(os.listdir(self.directory)):
+				if name.startswith('lineage-') and name.endswith('.tsv'):
+					self._read_lineage(self._path(name), lineage)
+		return lineage
+
+	def plan(self, fingerprints):
+		'''
+		Return the `IncrementalPlan` for a run over input rows with the given
+		`fingerprints`. A run without any stored state models every row.
+		'''
+		previous = self.fingerprints()
+		if not previous:
+			return IncrementalPlan(set(fingerprints), set(fingerprints), set(), fingerprints)
+
+		lineage = self.lineage()
+		changed = {k for k, fp in fingerprints.items() if previous.get(k) != fp}
+		changed |= set(previous) - set(fingerprints)
+		affected = set()
+		for k in changed:
+			affected |= lineage.get(k, set())
+		changed = {k for k in changed if k in fingerprints}
+		rows = set(changed)
+		rows |= {k for k, resources in lineage.items() if k in fingerprints and not resources.isdisjoint(affected)}
+		return IncrementalPlan(rows, changed, affected, fingerprints)
+
+	def commit(self, plan):
+		'''
+		Persist the fingerprints of `plan` and the lineage of the finished run: the stored
+		lineage of the rows that were not modeled again, and the lineage recorded for those
+		that were.
+		'''
+		os.makedirs(self.directory, exist_ok=True)
+		if _recorder:
+			_recorder.close()
+		set_active_plan(None)
+		lineage = {k: v for k, v in self.lineage().items() if k in plan.fingerprints and k not in plan.rows}
+		recorded = self.recorded_lineage()
+		lineage.update(recorded)
+
+		tmp = self._path('lineage.tsv.tmp')
+		with open(tmp, 'w', encoding='utf-8') as fh:
+			for k in sorted(lineage):
+				for model, uri in sorted(lineage[k]):
+					fh.write(f'{k}\t{model}\t{uri}\n')
+		os.replace(tmp, self._path('lineage.tsv'))
+
+		tmp = self._path('fingerprints.tsv.tmp')
+		with open(tmp, 'w', encoding='utf-8') as fh:
+			for k in sorted(plan.fingerprints):
+				fh.write(f'{k}\t{plan.fingerprints[k]}\n')
+		os.replace(tmp, self._path('fingerprints.tsv'))
+
+		for name in os.listdir(self.directory):
+			if name.startswith('lineage-') and name.endswith('.tsv'):
+				os.remove(self._path(name))
+
+def remove_resources(resources, output_path, rewriter):
+	'''
+	Remove the output files of the `(model, uri)` `resources` from `output_path`, whether
+	or not they have already been renamed by the UUID rewriting pass (using `rewriter`,
+	a `pipeline.util.rewriting.UUIDRewriter`). Returns the number of files removed.
+	'''
+	count = 0
+	for model, uri in resources:
+		names = {rewriter.uuid_for(uri), str(uuid.uuid3(uuid.NAMESPACE_URL, uri))}
+		for uu in names:
+			for path in (os.path.join(output_path, model, uu[:2], f'{uu}.json'), os.path.join(output_path, model, f'{uu}.json')):
+				if os.path.exists(path):
+					os.remove(path)
+					count += 1
+	return count
+
+class LineageRecorder:
+	'''
+	Records the resources written for the current input row in the lineage table of
+	this process in `directory`.
+	'''
+	def __init__(self, directory):
+		self.directory = directory
+		self.fh = None
+		self.pid = None
+		self.row = None
+		self.seen = set()
+
+	def _handle(self):
+		pid = os.getpid()
+		if self.fh is None or pid != self.pid:
+			os.makedirs(self.directory, exist_ok=True)
+			self.pid = pid
+			self.fh = open(os.path.join(self.directory, f'lineage-{pid}.tsv'), 'a', encoding='utf-8')
+		return self.fh
+
+	def close(self):
+		if self.fh:
+			self.fh.close()
+		self.fh = None
+		self.row = None
+		self.seen = set()
+
+	def record(self, model, uri):
+		'''
+		Record that the current row contributed to the resource `uri` of `model`. Returns
+		`False` if the resource must not be written, because the row is unchanged and the
+		resource is not being regenerated by the active plan.
+		'''
+		row = _current_row
+		if row is None:
+			return True
+		if row != self.row:
+			self.row = row
+			self.seen = set()
+		if (model, uri) not in self.seen:
+			self.seen.add((model, uri))
+			fh = self._handle()
+			fh.write(f'{row}\t{model}\t{uri}\n')
+			fh.flush()
+		plan = _active_plan
+		return plan is None or row in plan.changed or (model, uri) in plan.affected
+
+_recorder = None
+
+def lineage_recorder():
+	'''
+	Return the lineage recorder for the state directory configured by
+	`settings.incremental_state_path`, or `None` if incremental runs are not enabled.
+	'''
+	global _recorder
+	if not settings.incremental_state_path:
+		return None
+	if _recorder is None or _recorder.directory != settings.incremental_state_path:
+		_recorder = LineageRecorder(settings.incremental_state_path)
+	return _recorder
+
+class IncrementalRowFilter(Configurable):
+	'''
+	Pass through only the input rows whose `key` column value is in the `rows` of an
+	`IncrementalPlan`, marking each as the current row to which written resources are
+	attributed.
+	'''
+	key = Option(str, required=True)
+	rows = Option(required=True)
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(self, *args, **kwargs)
+		self.__name__ = f'{type(self).__name__} ({self.key})'
+
+	def __call__(self, data: dict):
+		k = data.get(self.key)
+		if k in self.rows:
+			set_current_row(k)
+			yield data
@@ -1,40 +1,246 @@
+import os
+import sys
+import time
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 from bonobo.config import Configurable, Option
 
-class ArchesWriter(Configurable):
-	endpoint = Option(default="http://localhost:8001/resources/")
-	auth_endpoint = Option(default="http://localhost:8001/o/token/")
-	username = Option(default="admin")
-	password = Option(default="admin")
-	client_id = Option(default="OaGs0HfnBNd2VpI4Hnrc8nhOSTbnV1Q3O1CPjlX6")
+class ArchesUploadError(Exception):
+	pass
 
-	current_auth = ""
-	refresh_token = ""
+class ArchesClient:
+	'''
+	An HTTP client for the Arches resources API, using a pooled `requests.Session` that
+	may be shared by several threads.
 
-	def get_auth(self):
-		resp = requests.post(self.auth_endpoint, data={'username': self.username,
-			'password': self.password, 'grant_type': 'password',
-			'client_id': self.client_id})
-		data = resp.json()
+	Requests that fail with a server error (or a connection error) are retried with
+	exponential backoff, and a request that is denied with a 401 response is retried
+	after refreshing the access token.
+	'''
+	RETRY_STATUS = {429, 500, 502, 503, 504}
+
+	def __init__(self, endpoint, auth_endpoint, username, password, client_id, *, pool_size=10, retries=5, backoff=0.5, timeout=60):
+		self.endpoint = endpoint
+		self.auth_endpoint = auth_endpoint
+		self.username = username
+		self.password = password
+		self.client_id = client_id
+		self.retries = retries
+		self.backoff = backoff
+		self.timeout = timeout
+		self.current_auth = ''
+		self.refresh_token = ''
+		self.auth_lock = threading.Lock()
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+		self.session.mount('http://', adapter)
+		self.session.mount('https://', adapter)
+
+	def _token_request(self, data):
+		resp = self.session.post(self.auth_endpoint, data=data, timeout=self.timeout)
+		try:
+			data = resp.json()
+		except ValueError:
+			data = {}
 		if 'access_token' in data:
 			self.current_auth = data['access_token']
-			self.refresh_token = data['refresh_token']
-		else:
-			print(data)
+			self.refresh_token = data.get('refresh_token', '')
+			return True
+		return False
 
-	def __call__(self, data: dict):
-		# Grab serialized JSON-LD and send it to the endpoint, with Auth
-		if not self.current_auth:
+	def get_auth(self):
+		'''Request a new access token using the username and password.'''
+		ok = self._token_request({
+			'username': self.username,
+			'password': self.password,
+			'grant_type': 'password',
+			'client_id': self.client_id
+		})
+		if not ok:
+			raise ArchesUploadError(f'Failed to authenticate with {self.auth_endpoint}')
+
+	def refresh_auth(self, stale_token):
+		'''
+		Replace the access token `stale_token` that was denied by the server, using the
+		refresh token if possible (if another thread has already replaced the token, it
+		is not requested again).
+		'''
+		with self.auth_lock:
+			if self.current_auth != stale_token:
+				return
+			if self.refresh_token:
+				ok = self._token_request({
+					'refresh_token': self.refresh_token,
+					'grant_type': 'refresh_token',
+					'client_id': self.client_id
+				})
+				if ok:
+					return
 			self.get_auth()
-		headers = {"Authorization": "Bearer %s" % self.current_auth,
-			"Accept": "application/ld+json"}
 
-		print(data['_OUTPUT'])
-		ep = self.endpoint + ("%s/%s" % (data['_ARCHES_MODEL'], data['uuid']))
-		resp = requests.put(ep, headers=headers,data=data['_OUTPUT'])
-		# XXX if this gets denied, retry after using the refresh token
+	def resource_url(self, model, uu):
+		return self.endpoint + f'{model}/{uu}'
+
+	def put(self, model, uu, body):
+		'''
+		PUT the serialized JSON-LD `body` as the resource `uu` of the Arches `model`,
+		returning the response. Raises `ArchesUploadError` if the request still fails
+		after all retries.
+		'''
+		if not self.current_auth:
+			with self.auth_lock:
+				if not self.current_auth:
+					self.get_auth()
+		url = self.resource_url(model, uu)
+		refreshed = False
+		for attempt in range(self.retries + 1):
+			token = self.current_auth
+			headers = {
+				'Authorization': f'Bearer {token}',
+				'Accept': 'application/ld+json'
+			}
+			try:
+				resp = self.session.put(url, headers=headers, data=body, timeout=self.timeout)
+			except (requests.ConnectionError, requests.Timeout) as e:
+				error = str(e)
+			else:
+				if resp.status_code == 401 and not refreshed:
+					self.refresh_auth(token)
+					refreshed = True
+					continue
+				elif resp.status_code not in self.RETRY_STATUS:
+					if resp.status_code >= 400:
+						raise ArchesUploadError(f'PUT {url} failed with status {resp.status_code}: {resp.text}')
+					return resp
+				error = f'status {resp.status_code}'
+			if attempt < self.retries:
+				time.sleep(self.backoff * (2 ** attempt))
+		raise ArchesUploadError(f'PUT {url} failed after {self.retries + 1} attempts ({error})')
+
+class UploadCheckpoint:
+	'''
+	A record of the resource UUIDs that have been successfully uploaded, appended to
+	`filename` as each upload completes, so that an interrupted upload can be resumed.
+	'''
+	def __init__(self, filename):
+		self.filename = filename
+		self.completed = set()
+		self.lock = threading.Lock()
+		if os.path.exists(filename):
+			with open(filename) as fh:
+				self.completed = {line.strip() for line in fh if line.strip()}
+		self.fh = open(filename, 'a', buffering=1)
 
-		print(resp.text)
-		return resp
+	def __contains__(self, uu):
+		return uu in self.completed
 
+	def add(self, uu):
+		with self.lock:
+			self.completed.add(uu)
+			self.fh.write(f'{uu}\n')
 
+	def close(self):
+		self.fh.close()
+
+class ArchesUploader:
+	'''
+	Upload resources to Arches concurrently with a pool of `concurrency` threads, with at
+	most `max_in_flight` uploads queued or running at once (`submit` blocks until one
+	completes). Resources recorded in the `checkpoint` are skipped.
+	'''
+	def __init__(self, client, *, concurrency=8, max_in_flight=None, checkpoint=None, verbose=False):
+		self.client = client
+		self.checkpoint = checkpoint
+		self.verbose = verbose
+		self.executor = ThreadPoolExecutor(max_workers=concurrency)
+		self.slots = threading.BoundedSemaphore(max_in_flight or 2 * concurrency)
+		self.lock = threading.Lock()
+		self.uploaded = 0
+		self.skipped = 0
+		self.failed = []
+
+	def submit(self, model, uu, body):
+		if self.checkpoint is not None and uu in self.checkpoint:
+			self.skipped += 1
+			return
+		self.slots.acquire()
+		try:
+			future = self.executor.submit(self._upload, model, uu, body)
+		except:
+			self.slots.release()
+			raise
+		future.add_done_callback(lambda _: self.slots.release())
+
+	def _upload(self, model, uu, body):
+		try:
+			self.client.put(model, uu, body)
+		except Exception as e:
+			with self.lock:
+				self.failed.append((uu, str(e)))
+			print(f'*** Failed to upload {uu}: {e}', file=sys.stderr)
+			return
+		if self.checkpoint is not None:
+			self.checkpoint.add(uu)
+		with self.lock:
+			self.uploaded += 1
+			if self.verbose and self.uploaded % 1000 == 0:
+				print(f'\r{self.uploaded} resources uploaded', end='', file=sys.stderr)
+
+	def close(self):
+		'''Wait for all submitted uploads to complete.'''
+		self.executor.shutdown(wait=True)
+		if self.checkpoint is not None:
+			self.checkpoint.close()
+		if self.verbose:
+			print(f'\nUploaded {self.uploaded} resources ({self.skipped} already uploaded, {len(self.failed)} failed)', file=sys.stderr)
+
+class ArchesWriter(Configurable):
+	'''
+	Upload the serialized JSON-LD (`_OUTPUT`) of each resource to Arches. Uploads are run
+	concurrently in the background; call `flush` to wait for them to complete (this also
+	happens when the process exits).
+	'''
+	endpoint = Option(default="http://localhost:8001/resources/")
+	auth_endpoint = Option(default="http://localhost:8001/o/token/")
+	username = Option(default="admin")
+	password = Option(default="admin")
+	client_id = Option(default="OaGs0HfnBNd2VpI4Hnrc8nhOSTbnV1Q3O1CPjlX6")
+	concurrency = Option(int, default=8)
+	retries = Option(int, default=5)
+	checkpoint = Option(required=False) # filename of the record of uploaded resource UUIDs
+	verbose = Option(bool, default=False)
+
+	uploader = None
+
+	def get_uploader(self):
+		if not self.uploader:
+			client = ArchesClient(
+				self.endpoint,
+				self.auth_endpoint,
+				self.username,
+				self.password,
+				self.client_id,
+				pool_size=self.concurrency,
+				retries=self.retries
+			)
+			checkpoint = UploadCheckpoint(self.checkpoint) if self.checkpoint else None
+			self.uploader = ArchesUploader(client, concurrency=self.concurrency, checkpoint=checkpoint, verbose=self.verbose)
+			atexit.register(self.flush)
+		return self.uploader
+
+	def flush(self):
+		'''Wait for all the pending uploads to complete.'''
+		if self.uploader:
+			uploader = self.uploader
+			self.uploader = None
+			uploader.close()
+			atexit.unregister(self.flush)
+			return uploader
+
+	def __call__(self, data: dict):
+		self.get_uploader().submit(data['_ARCHES_MODEL'], data['uuid'], data['_OUTPUT'])
+		return data
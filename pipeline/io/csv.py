@@ -1,12 +1,19 @@
 import os
 import sys
 import csv
+import time
 import fnmatch
 import warnings
+import multiprocessing
+from operator import itemgetter
 
 from bonobo.constants import NOT_MODIFIED
 from bonobo.nodes.io.file import FileReader
 from bonobo.config import Configurable, Option, Service
+from fs.errors import NoSysPath
+from pipeline.record import Record
+from pipeline.nodes.basic import CSVFieldsText
+from pipeline.util import matching_files
 
 class CurriedCSVReader(Configurable):
 	'''
@@ -33,39 +40,235 @@ class CurriedCSVReader(Configurable):
 	)
 	verbose = Option(
 		bool,
-		default=False
+		default=False,
+		__doc__='''Report the path, and the rows/sec and bytes/sec throughput, of each file read.''',
 	)
 	field_names = Option()
+	columns = Option(
+		required=False,
+		__doc__='''If set, only these columns (a subset of `field_names`) are included in the yielded records.''',
+	)
+	preserve_fields = Option(
+		required=False,
+		__doc__='''If set, the key in which to store the text of the complete row (see `PreserveCSVFields`).''',
+	)
+	buffer_size = Option(
+		int,
+		default=1024*1024,
+		__doc__='''The buffer size to use when reading files.''',
+	)
 
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
 		self.count = 0
+		names = self.field_names
+		self.getter = None
+		self.record_names = names
+		if names and self.columns is not None:
+			columns = set(self.columns)
+			indexes = [i for i, name in enumerate(names) if name in columns]
+			self.record_names = [names[i] for i in indexes]
+			if len(indexes) == 1:
+				i = indexes[0]
+				self.getter = lambda row: (row[i],)
+			else:
+				self.getter = itemgetter(*indexes)
+		if self.record_names and not any(name in Record._slot_names for name in self.record_names):
+			self.make_record = Record.from_fields
+		else:
+			self.make_record = lambda names, values: Record(zip(names, values))
 
 	def read(self, path, *, fs):
+		limit = self.limit
+		if not(limit) or (limit and self.count < limit):
+			if self.verbose:
+				sys.stderr.write('============================== %s\n' % (path,))
+			start = time.time()
+			start_count = self.count
+			with fs.open(path, newline='', buffering=self.buffer_size) as csvfile:
+				complete = yield from self.records(path, csv.reader(csvfile))
+			if self.verbose:
+				self.report(path, self.count - start_count, time.time() - start, fs.getsize(path) if complete else None)
+
+	def records(self, path, rows):
+		'''
+		Yield the records for the parsed CSV `rows` of the file at `path`. Returns `False`
+		if the row limit was reached before all rows were consumed.
+		'''
 		limit = self.limit
 		count = self.count
 		names = self.field_names
+		width = len(names) if names else 0
+		record_names = self.record_names
+		getter = self.getter
+		make_record = self.make_record
+		preserve_key = self.preserve_fields
 		error_emitted = False
-		if not(limit) or (limit and count < limit):
-			if self.verbose:
-				sys.stderr.write('============================== %s\n' % (path,))
-			with fs.open(path, newline='') as csvfile:
-				r = csv.reader(csvfile)
-				for line, row in enumerate(r):
-					if not error_emitted:
-						if len(row) != len(names):
-							error_emitted = True
-							warnings.warn(f'Column counts for header and content do not match ({len(names)} != {len(row)}) in {path}:{line+1}')
-					if limit and count >= limit:
-						break
-					count += 1
-					if names:
-						d = {}
-						for i in range(len(names)):
-							d[names[i]] = row[i]
-						yield d
-					else:
-						yield row
+		complete = True
+		try:
+			for line, row in enumerate(rows):
+				if not error_emitted:
+					if len(row) != width:
+						error_emitted = True
+						warnings.warn(f'Column counts for header and content do not match ({width} != {len(row)}) in {path}:{line+1}')
+				if limit and count >= limit:
+					complete = False
+					break
+				count += 1
+				if names:
+					if len(row) < width:
+						# zip would silently drop the trailing columns of a short row
+						raise ValueError(f'Row has fewer columns than the header ({len(row)} < {width}) in {path}:{line+1}')
+					d = make_record(record_names, getter(row) if getter else row)
+					if preserve_key:
+						d[preserve_key] = CSVFieldsText(names, row)
+					yield d
+				else:
+					yield row
+		finally:
 			self.count = count
+		return complete
+
+	def report(self, path, rows, elapsed, size=None):
+		elapsed = max(elapsed, 1e-6)
+		msg = f'{path}: {rows} rows in {elapsed:.2f}s ({rows/elapsed:.0f} rows/sec'
+		if size is not None:
+			msg += f', {size/elapsed:.0f} bytes/sec'
+		sys.stderr.write(msg + ')\n')
 
 	__call__ = read
+
+def _parse_csv_files(tasks, slots, ready, encoding, buffer_size, chunk_size):
+	'''
+	Worker process for `ParallelCSVReader`: parse each `(index, path, slot)` task from the
+	`tasks` queue, putting `index` on the `ready` queue (if any), and then the chunks of rows on the
+	bounded `slots[slot]` queue, followed by `None` when the file is complete (or the
+	exception on failure).
+	'''
+	for index, path, slot in iter(tasks.get, None):
+		results = slots[slot]
+		if ready is not None:
+			ready.put(index)
+		try:
+			with open(path, newline='', encoding=encoding, buffering=buffer_size) as csvfile:
+				chunk = []
+				for row in csv.reader(csvfile):
+					chunk.append(row)
+					if len(chunk) >= chunk_size:
+						results.put(chunk)
+						chunk = []
+				if chunk:
+					results.put(chunk)
+			results.put(None)
+		except Exception as e:
+			results.put(e)
+
+class ParallelCSVReader(CurriedCSVReader):
+	'''
+	A source node that reads all CSV files matching `pattern`, parsing the files
+	concurrently in a pool of worker processes. Parsed rows are streamed back to this
+	node in chunks, and turned into records exactly as in `CurriedCSVReader`.
+
+	Files are handed out to the workers in order, at most one per worker at a time, and
+	each file being parsed has its own bounded queue of chunks; a worker parsing ahead of
+	the file currently being yielded blocks once its queue is full, and is handed the next
+	file only once the records of its current one have been yielded.
+
+	If `ordered` is `True`, records are yielded in the same order as a serial run of
+	`MatchingFiles` and `CurriedCSVReader`. Otherwise, files are yielded in the order in
+	which the workers start parsing them.
+
+	If the filesystem does not map to system paths, or fewer than two processes or
+	files are involved, the files are read serially.
+	'''
+	path = Option(str, default='/')
+	pattern = Option(str)
+	processes = Option(int, default=2)
+	ordered = Option(bool, default=True)
+	chunk_size = Option(
+		int,
+		default=1000,
+		__doc__='''The number of rows sent from a worker process in each message.''',
+	)
+	queue_size = Option(
+		int,
+		default=16,
+		__doc__='''The maximum number of chunks of each file waiting to be received from the worker processes.''',
+	)
+
+	def __call__(self, *, fs, **kwargs):
+		paths = list(matching_files(fs, self.path, self.pattern))
+		try:
+			syspaths = [fs.getsyspath(p) for p in paths]
+		except NoSysPath:
+			syspaths = None
+		if syspaths is None or self.processes < 2 or len(paths) < 2:
+			for path in paths:
+				yield from self.read(path, fs=fs)
+			return
+
+		workers = min(self.processes, len(paths))
+		tasks = multiprocessing.Queue()
+		ready = None if self.ordered else multiprocessing.Queue()
+		slots = [multiprocessing.Queue(maxsize=self.queue_size) for _ in range(workers)]
+		file_slots = {}
+		pending = iter(enumerate(syspaths))
+
+		def dispatch(slot):
+			task = next(pending, None)
+			if task is None:
+				return
+			index, syspath = task
+			file_slots[index] = slot
+			tasks.put((index, syspath, slot))
+			if index == len(paths) - 1:
+				for _ in range(workers):
+					tasks.put(None)
+
+		def file_rows(index):
+			results = slots[file_slots[index]]
+			while True:
+				item = results.get()
+				if item is None:
+					return
+				if isinstance(item, Exception):
+					raise item
+				yield from item
+
+		def file_order():
+			if self.ordered:
+				yield from range(len(paths))
+			else:
+				for _ in range(len(paths)):
+					yield ready.get()
+
+		processes = []
+		for _ in range(workers):
+			w = multiprocessing.Process(target=_parse_csv_files, args=(tasks, slots, ready, self.encoding, self.buffer_size, self.chunk_size))
+			w.daemon = True
+			w.start()
+			processes.append(w)
+		for slot in range(workers):
+			dispatch(slot)
+
+		try:
+			limit = self.limit
+			for index in file_order():
+				if limit and self.count >= limit:
+					break
+				path = paths[index]
+				if self.verbose:
+					sys.stderr.write('============================== %s\n' % (path,))
+				start = time.time()
+				start_count = self.count
+				complete = yield from self.records(path, file_rows(index))
+				if self.verbose:
+					self.report(path, self.count - start_count, time.time() - start, fs.getsize(path) if complete else None)
+				if not complete:
+					break
+				dispatch(file_slots.pop(index))
+		finally:
+			for w in processes:
+				if w.is_alive():
+					w.terminate()
+				w.join()
@@ -3,12 +3,18 @@ import os.path
 import hashlib
 import uuid
 from os.path import getsize
+from contextlib import ExitStack
 
 from pipeline.util import CromObjectMerger
 
 from bonobo.constants import NOT_MODIFIED
 from bonobo.config import Configurable, Option
-from pipeline.util import ExclusiveValue
+import settings
+from pipeline.util import ExclusiveValue, ExclusiveDirectory
+from pipeline.linkedart import assign_deterministic_ids, is_placeholder_id
+from pipeline.io.references import reference_recorder
+from pipeline.util.rewriting import serialization_uuid_rewriter
+from pipeline.incremental import lineage_recorder
 from cromulent import model, reader
 from cromulent.model import factory
 
@@ -23,6 +29,9 @@ def filename_for(data: dict):
 # 		print(f'*** No UUID in top-level resource. Using a hash of top-level URI: {uu}')
 	if not uu:
 		o = data.get('_LOD_OBJECT')
+		if o and is_placeholder_id(o.id):
+			# name the file by the id derived from the object's content, not its placeholder
+			assign_deterministic_ids(o)
 		if o:
 			# take a guess that the eventual filename is going to be based on the UUIDv3 
 			# of the crom object's ident URI
@@ -34,6 +43,63 @@ def filename_for(data: dict):
 	fn = f'{uu}.json'
 	return fn, partition
 
+def output_resource(data: dict):
+	'''
+	Return the crom object of `data` to be serialized, with its output filename and
+	partition. If final UUIDs are minted at serialization time (`settings.mint_uuids`),
+	the object's URIs are rewritten to their `urn:uuid:` URIs, and the file is named by
+	the UUID of its top-level URI.
+	'''
+	model_object = data['_LOD_OBJECT']
+	rewriter = serialization_uuid_rewriter()
+	if rewriter:
+		model_object, uu = rewriter.resolve_object(model_object)
+		return model_object, f'{uu}.json', uu[:2]
+	filename, partition = filename_for(data)
+	return model_object, filename, partition
+
+def output_partition(data: dict):
+	'''
+	Return the partition of the output file of the resource in `data`, as named by
+	`output_resource` (without rewriting the resource's URIs).
+	'''
+	rewriter = serialization_uuid_rewriter()
+	if rewriter:
+		return rewriter.uuid_for(data['_LOD_OBJECT'].id)[:2]
+	_, partition = filename_for(data)
+	return partition
+
+def merge_serialized(merger, model_object, content, source):
+	'''
+	Merge `model_object` into the resource serialized as JSON-LD in `content` (read
+	from `source`), returning the merged object, or `None` if the two are identical.
+	'''
+	r = reader.Reader(validate_profile=False, validate_props=False)
+	try:
+		m = r.read(content)
+		if m == model_object:
+			return None
+		else:
+			merger.merge(m, model_object)
+			return m
+	except model.DataError as e:
+		print(f'Exception caught while merging data from {source} ({str(e)}):')
+		print(factory.toString(model_object, False))
+		print(content)
+		raise
+
+def merging_writer(**kwargs):
+	'''
+	Return a node that serializes and merges resources into the output, in the format
+	configured in `settings.output_format` (either one file per resource, or packed
+	segment files; see `pipeline.io.segments`).
+	'''
+	if settings.output_format == 'segments':
+		from pipeline.io.segments import MergingSegmentWriter
+		kwargs.pop('partition_directories', None)
+		return MergingSegmentWriter(**kwargs)
+	return MergingFileWriter(**kwargs)
+
 class FileWriter(Configurable):
 	directory = Option(default="output")
 
@@ -101,50 +167,45 @@ class MergingFileWriter(Configurable):
 						os.mkdir(pp)
 
 	def merge(self, model_object, fn):
-		r = reader.Reader(validate_profile=False, validate_props=False)
-		merger = self.merger
-
 		if getsize(fn) == 0:
 			return model_object
 
 		with open(fn, 'r') as fh:
 			content = fh.read()
-			try:
-				m = r.read(content)
-				if m == model_object:
-					return None
-				else:
-					merger.merge(m, model_object)
-					return m
-			except model.DataError as e:
-				print(f'Exception caught while merging data from {fn} ({str(e)}):')
-				print(factory.toString(model_object, False))
-				print(content)
-				raise
+		return merge_serialized(self.merger, model_object, content, fn)
 		
 	def __call__(self, data: dict):
-		filename, partition = filename_for(data)
+		lineage = lineage_recorder()
+		if lineage and not lineage.record(self.model, data['_LOD_OBJECT'].id):
+			return NOT_MODIFIED
+		model_object, filename, partition = output_resource(data)
 		factory = data['_CROM_FACTORY']
-		model_object = data['_LOD_OBJECT']
 
 		dr = self.dr
 		if self.partition_directories:
 			dr = os.path.join(dr, partition)
 		
-		with ExclusiveValue(dr):
+		with ExitStack() as stack:
+			stack.enter_context(ExclusiveValue(dr))
+			if settings.component_processes > 1:
+				# graph components may be merging data into these files in other processes
+				stack.enter_context(ExclusiveDirectory(dr))
 			fn = os.path.join(dr, filename)
 			if os.path.exists(fn):
 				m = self.merge(model_object, fn)
 				if m:
-					d = factory.toString(m, self.compact)
+					d = factory.toString(assign_deterministic_ids(m), self.compact)
 				else:
 					d = None
 			else:
-				d = factory.toString(model_object, self.compact)
+				d = factory.toString(assign_deterministic_ids(model_object), self.compact)
 
 			if d:
 				with open(fn, 'w', encoding='utf-8') as fh:
 					fh.write(d)
 				if getsize(fn) == 0:
 					warnings.warn(f'*** Wrote empty file: {fn}')
+				recorder = reference_recorder()
+				if recorder:
+					recorder.record(d, fn)
 			return NOT_MODIFIED
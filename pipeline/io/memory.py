@@ -1,12 +1,14 @@
 import os
 import os.path
+import sys
+import time
 import hashlib
 import uuid
 import pprint
 import traceback
 import warnings
 from collections import Counter, defaultdict, namedtuple
-# import multiprocessing
+import multiprocessing
 # from multiprocessing.pool import ThreadPool
 
 from pipeline.util import CromObjectMerger
@@ -16,7 +18,9 @@ from bonobo.config import Configurable, Option
 from pipeline.util import ExclusiveValue
 from cromulent import model, reader
 from cromulent.model import factory
-from .file import MergingFileWriter
+import settings
+from .file import merging_writer, output_partition
+from pipeline.incremental import lineage_recorder, no_current_row
 from pipeline.linkedart import add_crom_data, get_crom_object
 
 class MergingMemoryWriter(Configurable):
@@ -59,6 +63,9 @@ class MergingMemoryWriter(Configurable):
 	def __call__(self, data: dict):
 		model_object = data['_LOD_OBJECT']
 		ident = model_object.id
+		recorder = lineage_recorder()
+		if recorder and not recorder.record(self.model, ident):
+			return None
 		self.counter['total'] += 1
 		if ident in self.data:
 			self.counter['collision'] += 1
@@ -73,7 +80,11 @@ class MergingMemoryWriter(Configurable):
 		return None
 
 	def flush(self, verbose=True):
-		writer = MergingFileWriter(directory=self.directory, partition_directories=self.partition_directories, compact=self.compact, model=self.model)
+		with no_current_row():
+			self._flush(verbose=verbose)
+
+	def _flush(self, verbose=True):
+		writer = merging_writer(directory=self.directory, partition_directories=self.partition_directories, compact=self.compact, model=self.model)
 		count = len(self.data)
 		skip = max(int(count / 100), 1)
 		for i, k in enumerate(sorted(self.data)):
@@ -91,3 +102,84 @@ class MergingMemoryWriter(Configurable):
 		if verbose:
 			warnings.warn(f'MergingMemoryWriter flush for model {self.model} with {len(self.data)} items')
 		self.data = {}
+
+	def partitions(self):
+		'''
+		Return a `dict` mapping the output partitions of the data held by the writer to
+		the sorted list of the keys of the resources written to each partition.
+		'''
+		partitions = defaultdict(list)
+		for k in sorted(self.data):
+			partitions[output_partition(add_crom_data(data={}, what=self.data[k]))].append(k)
+		return partitions
+
+_flush_work = None
+
+def _flush_partition(task):
+	'''
+	Write the resources of one output partition of a model directory, held by one or
+	more memory writers (in a forked process).
+	'''
+	_, partition = task
+	memory_writers, writers, partitions = _flush_work
+	start = time.time()
+	count = 0
+	with no_current_row():
+		for i, keys in partitions[task]:
+			w = memory_writers[i]
+			writer = writers[i]
+			count += len(keys)
+			for k in keys:
+				try:
+					writer(add_crom_data(data={}, what=w.data[k]))
+				except:
+					traceback.print_exc()
+	return memory_writers[partitions[task][0][0]].model, partition, count, time.time() - start
+
+def flush_memory_writers(writers, processes=None, verbose=True):
+	'''
+	Write the data held by the `MergingMemoryWriter`s among `writers` to disk.
+
+	With more than one process (by default, `settings.flush_processes`), the resources
+	are grouped by output partition of their model directory (across all the writers of
+	the same model), and the partitions are written by a pool of forked processes, each
+	handling a disjoint set of partitions (and so of output files).
+	Segment output stores are written by a single process, and are always flushed
+	serially.
+	'''
+	global _flush_work
+	if processes is None:
+		processes = settings.flush_processes
+	if processes <= 1 or settings.output_format == 'segments':
+		count = len(writers)
+		for seq_no, w in enumerate(writers):
+			if verbose:
+				print('[%d/%d] writers being flushed' % (seq_no+1, count))
+			if isinstance(w, MergingMemoryWriter):
+				w.flush(verbose=verbose)
+		return
+
+	memory_writers = [w for w in writers if isinstance(w, MergingMemoryWriter)]
+
+	# several writers may serialize resources of the same model (and so may write to the
+	# same files), so each task covers all the writers of a model directory
+	partitions = defaultdict(list)
+	for i, w in enumerate(memory_writers):
+		for partition, keys in w.partitions().items():
+			partitions[(os.path.join(w.directory, w.model), partition)].append((i, keys))
+	tasks = sorted(partitions, key=lambda t: -sum(len(keys) for _, keys in partitions[t]))
+	total = len(tasks)
+	# the output writers (and their directories) are created before forking, so that
+	# the worker processes only ever write to their own partitions
+	writers = [merging_writer(directory=w.directory, partition_directories=w.partition_directories, compact=w.compact, model=w.model) for w in memory_writers]
+	_flush_work = (memory_writers, writers, partitions)
+	try:
+		ctx = multiprocessing.get_context('fork')
+		with ctx.Pool(processes) as pool:
+			for done, (model_name, partition, count, seconds) in enumerate(pool.imap_unordered(_flush_partition, tasks), start=1):
+				if verbose:
+					print(f'[{done}/{total}] flushed {count} resources of model {model_name} (partition {partition}) in {seconds:.1f}s', file=sys.stderr)
+	finally:
+		_flush_work = None
+	for w in memory_writers:
+		w.data = {}
@@ -0,0 +1,152 @@
+'''
+A persistent index of the pipeline output files, for browsing the output (see wsgi.py)
+without searching or parsing the whole output tree for each page.
+
+The index is an SQLite database holding the UUID, model, path (relative to the output
+directory) and label of each output file. It is updated incrementally: a refresh walks
+the output tree, and only parses the files whose modification time has changed since
+they were indexed. The index also caches rendered pages (such as the Mermaid graph of a
+resource), keyed by the path and modification time of the rendered file; the cache is
+cleared whenever a refresh finds changed files, as pages include the labels of other
+resources.
+'''
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+	uuid TEXT PRIMARY KEY,
+	model TEXT NOT NULL,
+	path TEXT NOT NULL,
+	label TEXT NOT NULL,
+	mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_model_label ON files (model, label);
+CREATE TABLE IF NOT EXISTS pages (
+	path TEXT PRIMARY KEY,
+	mtime REAL NOT NULL,
+	content TEXT NOT NULL
+);
+'''
+
+def _label_from_file(filename):
+	try:
+		with open(filename, 'r', encoding='utf-8') as fh:
+			return json.load(fh).get('_label', '') or ''
+	except ValueError:
+		return ''
+
+def _json_files(path):
+	with os.scandir(path) as it:
+		for entry in it:
+			if entry.is_dir(follow_symlinks=False):
+				yield from _json_files(entry.path)
+			elif entry.name.endswith('.json'):
+				yield entry
+
+class OutputIndex:
+	'''
+	The index, stored in the SQLite database `index_path`, of the JSON files in the
+	model directories of `output_path`. Calls to `refresh` are skipped if the index was
+	refreshed less than `refresh_interval` seconds earlier.
+	'''
+	def __init__(self, output_path, index_path, refresh_interval=0):
+		self.output_path = Path(output_path)
+		self.index_path = str(index_path)
+		self.refresh_interval = refresh_interval
+		self.refreshed = None
+		self.local = threading.local()
+		self.lock = threading.Lock()
+		with self.connection() as c:
+			c.executescript(SCHEMA)
+
+	def connection(self):
+		c = getattr(self.local, 'connection', None)
+		if c is None:
+			os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+			c = sqlite3.connect(self.index_path)
+			self.local.connection = c
+		return c
+
+	def model_directories(self):
+		if not self.output_path.is_dir():
+			return []
+		return sorted(p for p in self.output_path.iterdir() if p.is_dir() and p.name != 'tmp')
+
+	def refresh(self, force=False):
+		'''
+		Update the index with the files that were added, changed or removed since the last
+		refresh, returning the number of updated entries.
+		'''
+		with self.lock:
+			now = time.monotonic()
+			if not force and self.refreshed is not None and now - self.refreshed < self.refresh_interval:
+				return 0
+			c = self.connection()
+			changes = 0
+			models = set()
+			with c:
+				for directory in self.model_directories():
+					model = directory.name
+					models.add(model)
+					indexed = {path: (uu, mtime) for uu, path, mtime in c.execute('SELECT uuid, path, mtime FROM files WHERE model = ?', (model,))}
+					seen = set()
+					updates = []
+					for entry in _json_files(directory):
+						path = Path(entry.path).relative_to(self.output_path).as_posix()
+						seen.add(path)
+						mtime = entry.stat().st_mtime
+						if path in indexed and indexed[path][1] == mtime:
+							continue
+						uu = entry.name[:-5]
+						updates.append((uu, model, path, _label_from_file(entry.path), mtime))
+					removed = [(indexed[path][0],) for path in set(indexed) - seen]
+					c.executemany('DELETE FROM files WHERE uuid = ?', removed)
+					c.executemany('INSERT OR REPLACE INTO files (uuid, model, path, label, mtime) VALUES (?, ?, ?, ?, ?)', updates)
+					changes += len(removed) + len(updates)
+				placeholders = ', '.join('?' for _ in models)
+				cur = c.execute(f'DELETE FROM files WHERE model NOT IN ({placeholders})', sorted(models))
+				changes += cur.rowcount
+				if changes:
+					c.execute('DELETE FROM pages')
+			self.refreshed = now
+			return changes
+
+	def models(self):
+		'''Return a list of `(model, count)` pairs for the indexed model directories.'''
+		return list(self.connection().execute('SELECT model, COUNT(*) FROM files GROUP BY model ORDER BY model'))
+
+	def lookup(self, uu):
+		'''Return the `(model, path, label)` of the output file for the UUID `uu`, or `None`.'''
+		return self.connection().execute('SELECT model, path, label FROM files WHERE uuid = ?', (uu,)).fetchone()
+
+	def files(self, model, query=None, offset=0, limit=100):
+		'''
+		Return the total number of files of `model` (whose labels contain `query`, if
+		given), and a list of `(uuid, path, label)` for a page of them, ordered by label.
+		'''
+		c = self.connection()
+		where = 'model = ?'
+		params = [model]
+		if query:
+			where += " AND label LIKE ? ESCAPE '\\'"
+			escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+			params.append(f'%{escaped}%')
+		total = c.execute(f'SELECT COUNT(*) FROM files WHERE {where}', params).fetchone()[0]
+		rows = c.execute(f'SELECT uuid, path, label FROM files WHERE {where} ORDER BY label, path LIMIT ? OFFSET ?', params + [limit, offset])
+		return total, list(rows)
+
+	def cached_page(self, path, mtime):
+		'''Return the page cached for the file `path` as of its modification time `mtime`, or `None`.'''
+		row = self.connection().execute('SELECT content FROM pages WHERE path = ? AND mtime = ?', (path, mtime)).fetchone()
+		return row[0] if row else None
+
+	def cache_page(self, path, mtime, content):
+		c = self.connection()
+		with c:
+			c.execute('INSERT OR REPLACE INTO pages (path, mtime, content) VALUES (?, ?, ?)', (path, mtime, content))
@@ -0,0 +1,93 @@
+'''
+An index of the URIs referenced by each output file, recorded by the output writers as
+resources are serialized, so that a rewriting pass (e.g. of post-sale URIs) can find the
+files it needs to rewrite without scanning the whole output tree.
+
+The index is a directory of tab-separated `refs-PID.tsv` tables (one per writing
+process), each line holding a referenced URI and the location (filename, or segment
+store path and resource UUID) of a resource that references it.
+'''
+
+import os
+import re
+from pathlib import Path
+
+import settings
+
+ID_RE = re.compile(r'"id":\s*"([^"]+)"')
+
+class URIReferenceRecorder:
+	'''
+	Records the URIs (starting with `prefix`) that are referenced in serialized
+	resources in the index `directory`.
+	'''
+	def __init__(self, directory, prefix=''):
+		self.directory = directory
+		self.prefix = prefix
+		self.fh = None
+		self.pid = None
+
+	def _handle(self):
+		pid = os.getpid()
+		if self.fh is None or pid != self.pid:
+			# forked processes each write their own table
+			os.makedirs(self.directory, exist_ok=True)
+			self.pid = pid
+			self.fh = open(os.path.join(self.directory, f'refs-{pid}.tsv'), 'a', encoding='utf-8')
+		return self.fh
+
+	def record(self, content, location):
+		'''Record the URIs referenced in the serialized JSON-LD `content` of `location`.'''
+		prefix = self.prefix
+		uris = {uri for uri in ID_RE.findall(content) if uri.startswith(prefix)}
+		if uris:
+			location = str(location)
+			fh = self._handle()
+			fh.write(''.join(f'{uri}\t{location}\n' for uri in uris))
+			# flushed for each resource, as worker processes may exit without flushing
+			fh.flush()
+
+_recorder = None
+
+def reference_recorder():
+	'''
+	Return the recorder for the index configured by `settings.uri_reference_index`, or
+	`None` if no index is configured.
+	'''
+	global _recorder
+	if not settings.uri_reference_index:
+		return None
+	if _recorder is None or _recorder.directory != settings.uri_reference_index:
+		_recorder = URIReferenceRecorder(settings.uri_reference_index, prefix=settings.uri_reference_prefix)
+	return _recorder
+
+class URIReferenceIndex:
+	'''Lookup of the locations that reference URIs, in an index `directory`.'''
+	def __init__(self, directory):
+		self.directory = directory
+
+	def tables(self):
+		return sorted(Path(self.directory).glob('refs-*.tsv'))
+
+	def locations(self, uris, prefix=False):
+		'''
+		Return the sorted list of locations that reference any of the `uris`. If `prefix`
+		is `True`, locations that reference URIs that start with any of the `uris` are
+		also included.
+		'''
+		uris = set(uris)
+		lengths = sorted({len(u) for u in uris}) if prefix else []
+		common = os.path.commonprefix(list(uris)) if uris else ''
+		found = set()
+		for table in self.tables():
+			with open(table, 'r', encoding='utf-8') as fh:
+				for line in fh:
+					uri, location = line.rstrip('\n').split('\t', 1)
+					if location in found:
+						continue
+					if uri in uris:
+						found.add(location)
+					elif prefix and uri.startswith(common):
+						if any(uri[:l] in uris for l in lengths if l < len(uri)):
+							found.add(location)
+		return sorted(found)
@@ -0,0 +1,243 @@
+'''
+A packed output store, as an alternative to writing one JSON file per resource.
+
+Each model's resources are appended as JSON lines to a small number of large segment
+files (`segment-NNNNN.jsonl`, or `segment-NNNNN.jsonl.gz` with each record compressed
+as a separate gzip member), in the model's directory of the output path:
+
+	output/
+		object/
+			index.tsv
+			segment-00000.jsonl
+			segment-00001.jsonl
+		person/
+			...
+
+`index.tsv` maps each resource UUID to the segment, byte offset, and byte length of its
+record. The index is only ever appended to; when a resource is written again (e.g. after
+being merged with new data), the later index entry supersedes the earlier one.
+
+A store is written by a single process at a time, so segment output cannot be used
+with graph components run in concurrent processes (`settings.component_processes`).
+'''
+
+import os
+import gzip
+import atexit
+from contextlib import suppress
+
+from bonobo.constants import NOT_MODIFIED
+from bonobo.config import Configurable, Option
+
+import settings
+from pipeline.util import CromObjectMerger, ExclusiveValue
+from pipeline.linkedart import assign_deterministic_ids
+from pipeline.io.file import output_resource, merge_serialized
+from pipeline.io.references import reference_recorder
+from pipeline.incremental import lineage_recorder
+
+INDEX_FILENAME = 'index.tsv'
+
+class SegmentStore:
+	'''
+	The segment store of a single model directory `path`, supporting random access to
+	resources by UUID, iteration over all resources, and (if `writable`) appending
+	new resource records.
+	'''
+	def __init__(self, path, *, writable=False, compress=False, segment_size=256*1024*1024):
+		self.path = path
+		self.writable = writable
+		self.compress = compress
+		self.segment_size = segment_size
+		self.index = {}
+		self.segments = []
+		self.segment_fh = None
+		self.index_fh = None
+		self.read_handles = {}
+
+		if writable:
+			os.makedirs(path, exist_ok=True)
+		index_file = os.path.join(path, INDEX_FILENAME)
+		with suppress(FileNotFoundError):
+			with open(index_file, 'r', encoding='utf-8') as fh:
+				for line in fh:
+					uu, segment, offset, length = line.rstrip('\n').split('\t')
+					self.index[uu] = (segment, int(offset), int(length))
+		if os.path.isdir(path):
+			self.segments = sorted(f for f in os.listdir(path) if f.startswith('segment-'))
+		if writable:
+			self.index_fh = open(index_file, 'a', encoding='utf-8', buffering=1)
+
+	def __len__(self):
+		return len(self.index)
+
+	def __contains__(self, uu):
+		return uu in self.index
+
+	def ids(self):
+		return self.index.keys()
+
+	def _read_handle(self, segment):
+		fh = self.read_handles.get(segment)
+		if not fh:
+			fh = self.read_handles[segment] = open(os.path.join(self.path, segment), 'rb')
+		return fh
+
+	def get(self, uu, default=None):
+		'''Return the serialized JSON-LD of the resource `uu`.'''
+		try:
+			segment, offset, length = self.index[uu]
+		except KeyError:
+			return default
+		if self.segment_fh and segment == self.segments[-1]:
+			self.segment_fh.flush()
+		fh = self._read_handle(segment)
+		fh.seek(offset)
+		data = fh.read(length)
+		if segment.endswith('.gz'):
+			data = gzip.decompress(data)
+		return data.decode('utf-8').rstrip('\n')
+
+	def __iter__(self):
+		'''
+		Generate (uuid, content) pairs for all the resources in the store, in the order
+		in which their current records are stored in the segment files.
+		'''
+		entries = sorted(self.index.items(), key=lambda e: (e[1][0], e[1][1]))
+		for uu, _ in entries:
+			yield uu, self.get(uu)
+
+	def _open_segment(self):
+		suffix = '.jsonl.gz' if self.compress else '.jsonl'
+		segment = f'segment-{len(self.segments):05d}{suffix}'
+		self.segments.append(segment)
+		self.segment_fh = open(os.path.join(self.path, segment), 'ab')
+		self.segment_offset = self.segment_fh.tell()
+
+	def put(self, uu, content):
+		'''
+		Append the serialized JSON-LD `content` (which must not contain any newlines) as
+		the record of the resource `uu`.
+		'''
+		if not self.writable:
+			raise ValueError(f'Segment store {self.path} is not writable')
+		if not self.segment_fh or self.segment_offset >= self.segment_size:
+			if self.segment_fh:
+				self.segment_fh.close()
+			self._open_segment()
+		data = (content + '\n').encode('utf-8')
+		if self.compress:
+			data = gzip.compress(data)
+		self.segment_fh.write(data)
+		# the index is line-buffered, so its line must not point at unwritten data
+		self.segment_fh.flush()
+		segment = self.segments[-1]
+		offset = self.segment_offset
+		self.segment_offset += len(data)
+		self.index[uu] = (segment, offset, len(data))
+		self.index_fh.write(f'{uu}\t{segment}\t{offset}\t{len(data)}\n')
+
+	def close(self):
+		for fh in self.read_handles.values():
+			fh.close()
+		self.read_handles = {}
+		if self.segment_fh:
+			self.segment_fh.close()
+			self.segment_fh = None
+		if self.index_fh:
+			self.index_fh.close()
+			self.index_fh = None
+		self.writable = False
+
+def open_output(directory):
+	'''Return a `dict` mapping model names to the `SegmentStore`s in `directory`.'''
+	stores = {}
+	for name in sorted(os.listdir(directory)):
+		path = os.path.join(directory, name)
+		if os.path.exists(os.path.join(path, INDEX_FILENAME)):
+			stores[name] = SegmentStore(path)
+	return stores
+
+_writable_stores = {}
+
+def writable_store(path, **kwargs):
+	'''
+	Return the writable `SegmentStore` for `path`, shared by all the writers of this
+	process (stores are closed when the process exits; see `close_stores`).
+	'''
+	key = os.path.realpath(path)
+	with ExclusiveValue(key):
+		store = _writable_stores.get(key)
+		if not store:
+			store = _writable_stores[key] = SegmentStore(path, writable=True, **kwargs)
+	return store
+
+@atexit.register
+def close_stores():
+	'''Close all the writable stores opened by `writable_store`.'''
+	for store in _writable_stores.values():
+		store.close()
+	_writable_stores.clear()
+
+def export_segments(directory, output_path, partition_directories=True):
+	'''
+	Write each of the resources in the segment stores in `directory` to its own JSON
+	file in `output_path`, in the same layout as written by `MergingFileWriter`.
+	'''
+	count = 0
+	for model, store in open_output(directory).items():
+		model_dir = os.path.join(output_path, model)
+		for uu, content in store:
+			dr = os.path.join(model_dir, uu[:2]) if partition_directories else model_dir
+			os.makedirs(dr, exist_ok=True)
+			with open(os.path.join(dr, f'{uu}.json'), 'w', encoding='utf-8') as fh:
+				fh.write(content)
+			count += 1
+		store.close()
+	return count
+
+class MergingSegmentWriter(Configurable):
+	'''
+	Serialize each resource to the segment store of its model, merging it with any data
+	for the same resource that has already been written.
+
+	Records are always serialized compactly (as a single line), so `compact` is only
+	accepted for compatibility with `MergingFileWriter`.
+	'''
+	directory = Option(default="output")
+	compact = Option(default=True, required=False)
+	model = Option(default=None, required=True)
+	segment_size = Option(int, default=settings.output_segment_size)
+	compress = Option(bool, default=settings.output_segment_compress)
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(self, *args, **kwargs)
+		self.merger = CromObjectMerger()
+		self.__name__ = f'{type(self).__name__} ({self.model})'
+		if settings.component_processes > 1:
+			# graph components run in forked processes would append to the store through
+			# this process's buffered handles, which they never flush
+			raise ValueError('Segment output stores (GETTY_PIPELINE_OUTPUT_FORMAT=segments) do not support running graph components concurrently (GETTY_PIPELINE_COMPONENT_PROCESSES)')
+		self.store = writable_store(os.path.join(self.directory, self.model), compress=self.compress, segment_size=self.segment_size)
+
+	def __call__(self, data: dict):
+		lineage = lineage_recorder()
+		if lineage and not lineage.record(self.model, data['_LOD_OBJECT'].id):
+			return NOT_MODIFIED
+		model_object, filename, _ = output_resource(data)
+		uu = filename[:-len('.json')]
+		factory = data['_CROM_FACTORY']
+
+		with ExclusiveValue(self.store.path):
+			existing = self.store.get(uu)
+			if existing is not None:
+				m = merge_serialized(self.merger, model_object, existing, f'{self.store.path}#{uu}')
+				d = factory.toString(assign_deterministic_ids(m), True) if m else None
+			else:
+				d = factory.toString(assign_deterministic_ids(model_object), True)
+			if d:
+				self.store.put(uu, d)
+				recorder = reference_recorder()
+				if recorder:
+					recorder.record(d, f'{self.store.path}#{uu}')
+		return NOT_MODIFIED
@@ -1,3 +1,7 @@
+import re
+import sys
+import uuid
+import hashlib
 from contextlib import suppress
 import warnings
 import urllib.parse
@@ -5,12 +9,127 @@ import calendar
 
 from cromulent import model, vocab
 from cromulent.model import factory
-from cromulent.extract import extract_physical_dimensions
+from cromulent.extract import dimensions_cleaner, normalized_dimension_object
 from pipeline.util.cleaners import ymd_to_datetime
+import settings
 
 factory.auto_id_type = 'uuid'
 vocab.add_art_setter()
 
+# Objects created without an explicit URI are assigned a random urn:uuid: id by crom. In
+# deterministic id mode (`settings.deterministic_ids`), they are instead assigned a
+# placeholder id, which is replaced as the object is serialized (by
+# `assign_deterministic_ids`) with an id derived from its position in the serialized
+# resource, so that runs over the same input produce identical output.
+AUTO_ID_PREFIX = 'tag:getty.edu,2019:digital:pipeline:AUTO-ID:'
+AUTO_ID_RE = re.compile(re.escape(AUTO_ID_PREFIX) + r'[0-9a-f-]+')
+
+def placeholder_id(what=None, auto_type=None):
+	return f'{AUTO_ID_PREFIX}{uuid.uuid4()}'
+
+def is_placeholder_id(ident):
+	return isinstance(ident, str) and ident.startswith(AUTO_ID_PREFIX)
+
+if settings.deterministic_ids:
+	factory.generate_id = placeholder_id
+
+def _content_hash(obj):
+	content = AUTO_ID_RE.sub(AUTO_ID_PREFIX, factory.toString(obj, True))
+	return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def _derived_id(key, used):
+	n = 0
+	ident = f'urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, key)}'
+	while ident in used:
+		n += 1
+		ident = f'urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, f"{key}#{n}")}'
+	used.add(ident)
+	return ident
+
+def _embedded(top, obj, p, v):
+	return getattr(v, '_embed', True) and (not factory.linked_art_boundaries or obj._linked_art_boundary_okay(top, p, v))
+
+def _hash(obj, hashes):
+	h = hashes.get(id(obj))
+	if h is None:
+		h = hashes[id(obj)] = _content_hash(obj)
+	return h
+
+def _order_key(v, hashes):
+	# objects with a URI are ordered by it, and the others by a hash of their content
+	if v.id and not is_placeholder_id(v.id):
+		return (v.id, '')
+	return ('', _hash(v, hashes))
+
+def _canonical_order(top, obj, seen, hashes):
+	'''
+	Sort the values of the multi-valued properties of `obj` and of the objects it embeds
+	into a canonical order (which does not depend on the order in which they were added,
+	e.g. by iterating over a set, or by merging separately serialized parts), the objects
+	embedded in each value being ordered before the value itself is hashed.
+	'''
+	if id(obj) in seen:
+		return
+	seen.add(id(obj))
+	for p in obj.list_my_props():
+		values = getattr(obj, p)
+		if not isinstance(values, list):
+			values = [values]
+		for v in values:
+			if isinstance(v, model.BaseResource) and (not v.id or is_placeholder_id(v.id) or _embedded(top, obj, p, v)):
+				_canonical_order(top, v, seen, hashes)
+	for p in obj.list_my_props():
+		values = getattr(obj, p)
+		if isinstance(values, list) and len(values) > 1 and all(isinstance(v, model.ExternalResource) for v in values):
+			values.sort(key=lambda v: _order_key(v, hashes))
+
+def _placeholder_objects(top, obj, base, path, seen, found, used):
+	if id(obj) in seen:
+		return
+	seen.add(id(obj))
+	for p in sorted(obj.list_my_props()):
+		values = getattr(obj, p)
+		if not isinstance(values, list):
+			values = [values]
+		for i, v in enumerate(values):
+			if not isinstance(v, model.ExternalResource):
+				continue
+			vpath = f'{path}/{p}/{i}'
+			if is_placeholder_id(v.id):
+				found.append((v, f'{base}#{vpath}'))
+				if isinstance(v, model.BaseResource):
+					_placeholder_objects(top, v, base, vpath, seen, found, used)
+			elif v.id:
+				used.add(v.id)
+				if _embedded(top, obj, p, v) and isinstance(v, model.BaseResource):
+					_placeholder_objects(top, v, v.id, '', seen, found, used)
+
+def assign_deterministic_ids(obj):
+	'''
+	If deterministic ids are enabled, replace the placeholder ids of the crom object `obj`
+	and of the objects it embeds with `urn:uuid:` ids derived from the URI of their
+	nearest ancestor that has a URI, their property path from it, and a hash of their
+	content (as separately serialized parts of a resource may later be merged by id). A
+	top-level object with a placeholder id is identified by the hash of its content.
+
+	The values of multi-valued properties are first sorted into a canonical order, so
+	that both the property paths and the serialization of `obj` are the same in every
+	run. Returns `obj`.
+	'''
+	if not settings.deterministic_ids or obj is None:
+		return obj
+	hashes = {}
+	_canonical_order(obj, obj, set(), hashes)
+	if is_placeholder_id(obj.id):
+		obj.id = f'urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, _hash(obj, hashes))}'
+	found = []
+	used = {obj.id}
+	_placeholder_objects(obj, obj, obj.id, '', set(), found, used)
+	keys = [f'{key}#{_hash(o, hashes)}' for o, key in found]
+	for (o, _), key in zip(found, keys):
+		o.id = _derived_id(key, used)
+	return obj
+
 def add_crom_data(data: dict, what=None):
 	data['_CROM_FACTORY'] = factory
 	data['_LOD_OBJECT'] = what
@@ -691,6 +810,82 @@ def make_la_place(data:dict, base_uri=None):
 		p.part_of = parent
 	return add_crom_data(data=data, what=p)
 
+class DimensionParser:
+	'''
+	Parses dimension statements (e.g. "30 x 40") into crom dimension objects, exactly as
+	cromulent's `extract_physical_dimensions` does, but caching the parsed data for each
+	distinct (statement, default unit) pair. New dimension objects are constructed from
+	the cached data for each call.
+
+	At most `maxsize` statements are cached (a `maxsize` of 0 disables caching).
+	'''
+	def __init__(self, maxsize=100000):
+		self.maxsize = maxsize
+		self.cache = {}
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def parse(dimstr, default_unit=None):
+		'''
+		Return a tuple of (value, unit, which, label) tuples for the dimensions parsed
+		from the string `dimstr`.
+		'''
+		parsed = []
+		dimensions = dimensions_cleaner(dimstr, default_unit=default_unit)
+		if dimensions:
+			for orig_d in dimensions:
+				dimdata = normalized_dimension_object(orig_d, source=dimstr)
+				if dimdata:
+					dimension, label = dimdata
+					parsed.append((dimension.value, dimension.unit, dimension.which, label))
+		return tuple(parsed)
+
+	def parsed_dimensions(self, dimstr, default_unit=None):
+		'''
+		Return the (possibly cached) result of `parse(dimstr, default_unit)`.
+		'''
+		key = (dimstr, default_unit)
+		try:
+			parsed = self.cache[key]
+			self.hits += 1
+			return parsed
+		except KeyError:
+			pass
+		self.misses += 1
+		parsed = self.parse(dimstr, default_unit)
+		if len(self.cache) < self.maxsize:
+			self.cache[key] = parsed
+		return parsed
+
+	def __call__(self, dimstr, default_unit=None):
+		'''
+		Yield new `Height`, `Width`, or `PhysicalDimension` objects for the dimensions
+		parsed from the string `dimstr`.
+		'''
+		for value, unit, which, label in self.parsed_dimensions(dimstr, default_unit):
+			if which == 'height':
+				dim = vocab.Height(ident='')
+			elif which == 'width':
+				dim = vocab.Width(ident='')
+			else:
+				dim = vocab.PhysicalDimension(ident='')
+			dim.value = value
+			dim.identified_by = model.Name(ident='', content=label)
+			unit = vocab.instances.get(unit)
+			if unit:
+				dim.unit = unit
+			yield dim
+
+	def hit_rate(self):
+		total = self.hits + self.misses
+		return self.hits / total if total else 0.0
+
+	def report(self, file=sys.stderr):
+		print(f'Dimension parsing cache: {self.hits} hits, {self.misses} misses ({100*self.hit_rate():.1f}% hit rate, {len(self.cache)} cached statements)', file=file)
+
+dimension_parser = DimensionParser(maxsize=settings.dimension_cache_size)
+
 class PopulateObject:
 	'''
 	Shared functionality for project-specific bonobo node sub-classes to populate
@@ -721,7 +916,7 @@ class PopulateObject:
 			if sales_record:
 				dimstmt.referred_to_by = sales_record
 			hmo.referred_to_by = dimstmt
-			for dim in extract_physical_dimensions(dimstr, default_unit=default_unit):
+			for dim in dimension_parser(dimstr, default_unit=default_unit):
 				if sales_record:
 					dim.referred_to_by = sales_record
 				hmo.dimension = dim
@@ -12,7 +12,7 @@ import warnings
 from contextlib import suppress
 from pipeline.util.cleaners import date_cleaner
 from cromulent import model
-from pipeline.linkedart import get_crom_object
+from pipeline.linkedart import get_crom_object, assign_deterministic_ids
 
 # ~~~~ Core Functions ~~~~
 
@@ -64,106 +64,219 @@ class CleanDateToSpan(Configurable):
 				pprint.pprint(data, stream=sys.stderr)
 		return NOT_MODIFIED
 
+class CSVFieldsText:
+	'''
+	The textual form of a CSV row (one `key: value` line per field), rendered only
+	when converted to a string.
+
+	This holds a reference to the (shared) list of header names and a tuple of the row
+	values as they were when the object was created, so later changes to the record
+	(e.g. keys being removed or renamed by `KeyManagement`) do not affect the text.
+	'''
+	__slots__ = ('keys', 'values')
+
+	def __init__(self, keys, values):
+		self.keys = keys
+		self.values = values
+
+	def __str__(self):
+		return ''.join(f'{k}: {v}\n' for k, v in zip(self.keys, self.values))
+
+	def __repr__(self):
+		return f'{type(self).__name__}({str(self)!r})'
+
+	def __bool__(self):
+		return len(self.keys) > 0
+
+	def __eq__(self, other):
+		if isinstance(other, (CSVFieldsText, str)):
+			return str(self) == str(other)
+		return NotImplemented
+
+	def __hash__(self):
+		return hash(str(self))
+
+	def __reduce__(self):
+		return (type(self), (self.keys, self.values))
+
 class PreserveCSVFields(Configurable):
+	'''
+	Store the textual form of the CSV row (see `CSVFieldsText`) in `data[key]`. The text
+	is rendered lazily, so it must be converted with `str()` before use.
+	'''
 	key = Option(str, default='csv_line')
 	order = Option(list, default=None)
 	
 	def __call__(self, data:dict):
-		s = ''
 		keyorder = self.order
 		if not keyorder:
 			keyorder = sorted(data.keys())
-		for k in keyorder:
-			v = data.get(k, '')
-			s += f'{k}: {v}\n'
-		data[self.key] = s
+		data[self.key] = CSVFieldsText(keyorder, tuple(data.get(k, '') for k in keyorder))
 		yield data
 
-class KeyManagement(Configurable):
-	operations = Option(list)
-	drop_empty = Option(bool, default=True)
+class KeyOperationPlan:
+	'''
+	The compiled form of a list of `KeyManagement` operations, specialized for records
+	with a specific set of keys (e.g. the header of a CSV file).
 
-	def __call__(self, data:dict):
-		pass
-# 		print('KeyManagement')
-		for step, op_record in enumerate(self.operations):
-			pass
-# 			print(f'- step {step}')
+	All decisions that depend only on which keys are present in a record (which keys
+	to rename or delete, and how many `prefix_N` groups a `group_repeating` operation
+	will find) are made once, when the plan is compiled. Applying the plan to a record
+	is then a straight loop over exact key lists.
+
+	This assumes that `postprocess` functions do not add or remove keys in the parent
+	record (they are free to modify the grouped sub-record).
+	'''
+	def __init__(self, operations, keys, drop_empty=True):
+		self.drop_empty = drop_empty
+		self.steps = []
+		keys = set(keys)
+		for op_record in operations:
 			for op, op_data in op_record.items():
-				pass
-# 				print(f'  - {op}')
 				if op == 'remove':
-					for key in op_data:
-						with suppress(KeyError):
-							del data[key]
+					delete = [k for k in op_data if k in keys]
+					keys.difference_update(delete)
+					self.steps.append(('remove', delete))
 				elif op == 'rename':
+					renames = []
 					for k, v in op_data.items():
-						with suppress(KeyError):
-							value = data[k]
-							data[v] = value
-							del data[k]
+						if k in keys:
+							renames.append((k, v))
+							keys.add(v)
+							keys.discard(k)
+					self.steps.append(('rename', renames))
 				elif op == 'group':
+					groups = []
 					to_delete = set()
 					for key, mapping in op_data.items():
-						subd = {}
-						properties = mapping['properties']
-						postprocess = mapping.get('postprocess')
 						rename = mapping.get('rename_keys', {})
-						for k in properties:
-							v = data.get(k)
-							to_delete.add(k)
-							if self.drop_empty and not v:
-								continue
-							sub_key = rename.get(k, k)
-							subd[sub_key] = v
-						if postprocess:
-							if callable(postprocess):
-								postprocess = [postprocess]
-							for p in postprocess:
-								subd = p(subd, data)
-						data[key] = subd
-					for k in to_delete:
-						with suppress(KeyError):
-							del data[k]
+						properties = [(k, rename.get(k, k)) for k in mapping['properties'] if k in keys or not drop_empty]
+						to_delete.update(mapping['properties'])
+						groups.append((key, properties, self._postprocess(mapping)))
+						keys.add(key)
+					delete = [k for k in to_delete if k in keys]
+					keys.difference_update(delete)
+					self.steps.append(('group', groups, delete))
 				elif op == 'group_repeating':
 					for key, mapping in op_data.items():
-						property_prefixes = mapping['prefixes']
-						postprocess = mapping.get('postprocess')
+						prefixes = mapping['prefixes']
 						rename = mapping.get('rename_keys', {})
-						data[key] = []
-						to_delete = set()
-						exit = False
+						keys.add(key)
+						indexes = []
+						delete = []
 						for i in itertools.count(1):
-							if exit:
+							ks = [(rename.get(p, p), f'{p}_{i}') for p in prefixes]
+							present = [(sub_key, k) for sub_key, k in ks if k in keys]
+							indexes.append(present)
+							delete.extend(k for _, k in present)
+							if len(present) < len(ks):
 								break
-							ks = ((prefix, f'{prefix}_{i}') for prefix in property_prefixes)
-							subd = {}
-							for p, k in ks:
-								try:
-									sub_key = rename.get(p, p)
-									subd[sub_key] = data[k]
-									to_delete.add(k)
-								except KeyError:
-									exit = True
-							if self.drop_empty:
-								values_unset = list(map(lambda v: not bool(v), subd.values()))
-								if all(values_unset):
-									continue
-							if postprocess and subd:
-								if callable(postprocess):
-									postprocess = [postprocess]
-								for p in postprocess:
-									subd = p(subd, data)
-									if not subd:
-										break
-							if subd:
-								data[key].append(subd)
-						for k in to_delete:
-							del data[k]
+						keys.difference_update(delete)
+						self.steps.append(('group_repeating', key, indexes, self._postprocess(mapping), delete))
 				else:
 					warnings.warn(f'Unrecognized operator {op!r} in KeyManagement')
+
+	@staticmethod
+	def _postprocess(mapping):
+		postprocess = mapping.get('postprocess')
+		if not postprocess:
+			return []
+		if callable(postprocess):
+			return [postprocess]
+		return postprocess
+
+	def __call__(self, data:dict):
+		drop_empty = self.drop_empty
+		for step in self.steps:
+			op = step[0]
+			if op == 'remove':
+				for k in step[1]:
+					data.pop(k, None)
+			elif op == 'rename':
+				for k, v in step[1]:
+					value = data[k]
+					data[v] = value
+					del data[k]
+			elif op == 'group':
+				_, groups, delete = step
+				for key, properties, postprocess in groups:
+					subd = {}
+					for k, sub_key in properties:
+						v = data.get(k)
+						if drop_empty and not v:
+							continue
+						subd[sub_key] = v
+					for p in postprocess:
+						subd = p(subd, data)
+					data[key] = subd
+				for k in delete:
+					data.pop(k, None)
+			elif op == 'group_repeating':
+				_, key, indexes, postprocess, delete = step
+				values = []
+				data[key] = values
+				for ks in indexes:
+					subd = {sub_key: data[k] for sub_key, k in ks}
+					if drop_empty and not any(subd.values()):
+						continue
+					if postprocess and subd:
+						for p in postprocess:
+							subd = p(subd, data)
+							if not subd:
+								break
+					if subd:
+						values.append(subd)
+				for k in delete:
+					del data[k]
 		return data
 
+class CompiledKeyOperations(Configurable):
+	'''
+	Base class for nodes that restructure records according to a list of `KeyManagement`
+	operations. The operations are compiled into a `KeyOperationPlan` once for each
+	distinct set of input keys (in practice, once per CSV header), and the plan is
+	cached for use with all subsequent records with the same keys.
+	'''
+	drop_empty = Option(bool, default=True)
+
+	def key_operations(self):
+		raise NotImplementedError()
+
+	def plan(self, data:dict):
+		try:
+			plans = self._plans
+		except AttributeError:
+			plans = self._plans = {}
+		keys = frozenset(data)
+		plan = plans.get(keys)
+		if plan is None:
+			plan = KeyOperationPlan(self.key_operations(), keys, self.drop_empty)
+			plans[keys] = plan
+		return plan
+
+	def __call__(self, data:dict):
+		return self.plan(data)(data)
+
+class KeyManagement(CompiledKeyOperations):
+	'''
+	Restructure records according to a list of operations, each of which is a `dict`
+	mapping an operator name to its configuration:
+
+	* `remove`: an iterable of keys to remove
+	* `rename`: a `dict` mapping old key names to new key names
+	* `group`: a `dict` mapping a new key name to a `dict` with `properties` (the keys to
+	  move into a sub-record stored in the new key), and optional `rename_keys` and
+	  `postprocess` values
+	* `group_repeating`: a `dict` mapping a new key name to a `dict` with `prefixes`;
+	  for each N=1,2,..., the keys `{prefix}_{N}` are moved into a sub-record, and the
+	  list of all such sub-records is stored in the new key (optional `rename_keys` and
+	  `postprocess` values are also supported)
+	'''
+	operations = Option(list)
+
+	def key_operations(self):
+		return self.operations
+
 class RemoveKeys(Configurable):
 	keys = Option(set)
 	def __call__(self, data:dict):
@@ -172,69 +285,17 @@ class RemoveKeys(Configurable):
 				del data[key]
 		return data
 
-class GroupRepeatingKeys(Configurable):
+class GroupRepeatingKeys(CompiledKeyOperations):
 	mapping = Option(dict)
-	drop_empty = Option(bool, default=True)
-	def __call__(self, data):
-		for key, mapping in self.mapping.items():
-			property_prefixes = mapping['prefixes']
-			postprocess = mapping.get('postprocess')
-			data[key] = []
-			to_delete = set()
-			exit = False
-			for i in itertools.count(1):
-				if exit:
-					break
-				ks = ((prefix, f'{prefix}_{i}') for prefix in property_prefixes)
-				subd = {}
-				for p, k in ks:
-					try:
-						subd[p] = data[k]
-						to_delete.add(k)
-					except KeyError:
-						exit = True
-				if self.drop_empty:
-					values_unset = list(map(lambda v: not bool(v), subd.values()))
-					if all(values_unset):
-						continue
-				if postprocess and subd:
-					if callable(postprocess):
-						postprocess = [postprocess]
-					for p in postprocess:
-						subd = p(subd, data)
-						if not subd:
-							break
-				if subd:
-					data[key].append(subd)
-			for k in to_delete:
-				del data[k]
-		return data
 
-class GroupKeys(Configurable):
+	def key_operations(self):
+		return [{'group_repeating': self.mapping}]
+
+class GroupKeys(CompiledKeyOperations):
 	mapping = Option(dict)
-	drop_empty = Option(bool, default=True)
-	def __call__(self, data):
-		to_delete = set()
-		for key, mapping in self.mapping.items():
-			subd = {}
-			properties = mapping['properties']
-			postprocess = mapping.get('postprocess')
-			for k in properties:
-				v = data.get(k)
-				to_delete.add(k)
-				if self.drop_empty and not v:
-					continue
-				subd[k] = v
-			if postprocess:
-				if callable(postprocess):
-					postprocess = [postprocess]
-				for p in postprocess:
-					subd = p(subd, data)
-			data[key] = subd
-		for k in to_delete:
-			with suppress(KeyError):
-				del data[k]
-		return data
+
+	def key_operations(self):
+		return [{'group': self.mapping}]
 
 class AddDataDependentArchesModel(Configurable):
 	'''
@@ -379,13 +440,14 @@ class RecordCounter(Configurable):
 	counts = Service('counts')
 	verbose = Option(bool, default=False)
 	name = Option()
+	state_writes = ('counts',)
 
 	def __init__(self, *args, **kwargs):
 		super().__init__(self, *args, **kwargs)
 		self.mod = 100
 
 	def __call__(self, data, counts):
-		counts[self.name] += 1
+		counts.merge_value(self.name, 1)
 		count = counts[self.name]
 		if count % self.mod == 0:
 			print(f'\r{count} {self.name}', end='', file=sys.stderr)
@@ -397,7 +459,7 @@ class Serializer(Configurable):
 	compact = Option(default=True)
 	def __call__(self, data: dict):
 		factory = data['_CROM_FACTORY']
-		js = factory.toString(data['_LOD_OBJECT'], self.compact)
+		js = factory.toString(assign_deterministic_ids(data['_LOD_OBJECT']), self.compact)
 		data['_OUTPUT'] = js
 		return data
 
@@ -1,12 +1,17 @@
 import re
+import os
 import sys
 import pathlib
 import pprint
 import itertools
+import functools
 import json
+import tempfile
+import traceback
 import warnings
-from collections import defaultdict
-from contextlib import suppress
+import multiprocessing
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+from contextlib import suppress, ExitStack
 
 import urllib.parse
 from sqlalchemy import create_engine
@@ -25,15 +30,82 @@ from pipeline.util import \
 			timespan_for_century, \
 			dates_for_century, \
 			timespan_from_outer_bounds, \
-			make_ordinal
+			make_ordinal, \
+			MatchingFiles
+from pipeline.io.csv import CurriedCSVReader, ParallelCSVReader
+from pipeline.util.checkpoint import save_checkpoint, load_checkpoint, restore_state
+from pipeline.util.state import SharedStateStore, is_shared_state, declared_writes, restore_shared
+from pipeline.util.rewriting import UUIDRewriter
+from pipeline.incremental import IncrementalState, IncrementalRowFilter, csv_fingerprints, remove_resources, set_active_plan, set_current_row
 from pipeline.util.cleaners import date_cleaner
-from pipeline.linkedart import add_crom_data, get_crom_object
+from pipeline.linkedart import add_crom_data, get_crom_object, is_placeholder_id
 from pipeline.nodes.basic import \
 			OnlyRecordsOfType, \
 			AddArchesModel, \
 			Serializer, \
 			Trace
 
+def _frozen(value):
+	'''
+	Return a hashable equivalent of the plain data `value`, raising `TypeError` for
+	values of any other type.
+	'''
+	if value is None or isinstance(value, (str, int, float, bool)):
+		return value
+	elif isinstance(value, (list, tuple)):
+		return tuple(_frozen(v) for v in value)
+	elif isinstance(value, (set, frozenset, CaseFoldingSet)):
+		return frozenset(_frozen(v) for v in value)
+	elif isinstance(value, dict):
+		return tuple(sorted((k, _frozen(v)) for k, v in value.items()))
+	raise TypeError(f'Cannot freeze value of type {type(value).__name__}')
+
+def _clone_model(obj, memo, force=False):
+	'''
+	Return a copy of the crom object `obj` (if `force` is set, or if it has no URI of its
+	own), copying the objects without a URI that it holds in the same way. Objects with
+	a URI (such as types and records) are shared by the copy, unless `memo` (which maps
+	the ids of objects to their copies) maps them to a replacement.
+	'''
+	c = memo.get(id(obj))
+	if c is not None:
+		return c
+	ident = obj.id
+	if not force and ident and not ident.startswith('urn:uuid:') and not is_placeholder_id(ident):
+		return obj
+	c = obj.__class__(ident=ident if force else ('' if not ident else None))
+	memo[id(obj)] = c
+	for p in c.list_my_props():
+		# drop the values set by the class itself (e.g. the classification of vocab classes)
+		if p != 'id':
+			delattr(c, p)
+	props = obj.list_my_props()
+	for p in props:
+		if p == 'id':
+			continue
+		value = getattr(obj, p)
+		if isinstance(value, list):
+			for v in value:
+				setattr(c, p, _clone_model(v, memo) if isinstance(v, model.BaseResource) else v)
+		else:
+			setattr(c, p, _clone_model(value, memo) if isinstance(value, model.BaseResource) else value)
+	for k, v in obj.__dict__.items():
+		if k not in props and k not in c.__dict__:
+			c.__dict__[k] = v
+	return c
+
+def _clone_value(value, memo):
+	'''Return a copy of the data `value`, copying the crom objects in it with `_clone_model`.'''
+	if isinstance(value, model.BaseResource):
+		return _clone_model(value, memo)
+	elif isinstance(value, list):
+		return [_clone_value(v, memo) for v in value]
+	elif isinstance(value, tuple):
+		return tuple(_clone_value(v, memo) for v in value)
+	elif isinstance(value, dict):
+		return {k: _clone_value(v, memo) for k, v in value.items()}
+	return value
+
 class PersonIdentity:
 	'''
 	Utility class to help assign records for people with properties such as `uri` and identifiers.
@@ -48,6 +120,10 @@ class PersonIdentity:
 		self.anon_period_re = re.compile(r'\[ANONYMOUS - (MODERN|ANTIQUE)\]')
 		self.anon_dated_nationality_re = re.compile(r'\[(\w+) - (\d+)TH C[.]\]')
 		self.anon_nationality_re = re.compile(r'\[(?!ANON|ILLEGIBLE|Unknown)(\w+)\]', re.IGNORECASE)
+		self.authority_cache = OrderedDict()
+		self.authority_cache_size = settings.person_authority_cache_size
+		self.authority_cache_stats = Counter()
+		self.is_anonymous_group = functools.lru_cache(maxsize=self.authority_cache_size)(self.is_anonymous_group)
 
 	def acceptable_person_auth_name(self, auth_name):
 		if not auth_name:
@@ -130,7 +206,80 @@ class PersonIdentity:
 				key = ('PERSON', id_key, id_value)
 				return key, self.make_proj_uri
 
+	def authority_cache_key(self, data:dict, kind, record, relative_id, kwargs):
+		'''
+		Return the key under which the model of the person or group in `data` is cached,
+		or `None` if it cannot be cached (if it is not identified by a shared authority
+		URI, or if the data holds values other than plain strings, numbers and
+		containers of them).
+		'''
+		if not self.authority_cache_size:
+			return None
+		keys, make = self._uri_keys(data, record_id=relative_id)
+		if make != self.make_shared_uri:
+			return None
+		try:
+			return (
+				kind,
+				keys,
+				record is not None,
+				_frozen({k: v for k, v in data.items() if k not in self.record_specific_keys}),
+				_frozen(kwargs),
+			)
+		except TypeError:
+			return None
+
+	# source record data linked from or copied into the data of people, which is not used in modeling them
+	record_specific_keys = frozenset({'pi_record_no', 'star_record_no', 'catalog_number', 'star_csv_data', 'parent_data'})
+
+	def cached_agent(self, build, kind, data:dict, record=None, relative_id=None, **kwargs):
+		'''
+		Model the person or group in `data` by calling `build`, or by copying the model
+		built for an earlier occurrence of the same authority (with the same data), with
+		the `referred_to_by` links to the record of that occurrence replaced by links to
+		`record`. The cache holds its own copy of the model (and of the data members set
+		by `build`), as the model returned for an occurrence may be modified later.
+		'''
+		key = self.authority_cache_key(data, kind, record, relative_id, kwargs)
+		if key is None:
+			return build(data, record=record, relative_id=relative_id, **kwargs)
+
+		cache = self.authority_cache
+		stats = self.authority_cache_stats
+		entry = cache.get(key)
+		if entry:
+			stats['hit'] += 1
+			cache.move_to_end(key)
+			agent, updates, cached_record = entry
+			memo = {id(cached_record): record} if record is not None else {}
+			agent = _clone_model(agent, memo, force=True)
+			data.update({k: _clone_value(v, memo) for k, v in updates.items()})
+			return agent
+
+		stats['miss'] += 1
+		before = dict(data)
+		agent = build(data, record=record, relative_id=relative_id, **kwargs)
+		memo = {id(record): record} if record is not None else {}
+		cached_agent = _clone_model(agent, memo, force=True)
+		updates = {k: _clone_value(v, memo) for k, v in data.items() if k not in self.record_specific_keys and (k not in before or before[k] is not v or isinstance(v, (list, dict)))}
+		cache[key] = (cached_agent, updates, record)
+		if len(cache) > self.authority_cache_size:
+			cache.popitem(last=False)
+		return agent
+
+	def report_authority_cache(self, file=sys.stderr):
+		stats = self.authority_cache_stats
+		total = stats['hit'] + stats['miss']
+		if total:
+			print(f'Person authority cache: {stats["hit"]}/{total} hits ({100.0 * stats["hit"] / total:.1f}%), {len(self.authority_cache)} entries', file=file)
+
 	def add_person(self, a, record=None, relative_id=None, **kwargs):
+		return self.cached_agent(self.build_person, 'person', a, record=record, relative_id=relative_id, **kwargs)
+
+	def add_group(self, a, record=None, relative_id=None, **kwargs):
+		return self.cached_agent(self.build_group, 'group', a, record=record, relative_id=relative_id, **kwargs)
+
+	def build_person(self, a, record=None, relative_id=None, **kwargs):
 		self.add_uri(a, record_id=relative_id)
 		auth_name = a.get('auth_name')
 		
@@ -148,7 +297,7 @@ class PersonIdentity:
 			p.referred_to_by = record
 		return p
 
-	def add_group(self, a, record=None, relative_id=None, **kwargs):
+	def build_group(self, a, record=None, relative_id=None, **kwargs):
 		self.add_uri(a, record_id=relative_id)
 		self.add_names(a, referrer=record, group=True, **kwargs)
 		self.add_props(a, **kwargs)
@@ -465,12 +614,25 @@ class StaticInstanceHolder:
 			used[model][name] = self.instances[model][name]
 		return used
 
+GraphComponent = namedtuple('GraphComponent', ('name', 'graph', 'reads', 'writes'))
+GraphComponent.__doc__ = '''
+A graph that is run as one component of a pipeline, together with the names of the
+(mutable) services that the graph reads and writes. Services that are never modified
+while the pipeline runs do not need to be declared.
+'''
+
 class PipelineBase:
+	# plain `dict` services that independent graph components may all write to, and
+	# whose values are combined by summing them (shared state services declare how
+	# their values are combined; see pipeline.util.state)
+	additive_services = frozenset({'counts'})
+
 	def __init__(self, project_name, *, helper, parallel=False, verbose=False, **kwargs):
 		self.project_name = project_name
 		self.parallel = parallel
 		self.helper = helper
 		self.verbose = verbose
+		self.incremental_plan = None
 		self.services = self.setup_services()
 		helper.add_services(self.services)
 
@@ -735,6 +897,210 @@ class PipelineBase:
 			self.add_serialization_chain(graph, groups.output, model=self.models['Group'])
 		return people
 
+	def csv_reader_nodes(self, fs, pattern, incremental_key=None, **kwargs):
+		'''
+		Return the nodes that read the records of all CSV files in the `fs` filesystem
+		service that match `pattern`. Any extra keyword arguments are passed through to
+		the `CurriedCSVReader`.
+
+		If `settings.csv_reader_processes` is greater than 1, the files are parsed
+		concurrently by a `ParallelCSVReader` (preserving the order of the records).
+
+		In an incremental run (see `plan_incremental_run`), only the records whose
+		`incremental_key` column value is in the run's plan are passed on.
+		'''
+		processes = settings.csv_reader_processes
+		if processes > 1:
+			nodes = [ParallelCSVReader(fs=fs, pattern=pattern, processes=processes, **kwargs)]
+		else:
+			nodes = [
+				MatchingFiles(path='/', pattern=pattern, fs=fs),
+				CurriedCSVReader(fs=fs, **kwargs),
+			]
+		if incremental_key and self.incremental_plan:
+			nodes.append(IncrementalRowFilter(key=incremental_key, rows=self.incremental_plan.rows))
+		return nodes
+
+	def plan_incremental_run(self, fs, pattern, field_names, key, *, services):
+		'''
+		If incremental runs are enabled (`settings.incremental_state_path`), compare the
+		fingerprints of the rows of the CSV files in the `fs` filesystem service that match
+		`pattern` (keyed by their `key` column) with those of the previous run, and remove
+		the output resources that changed rows contributed to. The resulting plan restricts
+		the records read by `csv_reader_nodes` to those needed to regenerate them.
+		'''
+		if not settings.incremental_state_path:
+			return None
+		if self.parallel:
+			raise ValueError('Incremental runs require the serial graph executor')
+		state = IncrementalState(settings.incremental_state_path)
+		plan = state.plan(csv_fingerprints(services[fs], pattern, field_names, key))
+		rewriter = UUIDRewriter(settings.uuid_prefix, settings.uuid_map_file)
+		output_path = getattr(self, 'output_path', None) or settings.output_file_path
+		removed = remove_resources(plan.affected, output_path, rewriter)
+		print(f'Incremental run: modeling {len(plan.rows)}/{len(plan.fingerprints)} rows, regenerating {len(plan.affected)} resources ({removed} files removed)', file=sys.stderr)
+		self.incremental_plan = plan
+		set_active_plan(plan)
+		return plan
+
+	def finish_incremental_run(self):
+		'''Persist the fingerprints and lineage of a finished incremental run.'''
+		if self.incremental_plan:
+			IncrementalState(settings.incremental_state_path).commit(self.incremental_plan)
+
+	def component_writes(self, component):
+		'''
+		Return the names of the services written by the graph `component`, including any
+		declared by the nodes of its graph.
+		'''
+		return set(component.writes) | declared_writes(component.graph)
+
+	def mergeable_services(self, services=None):
+		'''
+		Return the names of the services that independent graph components may all write
+		to, because the order in which their writes are merged does not matter.
+		'''
+		names = set(self.additive_services)
+		for name, value in (services or {}).items():
+			if getattr(value, 'commutative', False):
+				names.add(name)
+		return names
+
+	def components_conflict(self, a, b, services=None):
+		'''
+		Return `True` if the graph components `a` and `b` cannot be run concurrently
+		(i.e. one writes a service that the other reads or writes).
+		'''
+		a_writes = self.component_writes(a)
+		b_writes = self.component_writes(b)
+		if a_writes & set(b.reads) or b_writes & set(a.reads):
+			return True
+		return bool((a_writes & b_writes) - self.mergeable_services(services))
+
+	def component_waves(self, components, services=None):
+		'''
+		Group the `components` into a list of waves. The components in each wave are
+		independent of each other, and each component is in a later wave than all
+		earlier components it conflicts with.
+		'''
+		levels = []
+		for i, c in enumerate(components):
+			level = 0
+			for j in range(i):
+				if self.components_conflict(components[j], c, services):
+					level = max(level, levels[j] + 1)
+			levels.append(level)
+		waves = [[] for _ in range(max(levels) + 1)] if levels else []
+		for level, c in zip(levels, components):
+			waves[level].append(c)
+		return waves
+
+	def flush_component_output(self):
+		'''
+		Called after running a graph component in a separate process, before the process
+		exits (e.g. to write any output data still held in memory to disk).
+		'''
+		pass
+
+	def run_components(self, components, *, services, after=None):
+		'''
+		Run the `GraphComponent`s. If `settings.component_processes` is greater than 1,
+		independent components are run concurrently in separate processes (with at most
+		that many processes at a time); the service state written by each such component
+		is merged back into `services` before any dependent component is run.
+
+		If supplied, `after` is called with each component once it has completed.
+		'''
+		processes = settings.component_processes
+		for wave in self.component_waves(components, services):
+			if processes > 1 and len(wave) > 1:
+				for i in range(0, len(wave), processes):
+					self.run_components_concurrently(wave[i:i+processes], services=services)
+			else:
+				for c in wave:
+					if self.verbose:
+						print(f'Running graph component {c.name}...', file=sys.stderr)
+					self.run_graph(c.graph, services=services)
+			if after:
+				for c in wave:
+					after(c)
+
+	def run_components_concurrently(self, components, *, services):
+		'''
+		Run each of the `components` in a forked process, and merge the state of the
+		services they write (and the static instances they use) into `services`.
+
+		Shared state services named in `settings.shared_state_store` are served to the
+		processes from a `SharedStateStore`; the changes made to all other services are
+		reduced into `services` once the processes have completed.
+		'''
+		self.flush_component_output()
+		written = set().union(*(self.component_writes(c) for c in components))
+		stored = {name for name in settings.shared_state_store & written if is_shared_state(services.get(name))}
+		ctx = multiprocessing.get_context('fork')
+		with ExitStack() as stack:
+			tmp = stack.enter_context(tempfile.TemporaryDirectory(dir=settings.pipeline_tmp_path))
+			proxies = {}
+			if stored:
+				store = stack.enter_context(SharedStateStore(ctx=ctx))
+				proxies = {name: store.share(services[name]) for name in stored}
+			procs = []
+			for i, c in enumerate(components):
+				if self.verbose:
+					print(f'Running graph component {c.name} in a separate process...', file=sys.stderr)
+				state_file = os.path.join(tmp, f'component-{i}.json.gz')
+				p = ctx.Process(target=self._run_component_process, args=(c, services, proxies, state_file))
+				p.start()
+				procs.append((c, p, state_file))
+			failed = []
+			for c, p, _ in procs:
+				p.join()
+				if p.exitcode != 0:
+					failed.append(c.name)
+			if failed:
+				raise RuntimeError(f'Graph components failed: {", ".join(str(n) for n in failed)}')
+			for name, proxy in proxies.items():
+				restore_shared(services[name], proxy)
+			for c, _, state_file in procs:
+				self.merge_component_state(load_checkpoint(state_file), services)
+
+	def _run_component_process(self, component, services, proxies, state_file):
+		try:
+			services.update(proxies)
+			written = [name for name in self.component_writes(component) if name in services and name not in proxies]
+			base = {}
+			for name in written:
+				if is_shared_state(services[name]):
+					base[name] = services[name].snapshot()
+				elif name in self.additive_services:
+					services[name].clear()
+			self.run_graph(component.graph, services=services)
+			self.flush_component_output()
+			state = {
+				'services': {name: services[name].delta(base[name]) if name in base else services[name] for name in written},
+				'static_instances': self.static_instances.used,
+			}
+			save_checkpoint(state_file, state)
+		except Exception:
+			traceback.print_exc()
+			sys.stderr.flush()
+			os._exit(1)
+
+	def merge_component_state(self, state, services):
+		'''
+		Merge the service state saved by a graph component run in a separate process
+		into `services`.
+		'''
+		for name, value in state['services'].items():
+			if is_shared_state(services[name]):
+				services[name].merge(value)
+			elif name in self.additive_services:
+				for k, v in value.items():
+					services[name][k] += v
+			else:
+				restore_state(services[name], value)
+		self.static_instances.used |= state['static_instances']
+
 	def run_graph(self, graph, *, services):
 		if self.parallel:
 			if self.verbose:
@@ -745,6 +1111,12 @@ class PipelineBase:
 				print('Running with SERIAL custom executor')
 			e = pipeline.execution.GraphExecutor(graph, services)
 			e.run()
+			set_current_row(None)
+		if self.verbose:
+			pipeline.linkedart.dimension_parser.report()
+			person_identity = getattr(self.helper, 'person_identity', None)
+			if person_identity:
+				person_identity.report_authority_cache()
 
 class UtilityHelper:
 	def __init__(self, project_name):
@@ -27,14 +27,14 @@ from bonobo.constants import NOT_MODIFIED
 import settings
 from cromulent import model, vocab
 from cromulent.model import factory
-from pipeline.projects import PipelineBase, UtilityHelper
+from pipeline.projects import PipelineBase, UtilityHelper, GraphComponent
 from pipeline.util import identity, \
 			GraphListSource, \
 			ExtractKeyedValue, \
 			ExtractKeyedValues, \
 			MatchingFiles, \
 			timespan_from_outer_bounds
-from pipeline.io.file import MultiFileWriter, MergingFileWriter
+from pipeline.io.file import MultiFileWriter, merging_writer
 # from pipeline.io.arches import ArchesWriter
 from pipeline.linkedart import \
 			MakeLinkedArtAbstract, \
@@ -51,6 +51,7 @@ from pipeline.nodes.basic import \
 			Serializer, \
 			Trace
 from pipeline.util.cleaners import ymd_to_datetime
+from pipeline.util.state import LastWriterMap, CounterMap
 
 from pipeline.projects.aata.articles import ModelArticle
 from pipeline.projects.aata.people import ModelPerson
@@ -189,7 +190,7 @@ class AATAUtilityHelper(UtilityHelper):
 		if names and place_type in ('country', 'nation', 'former nation/state/empire', 'state', 'province'):
 			uri = self.named_place_uri(*names)
 			if geog_id:
-				named_places[geog_id] = uri
+				named_places.merge_value(geog_id, uri)
 			return uri
 		else:
 			return self.make_proj_uri('Place', 'ID', geog_id)
@@ -493,8 +494,8 @@ class AATAPipeline(PipelineBase):
 		'''Return a `dict` of named services available to the bonobo pipeline.'''
 		services = super().setup_services()
 		services.update({
-			'places_with_named_uris': {},
-			'counts': defaultdict(int)
+			'places_with_named_uris': LastWriterMap(),
+			'counts': CounterMap()
 		})
 		return services
 
@@ -699,19 +700,17 @@ class AATAPipeline(PipelineBase):
 	def _construct_graph(self, single_graph=False, services=None):
 		if single_graph:
 			graph = bonobo.Graph()
-			g1 = graph
-			g2 = graph
+			graphs = {name: graph for name in ('geog', 'abstracts', 'journals', 'series', 'people', 'corp')}
 		else:
-			g1 = bonobo.Graph()
-			g2 = bonobo.Graph()
+			graphs = {name: bonobo.Graph() for name in ('geog', 'abstracts', 'journals', 'series', 'people', 'corp')}
 
-		_ = self._add_geog_graph(g1)
+		_ = self._add_geog_graph(graphs['geog'])
 
-		_ = self._add_abstracts_graph(g2)
-		_ = self._add_journals_graph(g2)
-		_ = self._add_series_graph(g2)
-		_ = self._add_people_graph(g2)
-		_ = self._add_corp_graph(g2)
+		_ = self._add_abstracts_graph(graphs['abstracts'])
+		_ = self._add_journals_graph(graphs['journals'])
+		_ = self._add_series_graph(graphs['series'])
+		_ = self._add_people_graph(graphs['people'])
+		_ = self._add_corp_graph(graphs['corp'])
 # 		_ = self._add_tal_graph(g2)
 # 		_ = self._add_subject_graph(g2)
 
@@ -719,7 +718,11 @@ class AATAPipeline(PipelineBase):
 			self.graph_0 = graph
 			return [graph]
 		else:
-			self.graphs = [g1, g2]
+			# the place URIs assigned by the geographic authority data are used by all
+			# the other sources, which are otherwise independent of each other
+			self.graphs = [GraphComponent('geog', graphs['geog'], reads={'places_with_named_uris'}, writes={'places_with_named_uris', 'counts'})]
+			for name in ('abstracts', 'journals', 'series', 'people', 'corp'):
+				self.graphs.append(GraphComponent(name, graphs[name], reads={'places_with_named_uris'}, writes={'counts'}))
 			return self.graphs
 
 	def get_graph(self, **kwargs):
@@ -729,7 +732,10 @@ class AATAPipeline(PipelineBase):
 		return self.graph_0
 
 	def get_graphs(self, **kwargs):
-		'''Construct the bonobo pipeline to fully transform AATA data from XML to JSON-LD.'''
+		'''
+		Construct the bonobo pipeline to fully transform AATA data from XML to JSON-LD,
+		returned as a list of `GraphComponent`s.
+		'''
 		if not self.graphs:
 			self._construct_graph(**kwargs)
 		return self.graphs
@@ -740,11 +746,8 @@ class AATAPipeline(PipelineBase):
 			print(f"- Limiting to {self.limit} records per file", file=sys.stderr)
 		if not services:
 			services = self.get_services(**options)
-		graphs = self.get_graphs(**options, services=services)
-		for i, graph in enumerate(graphs):
-			if self.verbose:
-				print(f'Running graph component {i+1}', file=sys.stderr)
-			self.run_graph(graph, services=services)
+		components = self.get_graphs(**options, services=services)
+		self.run_components(components, services=services)
 
 		if self.verbose:
 			print('Serializing static instances...', file=sys.stderr)
@@ -770,7 +773,7 @@ class AATAFilePipeline(AATAPipeline):
 	def serializer_nodes_for_model(self, model=None, *args, **kwargs):
 		nodes = []
 		if self.debug:
-			nodes.append(MergingFileWriter(directory=self.output_path, partition_directories=True, compact=False, model=model))
+			nodes.append(merging_writer(directory=self.output_path, partition_directories=True, compact=False, model=model))
 		else:
-			nodes.append(MergingFileWriter(directory=self.output_path, partition_directories=True, compact=True, model=model))
+			nodes.append(merging_writer(directory=self.output_path, partition_directories=True, compact=True, model=model))
 		return nodes
@@ -41,14 +41,14 @@ from pipeline.util import \
 			RecursiveExtractKeyedValue, \
 			ExtractKeyedValue, \
 			ExtractKeyedValues, \
-			MatchingFiles, \
 			strip_key_prefix, \
 			rename_keys
+from pipeline.util.state import CounterMap
 from pipeline.util.cleaners import \
 			parse_location_name, \
 			date_cleaner
-from pipeline.io.file import MergingFileWriter
-from pipeline.io.memory import MergingMemoryWriter
+from pipeline.io.file import merging_writer
+from pipeline.io.memory import MergingMemoryWriter, flush_memory_writers
 # from pipeline.io.arches import ArchesWriter
 import pipeline.linkedart
 from pipeline.linkedart import \
@@ -61,7 +61,6 @@ from pipeline.linkedart import \
 			MakeLinkedArtOrganization, \
 			MakeLinkedArtPerson, \
 			make_la_place
-from pipeline.io.csv import CurriedCSVReader
 from pipeline.nodes.basic import \
 			RecordCounter, \
 			KeyManagement, \
@@ -434,7 +433,7 @@ class AddRow(Configurable, KnoedlerProvenance):
 		book = data['book_record']
 		book_id, page_id, row_id = record_id(book)
 		rec_num = data["star_record_no"]
-		content = data['star_csv_data']
+		content = str(data['star_csv_data'])
 		
 		row = vocab.Transcription(ident='', content=content)
 		row.part_of = self.helper.static_instances.get_instance('LinguisticObject', 'db-knoedler')
@@ -1531,7 +1530,7 @@ class KnoedlerPipeline(PipelineBase):
 			'make_la_lo': MakeLinkedArtLinguisticObject(),
 			'make_la_hmo': MakeLinkedArtHumanMadeObject(),
 			'make_la_org': MakeLinkedArtOrganization(),
-			'counts': defaultdict(int)
+			'counts': CounterMap()
 		})
 		return services
 
@@ -1935,8 +1934,7 @@ class KnoedlerPipeline(PipelineBase):
 		g = bonobo.Graph()
 
 		contents_records = g.add_chain(
-			MatchingFiles(path='/', pattern=self.files_pattern, fs='fs.data.knoedler'),
-			CurriedCSVReader(fs='fs.data.knoedler', limit=self.limit, field_names=self.headers),
+			*self.csv_reader_nodes('fs.data.knoedler', self.files_pattern, incremental_key='pi_record_no', limit=self.limit, field_names=self.headers),
 		)
 		sales = self.add_sales_chain(g, contents_records, services, serialize=True)
 		self.add_transaction_chains(g, sales, services, serialize=True)
@@ -1958,6 +1956,7 @@ class KnoedlerPipeline(PipelineBase):
 		if not services:
 			services = self.get_services(**options)
 
+		self.plan_incremental_run('fs.data.knoedler', self.files_pattern, self.headers, 'pi_record_no', services=services)
 		if self.verbose:
 			print('Running graph...', file=sys.stderr)
 		graph = self.get_graph(services=services, **options)
@@ -1992,13 +1991,13 @@ class KnoedlerFilePipeline(KnoedlerPipeline):
 			if use_memory_writer:
 				w = MergingMemoryWriter(directory=self.output_path, partition_directories=True, compact=False, model=model)
 			else:
-				w = MergingFileWriter(directory=self.output_path, partition_directories=True, compact=False, model=model)
+				w = merging_writer(directory=self.output_path, partition_directories=True, compact=False, model=model)
 			nodes.append(w)
 		else:
 			if use_memory_writer:
 				w = MergingMemoryWriter(directory=self.output_path, partition_directories=True, compact=True, model=model)
 			else:
-				w = MergingFileWriter(directory=self.output_path, partition_directories=True, compact=True, model=model)
+				w = merging_writer(directory=self.output_path, partition_directories=True, compact=True, model=model)
 			nodes.append(w)
 		self.writers += nodes
 		return nodes
@@ -2010,11 +2009,8 @@ class KnoedlerFilePipeline(KnoedlerPipeline):
 		super().run(services=services, **options)
 		print(f'Pipeline runtime: {timeit.default_timer() - start}', file=sys.stderr)
 
-		count = len(self.writers)
-		for seq_no, w in enumerate(self.writers):
-			print('[%d/%d] writers being flushed' % (seq_no+1, count))
-			if isinstance(w, MergingMemoryWriter):
-				w.flush()
+		flush_memory_writers(self.writers)
+		self.finish_incremental_run()
 
 		print('====================================================')
 		print('Total runtime: ', timeit.default_timer() - start)
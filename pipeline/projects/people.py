@@ -40,18 +40,17 @@ from pipeline.util import \
 			RecursiveExtractKeyedValue, \
 			ExtractKeyedValue, \
 			ExtractKeyedValues, \
-			MatchingFiles, \
 			identity, \
 			replace_key_pattern, \
 			strip_key_prefix, \
 			label_for_timespan_range, \
 			timespan_from_outer_bounds
 from pipeline.util.cleaners import date_parse, date_cleaner, parse_location_name
-from pipeline.io.file import MergingFileWriter
-from pipeline.io.memory import MergingMemoryWriter
+from pipeline.util.state import AppendMap
+from pipeline.io.file import merging_writer
+from pipeline.io.memory import MergingMemoryWriter, flush_memory_writers
 import pipeline.linkedart
 from pipeline.linkedart import add_crom_data, get_crom_object
-from pipeline.io.csv import CurriedCSVReader
 from pipeline.nodes.basic import \
 			RemoveKeys, \
 			KeyManagement, \
@@ -101,7 +100,7 @@ class PeopleUtilityHelper(UtilityHelper):
 		# asserted as Gorups and not People (since the distinguishing data only appears)
 		# in the PEOPLE dataset, not in Knoedler.
 		key = data['uri_keys']
-		self.services['people_groups']['group_keys'].append(key)
+		self.services['people_groups'].merge_value('group_keys', [key])
 		return g
 
 class AddPersonEntry(Configurable):
@@ -112,7 +111,7 @@ class AddPersonEntry(Configurable):
 		recno = data['star_record_no']
 		auth_name = data.get('auth_name')
 		record_uri = self.helper.make_proj_uri('ENTRY', 'PEOPLE', recno)
-		content = data['star_csv_data']
+		content = str(data['star_csv_data'])
 		record = vocab.EntryTextForm(ident=record_uri, label=f'Entry recorded in PSCP PEOPLE dataset for {auth_name}', content=content)
 		creation = model.Creation(ident='')
 		creation.carried_out_by = self.helper.static_instances.get_instance('Group', 'gpi')
@@ -404,7 +403,7 @@ class PeoplePipeline(PipelineBase):
 			# to avoid constructing new MakeLinkedArtPerson objects millions of times, this
 			# is passed around as a service to the functions and classes that require it.
 			'make_la_person': pipeline.linkedart.MakeLinkedArtPerson(),
-			'people_groups': {'group_keys': []},
+			'people_groups': AppendMap({'group_keys': []}),
 		})
 		return services
 
@@ -415,8 +414,7 @@ class PeoplePipeline(PipelineBase):
 		g = bonobo.Graph()
 
 		contents_records = g.add_chain(
-			MatchingFiles(path='/', pattern=self.contents_files_pattern, fs='fs.data.people'),
-			CurriedCSVReader(fs='fs.data.people', limit=self.limit, field_names=self.contents_headers),
+			*self.csv_reader_nodes('fs.data.people', self.contents_files_pattern, incremental_key='star_record_no', limit=self.limit, field_names=self.contents_headers),
 			PreserveCSVFields(key='star_csv_data', order=self.contents_headers),
 			KeyManagement(
 				operations=[
@@ -508,6 +506,7 @@ class PeoplePipeline(PipelineBase):
 		if not services:
 			services = self.get_services(**options)
 
+		self.plan_incremental_run('fs.data.people', self.contents_files_pattern, self.contents_headers, 'star_record_no', services=services)
 		print('Running graph component...', file=sys.stderr)
 		graph = self.get_graph(**options, services=services)
 		self.run_graph(graph, services=services)
@@ -523,8 +522,15 @@ class PeoplePipeline(PipelineBase):
 
 		print('Writing people-groups mapping data to disk', file=sys.stderr)
 		pg_file = pathlib.Path(settings.pipeline_tmp_path).joinpath('people_groups.json')
+		people_groups = services['people_groups']
+		if self.incremental_plan and pg_file.exists():
+			# rows that were not modeled again keep the group keys recorded by earlier runs
+			with pg_file.open('r') as fh:
+				previous = json.load(fh)
+			known = {tuple(k) for k in people_groups['group_keys']}
+			people_groups['group_keys'] = [k for k in previous.get('group_keys', []) if tuple(k) not in known] + people_groups['group_keys']
 		with pg_file.open('w') as fh:
-			json.dump(services['people_groups'], fh)
+			json.dump(people_groups, fh)
 
 class PeopleFilePipeline(PeoplePipeline):
 	'''
@@ -544,7 +550,7 @@ class PeopleFilePipeline(PeoplePipeline):
 		if use_memory_writer:
 			w = MergingMemoryWriter(directory=self.output_path, partition_directories=True, model=model, **kwargs)
 		else:
-			w = MergingFileWriter(directory=self.output_path, partition_directories=True, model=model, **kwargs)
+			w = merging_writer(directory=self.output_path, partition_directories=True, model=model, **kwargs)
 		nodes.append(w)
 		self.writers += nodes
 		return nodes
@@ -556,11 +562,8 @@ class PeopleFilePipeline(PeoplePipeline):
 		super().run(services=services, **options)
 		print(f'Pipeline runtime: {timeit.default_timer() - start}', file=sys.stderr)
 
-		count = len(self.writers)
-		for seq_no, w in enumerate(self.writers):
-			print('[%d/%d] writers being flushed' % (seq_no+1, count))
-			if isinstance(w, MergingMemoryWriter):
-				w.flush()
+		flush_memory_writers(self.writers)
+		self.finish_incremental_run()
 
 		print('====================================================')
 		print('Total runtime: ', timeit.default_timer() - start)
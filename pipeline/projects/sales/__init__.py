@@ -18,6 +18,7 @@ import pprint
 import pathlib
 import itertools
 import datetime
+import functools
 from collections import Counter, defaultdict, namedtuple
 from contextlib import suppress
 import inspect
@@ -41,7 +42,7 @@ from cromulent.model import factory
 from cromulent.extract import extract_physical_dimensions, extract_monetary_amount
 
 import pipeline.execution
-from pipeline.projects import PipelineBase, UtilityHelper, PersonIdentity
+from pipeline.projects import PipelineBase, UtilityHelper, PersonIdentity, GraphComponent
 from pipeline.projects.sales.util import *
 from pipeline.util import \
 			GraphListSource, \
@@ -50,16 +51,16 @@ from pipeline.util import \
 			RecursiveExtractKeyedValue, \
 			ExtractKeyedValue, \
 			ExtractKeyedValues, \
-			MatchingFiles, \
 			identity, \
 			replace_key_pattern, \
 			strip_key_prefix
-from pipeline.io.file import MergingFileWriter
-from pipeline.io.memory import MergingMemoryWriter
+from pipeline.io.file import merging_writer
+from pipeline.util.checkpoint import save_checkpoint, load_checkpoint, restore_state
+from pipeline.util.state import LastWriterMap, UnionMap, AppendMap, CounterMap, StateGroup
+from pipeline.io.memory import MergingMemoryWriter, flush_memory_writers
 # from pipeline.io.arches import ArchesWriter
 import pipeline.linkedart
 from pipeline.linkedart import add_crom_data, get_crom_object
-from pipeline.io.csv import CurriedCSVReader
 from pipeline.nodes.basic import \
 			RecordCounter, \
 			KeyManagement, \
@@ -427,19 +428,75 @@ class SalesUtilityHelper(UtilityHelper):
 		return lot_number
 
 
+class PriceParser:
+	'''
+	Currency name mappings and £sd-style price decimalization for `add_crom_price`.
+
+	The currency name mapping for each region (the shared `currencies` mapping, with
+	any `region_currencies` overrides for the region applied) is built once, and the
+	parsing of the `maxsize` most recently used distinct (price, currency, region)
+	values is cached.
+	'''
+	def __init__(self, currencies, region_currencies, decimalization, maxsize=10000):
+		self.currencies = currencies
+		self.decimalization = decimalization
+		self.region_mappings = {}
+		for region, overrides in region_currencies.items():
+			c = currencies.copy()
+			c.update(overrides)
+			self.region_mappings[region] = c
+		self.parse = functools.lru_cache(maxsize=maxsize)(self.parse)
+
+	@classmethod
+	def from_services(cls, services):
+		return cls(services['currencies'], services.get('region_currencies', {}), services['currencies_decimalization'], maxsize=settings.price_cache_size)
+
+	def currency_mapping(self, region):
+		'''Return the currency name mapping to use for records from `region`.'''
+		return self.region_mappings.get(region, self.currencies)
+
+	def parse(self, price, currency, region):
+		'''
+		Parse a hyphen-separated price (e.g. '10-5-0') in the named currency, returning
+		a tuple of the decimalized value (as a string) and the verbatim name of the price
+		(e.g. '10 pounds, 5 shillings'). Returns `None` if the price cannot be parsed.
+		'''
+		return self._parse(price, currency, self.currency_mapping(region))
+
+	def _parse(self, price, currency, mapping):
+		try:
+			price = price.replace('[?]', '').strip()
+			currency = mapping.get(currency.lower(), currency)
+			parts = [int(v) for v in price.split('-')]
+			if currency in self.decimalization:
+				decimalization_data = self.decimalization[currency]
+				primary_unit = decimalization_data['primary_unit']
+				primary_value = int(parts.pop(0))
+				total_price = Fraction(primary_value)
+				part_names = [f'{primary_value} {primary_unit}']
+				for value, unit in zip(parts, decimalization_data['subunits']):
+					if value:
+						name, denom = unit
+						frac = Fraction(value, denom)
+						total_price += frac
+						part_names.append(f'{value} {name}')
+				return (str(float(total_price)), ', '.join(part_names))
+			else:
+				warnings.warn(f'No decimalization rules for currency {currency!r}')
+				return (price, price)
+		except (ValueError, KeyError):
+			return None
+
 def add_crom_price(data, parent, services, add_citations=False):
 	'''
 	Add modeling data for `MonetaryAmount`, `StartingPrice`, or `EstimatedPrice`,
 	based on properties of the supplied `data` dict.
 	'''
-	currencies = services['currencies']
-	decimalization = services['currencies_decimalization']
-	region_currencies = services['region_currencies']
+	parser = services.get('price_parser')
+	if parser is None:
+		parser = services['price_parser'] = PriceParser.from_services(services)
 	cno = parent['catalog_number']
 	region, _ = cno.split('-', 1)
-	c = currencies.copy()
-	if region in region_currencies:
-		c.update(region_currencies[region])
 
 	verbatim = []
 	for k in ('price', 'est_price', 'start_price', 'ask_price'):
@@ -449,34 +506,14 @@ def add_crom_price(data, parent, services, add_citations=False):
 		# of any classification (estimated/starting/asking)
 		if k in data:
 			price = data.get(k)
-			if '-' in price:
-				with suppress(ValueError, KeyError):
-					price = price.replace('[?]', '').strip()
-					currency = data['currency']
-					currency = c.get(currency.lower(), currency)
-					parts = [int(v) for v in price.split('-')]
-					if currency in decimalization:
-						decimalization_data = decimalization[currency]
-						primary_unit = decimalization_data['primary_unit']
-						primary_value = int(parts.pop(0))
-						total_price = Fraction(primary_value)
-						part_names = [f'{primary_value} {primary_unit}']
-						for value, unit in zip(parts, decimalization_data['subunits']):
-							if value:
-								name, denom = unit
-								frac = Fraction(value, denom)
-								total_price += frac
-								part_names.append(f'{value} {name}')
-						decimalized_value = str(float(total_price))
-						verbatim.append(', '.join(part_names))
-					else:
-						decimalized_value = price
-						warnings.warn(f'No decimalization rules for currency {currency!r}')
-						verbatim.append(price)
+			if '-' in price and 'currency' in data:
+				parsed = parser.parse(price, data['currency'], region)
+				if parsed:
 					# handle decimalization of £sd price, and preserve the original value in verbatim
-					data[k] = decimalized_value
+					data[k], name = parsed
+					verbatim.append(name)
 
-	amnt = extract_monetary_amount(data, currency_mapping=c, add_citations=add_citations)
+	amnt = extract_monetary_amount(data, currency_mapping=parser.currency_mapping(region), add_citations=add_citations)
 	if amnt:
 		for v in verbatim:
 			amnt.identified_by = model.Name(ident='', content=v)
@@ -489,8 +526,22 @@ def add_crom_price(data, parent, services, add_citations=False):
 
 class SalesPipeline(PipelineBase):
 	'''Bonobo-based pipeline for transforming Sales data from CSV into JSON-LD.'''
+
+	# contents columns that are not modeled (they are only preserved in the star_csv_data text)
+	unused_contents_columns = frozenset({
+		'expert_auth_1', 'expert_ulan_1', 'expert_auth_2', 'expert_ulan_2', 'expert_auth_3', 'expert_ulan_3', 'expert_auth_4', 'expert_ulan_4',
+		'commissaire_pr_1', 'comm_ulan_1', 'commissaire_pr_2', 'comm_ulan_2', 'commissaire_pr_3', 'comm_ulan_3', 'commissaire_pr_4', 'comm_ulan_4',
+		'auction_house_1', 'house_ulan_1', 'auction_house_2', 'house_ulan_2', 'auction_house_3', 'house_ulan_3', 'auction_house_4', 'house_ulan_4',
+	})
+
 	def __init__(self, input_path, catalogs, auction_events, contents, **kwargs):
 		project_name = 'sales'
+		if settings.mint_uuids:
+			# the post-sale rewriting of object URIs (by URI prefix) has to happen before they are rewritten to UUIDs
+			raise ValueError('The sales pipeline does not support minting UUIDs at serialization time (GETTY_PIPELINE_MINT_UUIDS)')
+		if settings.incremental_state_path:
+			# auction events, catalogs and the post-sale map are built up across all rows, and consumed by later graph components
+			raise ValueError('The sales pipeline does not support incremental runs (GETTY_PIPELINE_INCREMENTAL)')
 		self.input_path = input_path
 		self.services = None
 
@@ -552,12 +603,16 @@ class SalesPipeline(PipelineBase):
 		with fs.open(self.contents_header_file, newline='') as csvfile:
 			r = csv.reader(csvfile)
 			self.contents_headers = [v.lower() for v in next(r)]
+		self.contents_columns = [h for h in self.contents_headers if h not in self.unused_contents_columns]
 
 	def setup_services(self):
 	# Set up environment
 		'''Return a `dict` of named services available to the bonobo pipeline.'''
 		services = super().setup_services()
 
+		if 'currencies' in services and 'currencies_decimalization' in services:
+			services['price_parser'] = PriceParser.from_services(services)
+
 		# make these case-insensitive by wrapping the value lists in CaseFoldingSet
 		for name in ('transaction_types', 'attribution_modifiers', 'date_modifiers'):
 			if name in services:
@@ -573,18 +628,18 @@ class SalesPipeline(PipelineBase):
 			# to avoid constructing new MakeLinkedArtPerson objects millions of times, this
 			# is passed around as a service to the functions and classes that require it.
 			'make_la_person': pipeline.linkedart.MakeLinkedArtPerson(),
-			'unique_catalogs': defaultdict(set),
-			'post_sale_map': {},
-			'event_properties': {
-				'auction_houses': defaultdict(list),
-				'auction_dates': {},
-				'auction_date_label': {},
-				'auction_locations': {},
-				'experts': defaultdict(list),
-				'commissaire': defaultdict(list),
-			},
-			'non_auctions': {},
-			'counts': defaultdict(int)
+			'unique_catalogs': UnionMap(),
+			'post_sale_map': LastWriterMap(),
+			'event_properties': StateGroup({
+				'auction_houses': AppendMap(),
+				'auction_dates': LastWriterMap(),
+				'auction_date_label': LastWriterMap(),
+				'auction_locations': LastWriterMap(),
+				'experts': AppendMap(),
+				'commissaire': AppendMap(),
+			}),
+			'non_auctions': LastWriterMap(),
+			'counts': CounterMap()
 		})
 		return services
 
@@ -769,18 +824,18 @@ class SalesPipeline(PipelineBase):
 		return bid_acqs
 
 	def add_sales_chain(self, graph, records, services, serialize=True):
-		'''Add transformation of sales records to the bonobo pipeline.'''
+		'''
+		Add transformation of sales records to the bonobo pipeline.
+
+		The input records are expected to already have the star_csv_data text (see the
+		`preserve_fields` option of `CurriedCSVReader`).
+		'''
 		sales = graph.add_chain(
-			PreserveCSVFields(key='star_csv_data', order=self.contents_headers),
 			KeyManagement(
 				drop_empty=True,
 				operations=[
 					{
-						'remove': {
-							'expert_auth_1', 'expert_ulan_1', 'expert_auth_2', 'expert_ulan_2', 'expert_auth_3', 'expert_ulan_3', 'expert_auth_4', 'expert_ulan_4',
-							'commissaire_pr_1', 'comm_ulan_1', 'commissaire_pr_2', 'comm_ulan_2', 'commissaire_pr_3', 'comm_ulan_3', 'commissaire_pr_4', 'comm_ulan_4',
-							'auction_house_1', 'house_ulan_1', 'auction_house_2', 'house_ulan_2', 'auction_house_3', 'house_ulan_3', 'auction_house_4', 'house_ulan_4',
-						},
+						'remove': self.unused_contents_columns,
 						'group_repeating': {
 							'expert': {'prefixes': ('expert_auth', 'expert_ulan')},
 							'commissaire': {'prefixes': ('commissaire_pr', 'comm_ulan')},
@@ -1241,8 +1296,7 @@ class SalesPipeline(PipelineBase):
 		component3 = [graph0] if single_graph else [graph3]
 		for g in component1:
 			auction_events_records = g.add_chain(
-				MatchingFiles(path='/', pattern=self.auction_events_files_pattern, fs='fs.data.sales'),
-				CurriedCSVReader(fs='fs.data.sales', limit=self.limit, field_names=self.auction_events_headers),
+				*self.csv_reader_nodes('fs.data.sales', self.auction_events_files_pattern, limit=self.limit, field_names=self.auction_events_headers),
 # 				AddFieldNames(field_names=self.auction_events_headers)
 			)
 
@@ -1258,8 +1312,7 @@ class SalesPipeline(PipelineBase):
 
 		for g in component2:
 			physical_catalog_records = g.add_chain(
-				MatchingFiles(path='/', pattern=self.catalogs_files_pattern, fs='fs.data.sales'),
-				CurriedCSVReader(fs='fs.data.sales', limit=self.limit, field_names=self.catalogs_headers),
+				*self.csv_reader_nodes('fs.data.sales', self.catalogs_files_pattern, limit=self.limit, field_names=self.catalogs_headers),
 # 				AddFieldNames(field_names=self.catalogs_headers),
 			)
 
@@ -1274,8 +1327,14 @@ class SalesPipeline(PipelineBase):
 
 		for g in component3:
 			contents_records = g.add_chain(
-				MatchingFiles(path='/', pattern=self.contents_files_pattern, fs='fs.data.sales'),
-				CurriedCSVReader(fs='fs.data.sales', limit=self.limit, field_names=self.contents_headers),
+				*self.csv_reader_nodes(
+					'fs.data.sales',
+					self.contents_files_pattern,
+					limit=self.limit,
+					field_names=self.contents_headers,
+					columns=self.contents_columns,
+					preserve_fields='star_csv_data'
+				),
 # 				AddFieldNames(field_names=self.contents_headers),
 			)
 			sales = self.add_sales_chain(g, contents_records, services, serialize=True)
@@ -1322,36 +1381,68 @@ class SalesPipeline(PipelineBase):
 			self._construct_graph(**kwargs)
 		return self.graph_3
 
-	def checkpoint(self):
+	def graph_components(self, **kwargs):
+		'''
+		Return the numbered graph components of the pipeline, with the services each of
+		them shares with the others.
+
+		The physical catalogs component reads (and adds to) the `non_auctions` data
+		collected from the auction events, and the auction contents component depends on
+		the data collected by both, so the components are always run in order.
+		'''
+		return [
+			GraphComponent(1, self.get_graph_1(**kwargs),
+				reads={'event_properties', 'non_auctions'},
+				writes={'event_properties', 'non_auctions', 'counts'}),
+			GraphComponent(2, self.get_graph_2(**kwargs),
+				reads={'non_auctions'},
+				writes={'non_auctions', 'unique_catalogs', 'counts'}),
+			GraphComponent(3, self.get_graph_3(**kwargs),
+				reads={'event_properties', 'non_auctions', 'unique_catalogs'},
+				writes={'non_auctions', 'post_sale_map', 'counts'}),
+		]
+
+	# services whose data is accumulated across the graph components, and which must be
+	# persisted in a checkpoint for a run to be resumed with a later component
+	checkpoint_services = ('event_properties', 'non_auctions', 'unique_catalogs', 'post_sale_map', 'counts')
+
+	def checkpoint(self, component=None, services=None):
+		'''
+		Called after each graph component has been run (`component` is the number of the
+		component that completed).
+		'''
 		pass
 
-	def run(self, services=None, **options):
-		'''Run the Sales bonobo pipeline.'''
+	def restore_checkpoint(self, component, services):
+		'''
+		Restore the state saved by `checkpoint` after graph component number `component`
+		into `services`.
+		'''
+		raise NotImplementedError(f'{type(self).__name__} does not support resuming from a checkpoint')
+
+	def run(self, services=None, resume_from=1, **options):
+		'''
+		Run the Sales bonobo pipeline.
+
+		If `resume_from` is greater than 1, the graph components before it are skipped,
+		and the state saved by the checkpoint after the previous component is restored.
+		'''
 		if self.verbose:
 			print(f'- Limiting to {self.limit} records per file', file=sys.stderr)
 		if not services:
 			services = self.get_services(**options)
 
-		if self.verbose:
-			print('Running graph component 1...', file=sys.stderr)
-		graph1 = self.get_graph_1(**options, services=services)
-		self.run_graph(graph1, services=services)
-
-		self.checkpoint()
-
-		if self.verbose:
-			print('Running graph component 2...', file=sys.stderr)
-		graph2 = self.get_graph_2(**options, services=services)
-		self.run_graph(graph2, services=services)
-
-		self.checkpoint()
+		if resume_from > 1:
+			if self.verbose:
+				print(f'Resuming from graph component {resume_from}...', file=sys.stderr)
+			self.restore_checkpoint(resume_from - 1, services)
 
-		if self.verbose:
-			print('Running graph component 3...', file=sys.stderr)
-		graph3 = self.get_graph_3(**options, services=services)
-		self.run_graph(graph3, services=services)
-
-		self.checkpoint()
+		components = [c for c in self.graph_components(services=services, **options) if c.name >= resume_from]
+		self.run_components(
+			components,
+			services=services,
+			after=lambda c: self.checkpoint(component=c.name, services=services)
+		)
 
 		if self.verbose:
 			print('Serializing static instances...', file=sys.stderr)
@@ -1421,7 +1512,7 @@ class SalesFilePipeline(SalesPipeline):
 		if use_memory_writer:
 			w = MergingMemoryWriter(directory=self.output_path, partition_directories=True, model=model, **kwargs)
 		else:
-			w = MergingFileWriter(directory=self.output_path, partition_directories=True, model=model, **kwargs)
+			w = merging_writer(directory=self.output_path, partition_directories=True, model=model, **kwargs)
 		nodes.append(w)
 		self.writers += nodes
 		return nodes
@@ -1460,18 +1551,45 @@ class SalesFilePipeline(SalesPipeline):
 			json.dump(post_sale_rewrite_map, f)
 			print(f'Saved post-sales rewrite map to {rewrite_map_filename}')
 
-	def checkpoint(self):
+	@staticmethod
+	def checkpoint_filename():
+		return os.path.join(settings.pipeline_tmp_path, 'sales-checkpoint.json.gz')
+
+	def checkpoint(self, component=None, services=None):
+		'''
+		Flush the pending data of the memory writers to disk, and save the state of the
+		`checkpoint_services` (and the static instances used so far) so that a later run
+		can be resumed with the next graph component.
+		'''
+		self.flush_writers(verbose=False)
+		if component and services:
+			state = {
+				'component': component,
+				'services': {name: services[name] for name in self.checkpoint_services if name in services},
+				'static_instances': self.static_instances.used,
+			}
+			filename = self.checkpoint_filename()
+			save_checkpoint(filename, state)
+			if self.verbose:
+				print(f'Saved checkpoint for graph component {component} to {filename}', file=sys.stderr)
+		super().checkpoint(component=component, services=services)
+
+	def restore_checkpoint(self, component, services):
+		filename = self.checkpoint_filename()
+		if not os.path.exists(filename):
+			raise ValueError(f'No checkpoint found at {filename}')
+		state = load_checkpoint(filename)
+		if state['component'] < component:
+			raise ValueError(f'Checkpoint at {filename} is for graph component {state["component"]}, but component {component} is required')
+		for name, value in state['services'].items():
+			restore_state(services[name], value)
+		self.static_instances.used |= state['static_instances']
+
+	def flush_component_output(self):
 		self.flush_writers(verbose=False)
-		super().checkpoint()
 
 	def flush_writers(self, **kwargs):
-		verbose = kwargs.get('verbose', True)
-		count = len(self.writers)
-		for seq_no, w in enumerate(self.writers):
-			if verbose:
-				print('[%d/%d] writers being flushed' % (seq_no+1, count))
-			if isinstance(w, MergingMemoryWriter):
-				w.flush(**kwargs)
+		flush_memory_writers(self.writers, verbose=kwargs.get('verbose', True))
 
 	def run(self, **options):
 		'''Run the Sales bonobo pipeline.'''
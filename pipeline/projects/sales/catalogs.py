@@ -14,6 +14,7 @@ from pipeline.linkedart import add_crom_data, get_crom_object, \
 class AddAuctionCatalog(Configurable):
 	helper = Option(required=True)
 	non_auctions = Service('non_auctions')
+	state_writes = ('non_auctions',)
 	
 	def __call__(self, data:dict, non_auctions):
 		'''Add modeling for auction catalogs as linguistic objects'''
@@ -25,11 +26,11 @@ class AddAuctionCatalog(Configurable):
 		# but will have access to the `non_auctions` service which was shared from the events branch)
 		sale_type = non_auctions.get(cno, data.get('non_auction_flag'))
 		if sale_type:
-			non_auctions[cno] = sale_type
+			non_auctions.merge_value(cno, sale_type)
 		sale_type = sale_type or 'Auction'
 		catalog = self.helper.catalog_text(cno, sale_type)
 
-		content = data['star_csv_data']
+		content = str(data['star_csv_data'])
 		row = vocab.Transcription(ident='', content=content)
 		row.part_of = self.helper.static_instances.get_instance('LinguisticObject', 'db-sales_events')
 		creation = vocab.TranscriptionProcess(ident='')
@@ -77,6 +78,7 @@ class AddPhysicalCatalogOwners(Configurable):
 	helper = Option(required=True)
 	location_codes = Service('location_codes')
 	unique_catalogs = Service('unique_catalogs')
+	state_writes = ('unique_catalogs',)
 
 	def __call__(self, data:dict, location_codes, unique_catalogs):
 		'''Add information about the ownership of a physical copy of an auction catalog'''
@@ -111,7 +113,7 @@ class AddPhysicalCatalogOwners(Configurable):
 
 		owner_uri = self.helper.physical_catalog_uri(cno, owner_code, None) # None here because we want a key that will stand in for all the copies belonging to a single owner
 		copy_uri = self.helper.physical_catalog_uri(cno, owner_code, copy_number)
-		unique_catalogs[owner_uri].add(copy_uri)
+		unique_catalogs.merge_value(owner_uri, {copy_uri})
 		return data
 
 #mark - Physical Catalogs - Informational Catalogs
@@ -158,6 +160,7 @@ class PopulateAuctionCatalog(Configurable):
 class AddAuctionCatalogEntry(Configurable):
 	helper = Option(required=True)
 	non_auctions = Service('non_auctions')
+	state_writes = ('non_auctions',)
 	
 	def __call__(self, data:dict, non_auctions):
 		'''Add modeling for auction catalogs as linguistic objects'''
@@ -175,7 +178,7 @@ class AddAuctionCatalogEntry(Configurable):
 
 		sale_type = non_auctions.get(cno, data.get('non_auction_flag'))
 		if sale_type:
-			non_auctions[cno] = sale_type
+			non_auctions.merge_value(cno, sale_type)
 		sale_type = sale_type or 'Auction'
 		catalog = self.helper.catalog_text(cno, sale_type)
 
@@ -213,7 +216,7 @@ class AddPhysicalCatalogEntry(Configurable):
 		sale_type = non_auctions.get(cno, data.get('non_auction_flag', 'Auction'))
 		keys = [v for v in [cno, owner, copy] if v]
 		record_uri = self.helper.make_proj_uri('ENTRY', 'PHYS-CAT', *keys)
-		content = data['star_csv_data']
+		content = str(data['star_csv_data'])
 
 		catalog_label = self.helper.physical_catalog_label(cno, sale_type, owner, copy)
 		row_name = f'STAR Entry for Physical {catalog_label}'
@@ -17,6 +17,7 @@ from pipeline.linkedart import add_crom_data, get_crom_object, remove_crom_objec
 class AddAuctionEvent(Configurable):
 	helper = Option(required=True)
 	event_properties = Service('event_properties')
+	state_writes = ('event_properties',)
 	date_modifiers = Service('date_modifiers')
 
 	def __call__(self, data:dict, event_properties, date_modifiers):
@@ -32,8 +33,8 @@ class AddAuctionEvent(Configurable):
 			'sale_end_', 'eoe'
 		)
 		
-		event_properties['auction_dates'][cno] = (ts, begin, end)
-		event_properties['auction_date_label'][cno] = ts._label
+		event_properties['auction_dates'].merge_value(cno, (ts, begin, end))
+		event_properties['auction_date_label'].merge_value(cno, ts._label)
 		
 		event_date_label = event_properties['auction_date_label'].get(cno)
 		auction, uid, uri = self.helper.sale_event_for_catalog_number(cno, sale_type, date_label=event_date_label)
@@ -50,6 +51,7 @@ class AddAuctionEvent(Configurable):
 class PopulateAuctionEvent(Configurable):
 	helper = Option(required=True)
 	event_properties = Service('event_properties')
+	state_writes = ('event_properties',)
 	date_modifiers = Service('date_modifiers')
 
 	def auction_event_location(self, data:dict):
@@ -139,7 +141,7 @@ class PopulateAuctionEvent(Configurable):
 		if place:
 			data['_locations'] = [place_data]
 			auction.took_place_at = place
-			auction_locations[cno] = place.clone(minimal=True)
+			auction_locations.merge_value(cno, place.clone(minimal=True))
 
 		ts, begin, end = timespan_from_bound_components(
 			data,
@@ -157,7 +159,7 @@ class PopulateAuctionEvent(Configurable):
 				relative_id=f'expert-{seq_no+1}',
 				role='expert'
 			)
-			event_experts[cno].append(person.clone(minimal=True))
+			event_experts.merge_value(cno, [person.clone(minimal=True)])
 			data['_organizers'].append(add_crom_data(data={}, what=person))
 			role_id = '' # self.helper.make_proj_uri('AUCTION-EVENT', cno, 'Expert', seq_no)
 			role = vocab.Expert(ident=role_id, label=f'Role of Expert in the event {cno}')
@@ -171,7 +173,7 @@ class PopulateAuctionEvent(Configurable):
 				relative_id=f'commissaire-{seq_no+1}',
 				role='commissaire'
 			)
-			event_commissaires[cno].append(person.clone(minimal=True))
+			event_commissaires.merge_value(cno, [person.clone(minimal=True)])
 			data['_organizers'].append(add_crom_data(data={}, what=person))
 			role_id = '' # self.helper.make_proj_uri('AUCTION-EVENT', cno, 'Commissaire', seq_no)
 			role = vocab.CommissairePriseur(ident=role_id, label=f'Role of Commissaire-priseur in the event {cno}')
@@ -208,6 +210,7 @@ class PopulateAuctionEvent(Configurable):
 class AddAuctionHouses(Configurable):
 	helper = Option(required=True)
 	event_properties = Service('event_properties')
+	state_writes = ('event_properties',)
 
 	def __call__(self, data:dict, event_properties):
 		'''
@@ -236,5 +239,5 @@ class AddAuctionHouses(Configurable):
 			act.carried_out_by = house
 			auction.part = act
 			d['_organizers'].append(h)
-		event_properties['auction_houses'][cno] += house_dicts
+		event_properties['auction_houses'].merge_value(cno, house_dicts)
 		return d
@@ -436,7 +436,7 @@ class AddAcquisitionOrBidding(ProvenanceBase):
 		if value is None:
 			return None
 		c = value.clone()
-		c.id = "urn:uuid:%s" % uuid.uuid4()
+		c.id = factory.generate_id(c)
 		return c
 
 	def attach_source_catalog(self, data, acq, people):
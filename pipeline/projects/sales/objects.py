@@ -32,6 +32,7 @@ class PopulateSalesObject(Configurable, pipeline.linkedart.PopulateObject):
 	title_modifiers = Service('title_modifiers')
 	event_properties = Service('event_properties')
 	transaction_classification = Service('transaction_classification')
+	state_writes = ('post_sale_map',)
 
 	def populate_destruction_events(self, data:dict, note, *, type_map, location=None):
 		destruction_types_map = type_map
@@ -132,7 +133,7 @@ class PopulateSalesObject(Configurable, pipeline.linkedart.PopulateObject):
 		puid = parent.get('persistent_puid')
 		puid_id = self.helper.gpi_number_id(puid)
 
-		content = data['star_csv_data']
+		content = str(data['star_csv_data'])
 		row = vocab.Transcription(ident='', content=content)
 		row.part_of = self.helper.static_instances.get_instance('LinguisticObject', 'db-sales_contents')
 		creation = vocab.TranscriptionProcess(ident='')
@@ -313,10 +314,10 @@ class PopulateSalesObject(Configurable, pipeline.linkedart.PopulateObject):
 						that_key = (pcno, plno, pdate)
 						if rev:
 							# `that_key` is for a previous sale for this object
-							post_sale_map[this_key] = that_key
+							post_sale_map.merge_value(this_key, that_key)
 						else:
 							# `that_key` is for a later sale for this object
-							post_sale_map[that_key] = this_key
+							post_sale_map.merge_value(that_key, this_key)
 
 	def _populate_object_materials(self, data:dict, materials_map):
 		hmo = get_crom_object(data)
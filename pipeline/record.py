@@ -0,0 +1,213 @@
+import weakref
+from collections.abc import Mapping, KeysView, ItemsView, ValuesView
+
+_MISSING = object()
+
+class Record(dict):
+	'''
+	A `dict`-compatible envelope for the data passed between pipeline nodes.
+
+	The pipeline-internal keys `_CROM_FACTORY`, `_LOD_OBJECT`, and `parent_data` are
+	stored in slots rather than in the dictionary storage, but are otherwise accessed
+	exactly as if they were ordinary keys (item access, `get`, `in`, iteration, etc.).
+
+	The `parent_data` link may be held weakly (see `set_parent`), so that a child record
+	extracted from a larger record (e.g. with `ExtractKeyedValues`) does not keep the
+	entire parent tree alive for as long as the child is referenced. A weak parent link
+	whose referent has been collected behaves as if the key was never set.
+	'''
+	__slots__ = ('_crom_factory', '_lod_object', '_parent', '__weakref__')
+	_slot_names = {
+		'_CROM_FACTORY': '_crom_factory',
+		'_LOD_OBJECT': '_lod_object',
+		'parent_data': '_parent',
+	}
+
+	def __init__(self, *args, **kwargs):
+		super().__init__()
+		self._crom_factory = _MISSING
+		self._lod_object = _MISSING
+		self._parent = _MISSING
+		self.update(*args, **kwargs)
+
+	@classmethod
+	def from_fields(cls, names, values):
+		'''
+		Return a new record mapping each of `names` to the corresponding item of `values`
+		(e.g. a CSV header and row). This bypasses the handling of the pipeline-internal
+		keys, so `names` must not include any of them.
+		'''
+		r = cls()
+		dict.update(r, zip(names, values))
+		return r
+
+	def set_parent(self, parent, weak=False):
+		'''
+		Set the `parent_data` link of this record. If `weak` is `True` and `parent`
+		supports weak references (i.e. is itself a `Record`), the link will not keep
+		`parent` alive.
+		'''
+		if weak and isinstance(parent, Record):
+			self._parent = weakref.ref(parent)
+		else:
+			self._parent = parent
+
+	def drop_parent(self):
+		'''Explicitly drop the `parent_data` link of this record.'''
+		self._parent = _MISSING
+
+	def _slot_value(self, slot):
+		value = getattr(self, slot)
+		if isinstance(value, weakref.ref):
+			value = value()
+			if value is None:
+				return _MISSING
+		return value
+
+	def _slot_items(self):
+		for key, slot in self._slot_names.items():
+			value = self._slot_value(slot)
+			if value is not _MISSING:
+				yield key, value
+
+	def __getitem__(self, key):
+		slot = self._slot_names.get(key)
+		if slot is None:
+			return super().__getitem__(key)
+		value = self._slot_value(slot)
+		if value is _MISSING:
+			raise KeyError(key)
+		return value
+
+	def __setitem__(self, key, value):
+		slot = self._slot_names.get(key)
+		if slot is None:
+			super().__setitem__(key, value)
+		else:
+			setattr(self, slot, value)
+
+	def __delitem__(self, key):
+		slot = self._slot_names.get(key)
+		if slot is None:
+			super().__delitem__(key)
+		elif self._slot_value(slot) is _MISSING:
+			raise KeyError(key)
+		else:
+			setattr(self, slot, _MISSING)
+
+	def __contains__(self, key):
+		slot = self._slot_names.get(key)
+		if slot is None:
+			return super().__contains__(key)
+		return self._slot_value(slot) is not _MISSING
+
+	def __iter__(self):
+		yield from super().__iter__()
+		for key, _ in self._slot_items():
+			yield key
+
+	def __len__(self):
+		return super().__len__() + sum(1 for _ in self._slot_items())
+
+	def __eq__(self, other):
+		if not isinstance(other, Mapping):
+			return NotImplemented
+		return dict(self.items()) == dict(other.items())
+
+	def __ne__(self, other):
+		eq = self.__eq__(other)
+		if eq is NotImplemented:
+			return eq
+		return not eq
+
+	__hash__ = None
+
+	def __repr__(self):
+		return f'{type(self).__name__}({dict(self.items())!r})'
+
+	def __reduce__(self):
+		return (type(self), (dict(self.items()),))
+
+	def get(self, key, default=None):
+		try:
+			return self[key]
+		except KeyError:
+			return default
+
+	def setdefault(self, key, default=None):
+		try:
+			return self[key]
+		except KeyError:
+			self[key] = default
+			return default
+
+	def pop(self, key, *default):
+		try:
+			value = self[key]
+		except KeyError:
+			if default:
+				return default[0]
+			raise
+		del self[key]
+		return value
+
+	def popitem(self):
+		for key, value in self._slot_items():
+			del self[key]
+			return key, value
+		return super().popitem()
+
+	def clear(self):
+		super().clear()
+		self._crom_factory = _MISSING
+		self._lod_object = _MISSING
+		self._parent = _MISSING
+
+	def keys(self):
+		return KeysView(self)
+
+	def items(self):
+		return ItemsView(self)
+
+	def values(self):
+		return ValuesView(self)
+
+	def update(self, *args, **kwargs):
+		if len(args) > 1:
+			raise TypeError(f'update expected at most 1 positional argument, got {len(args)}')
+		if args:
+			other = args[0]
+			if isinstance(other, Mapping):
+				for key in other.keys():
+					self[key] = other[key]
+			elif hasattr(other, 'keys'):
+				for key in other.keys():
+					self[key] = other[key]
+			else:
+				for key, value in other:
+					self[key] = value
+		for key, value in kwargs.items():
+			self[key] = value
+
+	def copy(self):
+		'''
+		Return a shallow copy of this record. A weakly held parent link remains weak in
+		the copy.
+		'''
+		r = type(self)(super().items())
+		r._crom_factory = self._crom_factory
+		r._lod_object = self._lod_object
+		r._parent = self._parent
+		return r
+
+def child_record(data, parent, include_parent=True, weak_parent=False):
+	'''
+	Return a new `Record` with a shallow copy of the key-value pairs in `data`, and
+	(if `include_parent` is `True`) with a `parent_data` link to `parent`.
+	'''
+	child = Record(data)
+	if include_parent:
+		child.set_parent(parent, weak=weak_parent)
+	else:
+		child.drop_parent()
+	return child
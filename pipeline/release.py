@@ -0,0 +1,143 @@
+'''
+Content-hash manifests of the pipeline output, and delta release archives.
+
+A manifest lists every output resource file (the JSON-LD and N-Quads files in the model
+directories of an output tree) as a tab-separated line:
+
+  PATH <tab> ID <tab> MODEL <tab> SHA256 <tab> SIZE <tab> MTIME
+
+where PATH is relative to the output directory, ID is the resource UUID (the file name
+without its extension), and MTIME is the modification time (in nanoseconds) of the
+file when it was hashed. Comparing the manifest of a release with that of the previous
+release yields the files that were added, changed and removed, and a delta archive
+holds only the added and changed files, with a list of the changes.
+'''
+
+import io
+import os
+import csv
+import time
+import tarfile
+import hashlib
+import multiprocessing
+from collections import namedtuple
+
+ManifestEntry = namedtuple('ManifestEntry', ('id', 'model', 'hash', 'size', 'mtime'))
+Delta = namedtuple('Delta', ('added', 'changed', 'removed'))
+Delta.__doc__ = 'The sorted lists of the paths added, changed and removed between two manifests.'
+
+RESOURCE_SUFFIXES = ('.json', '.nq')
+
+def resource_files(path, suffixes=RESOURCE_SUFFIXES):
+	'''
+	Yield the paths (relative to `path`) of the resource files in the model directories
+	of the output directory `path`.
+	'''
+	for model in sorted(os.listdir(path)):
+		root = os.path.join(path, model)
+		if model == 'tmp' or not os.path.isdir(root):
+			continue
+		for dirpath, dirnames, filenames in os.walk(root):
+			dirnames[:] = sorted(d for d in dirnames if d != 'tmp')
+			for f in sorted(filenames):
+				if f.endswith(suffixes):
+					yield os.path.relpath(os.path.join(dirpath, f), path)
+
+def _hash_file(args):
+	root, rel = args
+	h = hashlib.sha256()
+	filename = os.path.join(root, rel)
+	st = os.stat(filename)
+	with open(filename, 'rb') as fh:
+		for chunk in iter(lambda: fh.read(1 << 20), b''):
+			h.update(chunk)
+	return rel, h.hexdigest(), st.st_size, st.st_mtime_ns
+
+def _entry(rel, digest, size, mtime):
+	parts = rel.split(os.sep)
+	name = os.path.splitext(parts[-1])[0]
+	return ManifestEntry(name, parts[0], digest, size, mtime)
+
+def build_manifest(path, previous=None, processes=None):
+	'''
+	Return the manifest (a `dict` mapping paths to `ManifestEntry` values) of the output
+	directory `path`, hashing files in a pool of `processes` worker processes. The hashes
+	of files whose size and modification time match their entry in the `previous`
+	manifest of the same directory are re-used.
+	'''
+	previous = previous or {}
+	manifest = {}
+	todo = []
+	for rel in resource_files(path):
+		old = previous.get(rel)
+		if old:
+			st = os.stat(os.path.join(path, rel))
+			if st.st_size == old.size and st.st_mtime_ns == old.mtime:
+				manifest[rel] = old
+				continue
+		todo.append((path, rel))
+
+	if todo:
+		if processes == 1:
+			results = map(_hash_file, todo)
+			for rel, digest, size, mtime in results:
+				manifest[rel] = _entry(rel, digest, size, mtime)
+		else:
+			with multiprocessing.Pool(processes) as pool:
+				for rel, digest, size, mtime in pool.imap_unordered(_hash_file, todo, chunksize=64):
+					manifest[rel] = _entry(rel, digest, size, mtime)
+	return manifest
+
+def read_manifest(filename):
+	manifest = {}
+	with open(filename, 'r', encoding='utf-8', newline='') as fh:
+		for row in csv.reader(fh, delimiter='\t'):
+			rel, uu, model, digest, size, mtime = row
+			manifest[rel] = ManifestEntry(uu, model, digest, int(size), int(mtime))
+	return manifest
+
+def write_manifest(filename, manifest):
+	tmp = f'{filename}.tmp'
+	with open(tmp, 'w', encoding='utf-8', newline='') as fh:
+		w = csv.writer(fh, delimiter='\t', lineterminator='\n')
+		for rel in sorted(manifest):
+			w.writerow((rel, *manifest[rel]))
+	os.replace(tmp, filename)
+
+def compare_manifests(previous, current):
+	'''Return the `Delta` between the `previous` and `current` manifests.'''
+	added = sorted(set(current) - set(previous))
+	removed = sorted(set(previous) - set(current))
+	changed = sorted(rel for rel in set(current) & set(previous) if current[rel].hash != previous[rel].hash)
+	return Delta(added, changed, removed)
+
+def write_delta_archive(filename, path, delta, previous, current, suffixes=RESOURCE_SUFFIXES, arcname=''):
+	'''
+	Write a gzipped tar archive `filename` holding the added and changed files (with the
+	given `suffixes`) of the output directory `path`, and a `changes.tsv` file listing
+	each added, changed and removed file with its resource id, model and hash (from the
+	`current` manifest, or the `previous` one for removed files). Archive members are
+	placed under `arcname`. Returns the number of files archived.
+	'''
+	changes = []
+	for status, paths, manifest in (('added', delta.added, current), ('changed', delta.changed, current), ('removed', delta.removed, previous)):
+		for rel in paths:
+			if rel.endswith(suffixes):
+				e = manifest[rel]
+				changes.append((status, rel, e.id, e.model, e.hash))
+	changes.sort(key=lambda c: c[1])
+
+	tmp = f'{filename}.tmp'
+	count = 0
+	with tarfile.open(tmp, 'w:gz') as tar:
+		for status, rel, *_ in changes:
+			if status != 'removed':
+				tar.add(os.path.join(path, rel), arcname=os.path.join(arcname, rel))
+				count += 1
+		listing = ''.join('\t'.join(c) + '\n' for c in changes).encode('utf-8')
+		info = tarfile.TarInfo(os.path.join(arcname, 'changes.tsv'))
+		info.size = len(listing)
+		info.mtime = int(time.time())
+		tar.addfile(info, io.BytesIO(listing))
+	os.replace(tmp, filename)
+	return count
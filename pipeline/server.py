@@ -0,0 +1,242 @@
+'''
+A long-running server that models input rows with a warm pipeline (see
+`pipeline.transform`), for quickly re-modeling individual records.
+
+The server speaks HTTP, on a localhost TCP port or on a Unix socket:
+
+  POST /transform    a JSON object mapping input source names to lists of rows (each a
+                     list of strings in the order of the source's header, or an object
+                     keyed by field name); responds with the JSON object mapping each
+                     Arches model to the JSON-LD of its resources, keyed by URI
+  GET /metrics       request counts and latency statistics
+
+Requests are modeled by a bounded pool of worker processes, each forked from the
+process holding the warm `Transformer`. Requests that arrive while all workers are busy
+wait in a queue of bounded size; once the queue is full, further requests are rejected
+with a 503 response.
+'''
+
+import os
+import csv
+import json
+import time
+import threading
+import socketserver
+import multiprocessing
+from collections import deque
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def read_csv_rows(path, pattern):
+	'''Return the rows of all the CSV files in `path` that match the glob `pattern`.'''
+	rows = []
+	for filename in sorted(Path(path).glob(pattern)):
+		with open(filename, newline='') as fh:
+			rows += list(csv.reader(fh))
+	return rows
+
+class ServiceBusy(Exception):
+	pass
+
+class LatencyMetrics:
+	'''
+	Request counts and the latency statistics of the most recent `window` requests.
+	'''
+	def __init__(self, window=1000):
+		self.lock = threading.Lock()
+		self.latencies = deque(maxlen=window)
+		self.started = time.time()
+		self.requests = 0
+		self.errors = 0
+		self.rejected = 0
+		self.in_flight = 0
+
+	def record(self, duration, ok=True):
+		with self.lock:
+			self.requests += 1
+			if not ok:
+				self.errors += 1
+			self.latencies.append(duration)
+
+	def reject(self):
+		with self.lock:
+			self.rejected += 1
+
+	def summary(self):
+		with self.lock:
+			latencies = sorted(self.latencies)
+			data = {
+				'uptime': round(time.time() - self.started, 3),
+				'requests': self.requests,
+				'errors': self.errors,
+				'rejected': self.rejected,
+				'in_flight': self.in_flight,
+			}
+		if latencies:
+			def percentile(p):
+				return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+			data['latency'] = {
+				'count': len(latencies),
+				'mean': sum(latencies) / len(latencies),
+				'p50': percentile(0.5),
+				'p95': percentile(0.95),
+				'p99': percentile(0.99),
+				'max': latencies[-1],
+			}
+		return data
+
+_transformer = None
+
+def _init_worker(transformer):
+	global _transformer
+	_transformer = transformer
+
+def _transform(rows):
+	return _transformer.transform(**rows)
+
+class TransformService:
+	'''
+	Models requests with the warm `transformer` in a pool of `workers` processes, with
+	at most `queue_size` further requests waiting for a free worker. With no workers,
+	requests are modeled (one at a time) in the calling thread.
+	'''
+	def __init__(self, transformer, workers=2, queue_size=8, timeout=60):
+		self.transformer = transformer
+		self.workers = workers
+		self.timeout = timeout
+		self.metrics = LatencyMetrics()
+		self.slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+		self.lock = threading.Lock()
+		self.pool = None
+		if workers:
+			ctx = multiprocessing.get_context('fork')
+			self.pool = ctx.Pool(workers, initializer=_init_worker, initargs=(transformer,))
+
+	def close(self):
+		if self.pool:
+			self.pool.terminate()
+			self.pool.join()
+			self.pool = None
+
+	def transform(self, rows):
+		'''
+		Return the modeled resources for the `rows` of each input source, raising
+		`ServiceBusy` if the request queue is full.
+		'''
+		if not self.slots.acquire(blocking=False):
+			self.metrics.reject()
+			raise ServiceBusy()
+		with self.metrics.lock:
+			self.metrics.in_flight += 1
+		start = time.monotonic()
+		ok = False
+		release = True
+		try:
+			if self.pool:
+				# the slot is released once the worker is done with the request, which
+				# may be well after the request has timed out
+				pending = self.pool.apply_async(_transform, (rows,), callback=self._release, error_callback=self._release)
+				release = False
+				result = pending.get(self.timeout)
+			else:
+				with self.lock:
+					result = self.transformer.transform(**rows)
+			ok = True
+			return result
+		finally:
+			self.metrics.record(time.monotonic() - start, ok)
+			with self.metrics.lock:
+				self.metrics.in_flight -= 1
+			if release:
+				self.slots.release()
+
+	def _release(self, result):
+		self.slots.release()
+
+class TransformRequestHandler(BaseHTTPRequestHandler):
+	server_version = 'PipelineTransform/1.0'
+
+	def address_string(self):
+		# requests on a Unix socket have no client address
+		if isinstance(self.client_address, tuple):
+			return self.client_address[0]
+		return 'unix'
+
+	def log_message(self, format, *args):
+		if self.server.verbose:
+			super().log_message(format, *args)
+
+	def send_json(self, status, data):
+		body = json.dumps(data).encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		if self.path == '/metrics':
+			self.send_json(200, self.server.service.metrics.summary())
+		else:
+			self.send_json(404, {'error': f'Not found: {self.path}'})
+
+	def do_POST(self):
+		if self.path != '/transform':
+			self.send_json(404, {'error': f'Not found: {self.path}'})
+			return
+		try:
+			length = int(self.headers.get('Content-Length', 0))
+			rows = json.loads(self.rfile.read(length).decode('utf-8'))
+			if not isinstance(rows, dict):
+				raise ValueError('Request must be a JSON object mapping input sources to lists of rows')
+		except ValueError as e:
+			self.send_json(400, {'error': str(e)})
+			return
+
+		try:
+			output = self.server.service.transform(rows)
+		except ServiceBusy:
+			self.send_json(503, {'error': 'All workers are busy'})
+		except multiprocessing.TimeoutError:
+			self.send_json(504, {'error': 'Request timed out'})
+		except ValueError as e:
+			self.send_json(400, {'error': str(e)})
+		except Exception as e:
+			self.send_json(500, {'error': f'{type(e).__name__}: {e}'})
+		else:
+			self.send_json(200, output)
+
+class TransformHTTPServer(ThreadingHTTPServer):
+	daemon_threads = True
+
+	def __init__(self, address, service, verbose=False):
+		self.service = service
+		self.verbose = verbose
+		super().__init__(address, TransformRequestHandler)
+
+class TransformUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+	def __init__(self, path, service, verbose=False):
+		self.service = service
+		self.verbose = verbose
+		if os.path.exists(path):
+			os.remove(path)
+		super().__init__(path, TransformRequestHandler)
+
+	def server_close(self):
+		super().server_close()
+		if os.path.exists(self.server_address):
+			os.remove(self.server_address)
+
+def make_server(listen, service, verbose=False):
+	'''
+	Return a server for `service` listening on `listen`: a `HOST:PORT` address, or the
+	path of a Unix socket (starting with `/` or `./`, or prefixed with `unix:`).
+	'''
+	if listen.startswith('unix:'):
+		return TransformUnixServer(listen[5:], service, verbose=verbose)
+	if listen.startswith(('/', './')):
+		return TransformUnixServer(listen, service, verbose=verbose)
+	host, _, port = listen.rpartition(':')
+	return TransformHTTPServer((host or '127.0.0.1', int(port)), service, verbose=verbose)
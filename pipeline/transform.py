@@ -0,0 +1,302 @@
+'''
+An embeddable API for modeling in-memory input rows with a warm pipeline.
+
+A `Transformer` builds a CSV-based pipeline (e.g. `SalesPipeline`, `KnoedlerPipeline`,
+or `PeoplePipeline`) and its graph once, with its services, vocabulary registrations and
+static instances loaded. Each call to `transform` then runs the graph over the given rows
+(in place of the rows of the pipeline's input files), and returns the merged JSON-LD of
+the resulting resources, converted directly from the crom objects:
+
+  transformer = Transformer(KnoedlerPipeline, data={'header_file': 'knoedler_0.csv'})
+  output = transformer.transform(data=[row, ...])
+  # {ARCHES_MODEL: {URI: JSON-LD dict, ...}, ...}
+
+Only the modeling graph is run; whole-dataset post-processing steps (e.g. the post-sale
+rewriting of the sales pipeline, or rewriting URIs to UUIDs) are not.
+
+Rows whose modeling depends on the shared state accumulated from other inputs (e.g. the
+sales contents, which use the `event_properties` and `non_auctions` data of the auction
+events and catalogs) can be modeled on their own once those inputs have been loaded with
+`preload`:
+
+  transformer.preload(auction_events=[...], catalogs=[...])
+  output = transformer.transform(contents=[row, ...])
+'''
+
+import os
+import copy
+
+from bonobo.config import Configurable, Option
+from cromulent import vocab
+from cromulent.model import factory
+
+import pipeline.execution
+from pipeline.util import CromObjectMerger
+from pipeline.linkedart import assign_deterministic_ids
+from pipeline.util.state import StateGroup, is_shared_state
+from pipeline.io.csv import CurriedCSVReader
+from pipeline.io.memory import MergingMemoryWriter
+
+class _TrackedState:
+	'''
+	Mixin for the shared state maps of a `Transformer`, recording the keys whose values a
+	run may modify, so that only those are reset before the next run. Keys that are read
+	are recorded too, as their values (e.g. lists) may be modified in place; if all of the
+	values are accessed at once, the whole map is reset.
+	'''
+	def _touch(self, key):
+		try:
+			self._touched.add(key)
+		except AttributeError:
+			self._touched = {key}
+
+	def _touch_all(self):
+		self._reset_all = True
+
+	def __getitem__(self, key):
+		self._touch(key)
+		return super().__getitem__(key)
+
+	def __setitem__(self, key, value):
+		self._touch(key)
+		super().__setitem__(key, value)
+
+	def __delitem__(self, key):
+		self._touch(key)
+		super().__delitem__(key)
+
+	def get(self, key, default=None):
+		self._touch(key)
+		return super().get(key, default)
+
+	def setdefault(self, key, default=None):
+		self._touch(key)
+		return super().setdefault(key, default)
+
+	def pop(self, key, *args):
+		self._touch(key)
+		return super().pop(key, *args)
+
+	def popitem(self):
+		self._touch_all()
+		return super().popitem()
+
+	def clear(self):
+		self._touch_all()
+		super().clear()
+
+	def update(self, *args, **kwargs):
+		self._touch_all()
+		super().update(*args, **kwargs)
+
+	def values(self):
+		self._touch_all()
+		return super().values()
+
+	def copy(self):
+		self._touch_all()
+		return super().copy()
+
+	def contents(self):
+		self._touch_all()
+		return super().contents()
+
+	def items(self):
+		self._touch_all()
+		return super().items()
+
+_tracked_classes = {}
+
+def _track_state(state):
+	'''Record the modifications of the shared state map (or group of maps) `state`.'''
+	if isinstance(state, StateGroup):
+		for m in dict.values(state):
+			_track_state(m)
+	else:
+		cls = type(state)
+		if not issubclass(cls, _TrackedState):
+			tracked = _tracked_classes.get(cls)
+			if tracked is None:
+				tracked = _tracked_classes[cls] = type(f'Tracked{cls.__name__}', (_TrackedState, cls), {})
+			state.__class__ = tracked
+		state.__dict__.pop('_touched', None)
+		state.__dict__.pop('_reset_all', None)
+
+def _state_contents(state):
+	'''Return a copy of the contents of the shared state map (or group of maps) `state`.'''
+	if isinstance(state, StateGroup):
+		return {name: _state_contents(m) for name, m in dict.items(state)}
+	return copy.deepcopy(dict(state))
+
+def _reset_state(state, initial):
+	'''
+	Reset the tracked shared state map (or group of maps) `state` to the contents of
+	`initial`, copying back only the values of the keys that may have been modified.
+	'''
+	if isinstance(state, StateGroup):
+		for name, m in dict.items(state):
+			_reset_state(m, initial[name])
+		return
+	# reset in place, as graph nodes may hold references to the service
+	touched = state.__dict__.pop('_touched', set())
+	if state.__dict__.pop('_reset_all', False):
+		dict.clear(state)
+		dict.update(state, copy.deepcopy(initial))
+		return
+	for key in touched:
+		if key in initial:
+			dict.__setitem__(state, key, copy.deepcopy(initial[key]))
+		else:
+			dict.pop(state, key, None)
+
+class InputRows(Configurable):
+	'''
+	Yield records for the in-memory rows of a named input `source` (as found in the
+	`buffers` dict at the time the graph is run), in the same form as a `CurriedCSVReader`
+	reading them from a file. Rows may be sequences of strings in the order of
+	`field_names`, or dicts keyed by (case-insensitive) field name.
+	'''
+	source = Option(str, required=True)
+	buffers = Option(required=True)
+	field_names = Option(required=True)
+	columns = Option(required=False)
+	preserve_fields = Option(required=False)
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(self, *args, **kwargs)
+		self.__name__ = f'{type(self).__name__} ({self.source})'
+		self.reader = CurriedCSVReader(field_names=self.field_names, columns=self.columns, preserve_fields=self.preserve_fields, limit=0)
+
+	def rows(self):
+		names = self.field_names
+		for row in self.buffers.get(self.source, []):
+			if isinstance(row, dict):
+				values = {k.lower(): v for k, v in row.items()}
+				yield [values.get(name, '') for name in names]
+			else:
+				yield list(row)
+
+	def __call__(self):
+		yield from self.reader.records(f'<{self.source}>', self.rows())
+
+class EmbeddedPipeline:
+	'''
+	Pipeline mixin that reads the input of each CSV source from in-memory rows, and
+	collects the modeled resources in memory.
+	'''
+	def csv_reader_nodes(self, fs, pattern, incremental_key=None, **kwargs):
+		kwargs.pop('limit', None)
+		return [InputRows(source=self.embedded_sources[pattern], buffers=self.input_buffers, **kwargs)]
+
+	def serializer_nodes_for_model(self, *args, model=None, **kwargs):
+		w = MergingMemoryWriter(model=model)
+		self.embedded_writers.append(w)
+		return [w]
+
+class Transformer:
+	'''
+	A pipeline of class `pipeline_class`, built once, that models in-memory input rows.
+
+	Keyword arguments are passed to the pipeline constructor. Those that describe CSV
+	input sources (dicts with a `header_file`, such as the `catalogs`, `auction_events`
+	and `contents` of `SalesPipeline`) name the sources whose rows are passed to
+	`transform`; their `files_pattern` is not needed.
+
+	If `conceptual_only_parts` is `True`, the `vocab.conceptual_only_parts()` modeling
+	option is enabled (as it is for the Knoedler pipeline).
+	'''
+	def __init__(self, pipeline_class, input_path=None, *, conceptual_only_parts=False, **kwargs):
+		if conceptual_only_parts:
+			vocab.conceptual_only_parts()
+		vocab.add_linked_art_boundary_check()
+		vocab.add_attribute_assignment_check()
+		factory.cache_hierarchy()
+
+		sources = {}
+		for name, value in list(kwargs.items()):
+			if isinstance(value, dict) and 'header_file' in value:
+				pattern = f'<{name}>'
+				kwargs[name] = dict(value, files_pattern=pattern)
+				sources[pattern] = name
+		self.sources = set(sources.values())
+
+		cls = type(f'Embedded{pipeline_class.__name__}', (EmbeddedPipeline, pipeline_class), {})
+		p = cls(input_path or os.getcwd(), **kwargs)
+		p.embedded_sources = sources
+		p.embedded_writers = []
+		p.input_buffers = {}
+		self.pipeline = p
+		self.services = p.get_services()
+		self.graph = p.get_graph(services=self.services)
+		self._save_initial_state()
+
+	def transform(self, **rows):
+		'''
+		Model the given rows of each input source (passed as keyword arguments named for
+		the sources), returning a dict mapping the name of each Arches model to a dict of
+		the merged JSON-LD data of its resources, keyed by URI.
+		'''
+		self._run(rows)
+		return self.collect_output()
+
+	def preload(self, **rows):
+		'''
+		Model the given rows of each input source, discarding the resulting resources, and
+		keep the shared state that they produce (such as the sales `event_properties`) as
+		the state in which later calls to `transform` start.
+		'''
+		self._run(rows)
+		self.discard_output()
+		self._save_initial_state()
+
+	def _save_initial_state(self):
+		self.initial_state = {}
+		for name, state in self.services.items():
+			if is_shared_state(state):
+				self.initial_state[name] = _state_contents(state)
+				_track_state(state)
+
+	def _run(self, rows):
+		unknown = set(rows) - self.sources
+		if unknown:
+			raise ValueError(f'Unknown input sources: {", ".join(sorted(unknown))}')
+		p = self.pipeline
+		for name, value in self.initial_state.items():
+			_reset_state(self.services[name], value)
+		p.input_buffers.clear()
+		p.input_buffers.update(rows)
+		try:
+			pipeline.execution.GraphExecutor(self.graph, self.services).run()
+		finally:
+			p.input_buffers.clear()
+
+	def discard_output(self):
+		p = self.pipeline
+		for w in p.embedded_writers:
+			w.data = {}
+		p.static_instances.used = set()
+
+	def collect_output(self):
+		p = self.pipeline
+		merger = CromObjectMerger()
+		objects = {}
+		for w in p.embedded_writers:
+			resources = objects.setdefault(w.model, {})
+			for ident, o in w.data.items():
+				if ident in resources:
+					merger.merge(resources[ident], o)
+				else:
+					resources[ident] = o
+			w.data = {}
+
+		for model, instances in p.static_instances.used_instances().items():
+			if model not in p.models:
+				# as in the pipelines, instances of models not serialized for Arches (such
+				# as materials) are not output
+				continue
+			resources = objects.setdefault(p.models[model], {})
+			for o in instances.values():
+				resources.setdefault(o.id, o)
+		p.static_instances.used = set()
+
+		return {model: {ident: factory.toJSON(assign_deterministic_ids(o)) for ident, o in resources.items()} for model, resources in objects.items() if resources}
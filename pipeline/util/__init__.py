@@ -1,6 +1,7 @@
 import re
 import os
 import sys
+import fcntl
 import fnmatch
 import pprint
 import calendar
@@ -18,6 +19,7 @@ import pipeline.io.arches
 from cromulent import model, vocab
 from cromulent.model import factory, BaseResource
 from pipeline.linkedart import add_crom_data
+from pipeline.record import child_record
 
 UNKNOWN_DIMENSION = 'http://vocab.getty.edu/aat/300055642'
 
@@ -251,13 +253,33 @@ class ExclusiveValue(ContextDecorator):
 	def __exit__(self, *exc):
 		self.get_lock().release()
 
+class ExclusiveDirectory(ContextDecorator):
+	'''
+	An advisory lock on a directory that is held exclusively across processes (e.g.
+	graph components run concurrently that merge data into the same output files).
+	'''
+	def __init__(self, path):
+		self.path = path
+		self.fd = None
+
+	def __enter__(self):
+		self.fd = os.open(self.path, os.O_RDONLY)
+		fcntl.flock(self.fd, fcntl.LOCK_EX)
+		return self.path
+
+	def __exit__(self, *exc):
+		fcntl.flock(self.fd, fcntl.LOCK_UN)
+		os.close(self.fd)
+		self.fd = None
+
 def configured_arches_writer():
 	return pipeline.io.arches.ArchesWriter(
 		endpoint=settings.arches_endpoint,
 		auth_endpoint=settings.arches_auth_endpoint,
 		username=settings.arches_endpoint_username,
 		password=settings.arches_endpoint_password,
-		client_id=settings.arches_client_id
+		client_id=settings.arches_client_id,
+		concurrency=settings.arches_upload_concurrency
 	)
 
 class CromObjectMerger:
@@ -412,9 +434,16 @@ class ExtractKeyedValues(Configurable):
 	Given a `dict` representing an some object, extract an array of `dict` values from
 	the `key` member. To each of the extracted dictionaries, add a 'parent_data' key with
 	the value of the original dictionary. Yield each extracted dictionary.
+
+	The extracted values are yielded as `pipeline.record.Record` objects. If
+	`include_parent` is `False`, no 'parent_data' key is added. If `weak_parent` is
+	`True`, the 'parent_data' link does not keep the original dictionary alive (this is
+	only safe with the serial `GraphExecutor`, which finishes processing each extracted
+	value before the original dictionary goes out of scope).
 	'''
 	key = Option(str, required=True)
 	include_parent = Option(bool, default=True)
+	weak_parent = Option(bool, default=settings.weak_parent_references)
 
 	def __init__(self, *v, **kw):
 		'''
@@ -427,11 +456,7 @@ class ExtractKeyedValues(Configurable):
 
 	def __call__(self, data, *args, **kwargs):
 		for a in data.get(self.key, []):
-			child = {k: v for k, v in a.items()}
-			child.update({
-				'parent_data': data,
-			})
-			yield child
+			yield child_record(a, data, include_parent=self.include_parent, weak_parent=self.weak_parent)
 
 class ExtractKeyedValue(Configurable):
 	'''
@@ -441,6 +466,7 @@ class ExtractKeyedValue(Configurable):
 	'''
 	key = Option(str, required=True)
 	include_parent = Option(bool, default=True)
+	weak_parent = Option(bool, default=settings.weak_parent_references)
 
 	def __init__(self, *v, **kw):
 		'''
@@ -454,11 +480,7 @@ class ExtractKeyedValue(Configurable):
 	def __call__(self, data, *args, **kwargs):
 		a = data.get(self.key)
 		if a:
-			child = {k: v for k, v in a.items()}
-			child.update({
-				'parent_data': data,
-			})
-			yield child
+			yield child_record(a, data, include_parent=self.include_parent, weak_parent=self.weak_parent)
 
 class RecursiveExtractKeyedValue(ExtractKeyedValue):
 	include_self = Option(bool, default=True)
@@ -469,11 +491,7 @@ class RecursiveExtractKeyedValue(ExtractKeyedValue):
 		else:
 			a = data.get(self.key)
 		while a:
-			child = {k: v for k, v in a.items()}
-			child.update({
-				'parent_data': data,
-			})
-			yield child
+			yield child_record(a, data, include_parent=self.include_parent, weak_parent=self.weak_parent)
 			data = a
 			a = a.get(self.key)
 
@@ -498,18 +516,24 @@ class MatchingFiles(Configurable):
 		self.__name__ = f'{type(self).__name__} ({self.pattern})'
 
 	def __call__(self, *, fs, **kwargs):
-		count = 0
-		if not self.pattern:
-			return
-# 		print(repr(self.pattern))
-		subpath, pattern = os.path.split(self.pattern)
-		fullpath = os.path.join(self.path, subpath)
-		for f in sorted(fs.listdir(fullpath)):
-			if fnmatch.fnmatch(f, pattern):
-				yield os.path.join(subpath, f)
-				count += 1
-		if not count:
-			sys.stderr.write(f'*** No files matching {pattern} found in {fullpath}\n')
+		yield from matching_files(fs, self.path, self.pattern)
+
+def matching_files(fs, path, pattern):
+	'''
+	Yield the names (in sorted order) of all files in `path` on the filesystem `fs`
+	that match `pattern`.
+	'''
+	count = 0
+	if not pattern:
+		return
+	subpath, pattern = os.path.split(pattern)
+	fullpath = os.path.join(path, subpath)
+	for f in sorted(fs.listdir(fullpath)):
+		if fnmatch.fnmatch(f, pattern):
+			yield os.path.join(subpath, f)
+			count += 1
+	if not count:
+		sys.stderr.write(f'*** No files matching {pattern} found in {fullpath}\n')
 
 def make_ordinal(n):
 	n = int(n)
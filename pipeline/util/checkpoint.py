@@ -0,0 +1,85 @@
+'''
+Persistence of pipeline service state between graph components, so that a long
+pipeline run can be resumed without re-running the components that had completed.
+
+State is stored as gzip-compressed JSON. Besides the JSON types, tuples, sets, crom
+objects (serialized as JSON-LD), the crom model factory (as attached to data by
+`add_crom_data`) and classes (e.g. the crom classes recorded as the `object_type` of
+auction house data, stored by name) are supported.
+'''
+
+import os
+import gzip
+import json
+import importlib
+
+from cromulent import reader
+from cromulent.model import factory, BaseResource, CromulentFactory
+
+def encode_state(value):
+	'''Return a JSON-serializable encoding of `value`.'''
+	if isinstance(value, BaseResource):
+		return {'_crom': factory.toJSON(value)}
+	elif isinstance(value, CromulentFactory):
+		return {'_factory': True}
+	elif isinstance(value, type):
+		return {'_class': [value.__module__, value.__qualname__]}
+	elif isinstance(value, dict):
+		return {'_dict': [[encode_state(k), encode_state(v)] for k, v in value.items()]}
+	elif isinstance(value, tuple):
+		return {'_tuple': [encode_state(v) for v in value]}
+	elif isinstance(value, (set, frozenset)):
+		return {'_set': [encode_state(v) for v in value]}
+	elif isinstance(value, list):
+		return [encode_state(v) for v in value]
+	return value
+
+def decode_state(value):
+	'''Return the value encoded by `encode_state`.'''
+	if isinstance(value, list):
+		return [decode_state(v) for v in value]
+	elif isinstance(value, dict):
+		if '_crom' in value:
+			return reader.Reader().read(value['_crom'])
+		elif '_dict' in value:
+			return {decode_state(k): decode_state(v) for k, v in value['_dict']}
+		elif '_tuple' in value:
+			return tuple(decode_state(v) for v in value['_tuple'])
+		elif '_set' in value:
+			return {decode_state(v) for v in value['_set']}
+		elif '_factory' in value:
+			return factory
+		elif '_class' in value:
+			module, name = value['_class']
+			cls = importlib.import_module(module)
+			for part in name.split('.'):
+				cls = getattr(cls, part)
+			return cls
+	return value
+
+def restore_state(target, value):
+	'''
+	Merge the decoded `value` into the existing `target` container in-place, so that
+	the container types (e.g. `defaultdict(list)`) set up by the pipeline are kept.
+	'''
+	for k, v in value.items():
+		current = target.get(k)
+		if isinstance(current, dict) and isinstance(v, dict):
+			restore_state(current, v)
+		else:
+			target[k] = v
+
+def save_checkpoint(filename, state):
+	'''
+	Write the `state` dict to `filename`. The file is replaced atomically, so an
+	interrupted write leaves any previous checkpoint intact.
+	'''
+	tmp = f'{filename}.tmp'
+	with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+		json.dump(encode_state(state), f, separators=(',', ':'))
+	os.replace(tmp, filename)
+
+def load_checkpoint(filename):
+	'''Return the state `dict` saved in `filename` by `save_checkpoint`.'''
+	with gzip.open(filename, 'rt', encoding='utf-8') as f:
+		return decode_state(json.load(f))
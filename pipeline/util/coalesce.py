@@ -0,0 +1,106 @@
+'''
+Coalescing of the JSON-LD output files that hold (parts of) the same resource.
+
+Files with the same name in the same model directory of an output tree are grouped, and
+the files of each group that share the same top-level `id` are merged with
+`pipeline.util.CromObjectMerger` in a single pass, the result being written once to the
+first of the files (in path order) and the others removed.
+'''
+
+import os
+import sys
+import json
+import time
+import multiprocessing
+from pathlib import Path
+from collections import defaultdict, namedtuple
+
+from pipeline.util import CromObjectMerger
+from cromulent.model import factory
+from cromulent import model, reader
+
+CoalesceResult = namedtuple('CoalesceResult', ('groups', 'merged', 'removed', 'errors', 'seconds'))
+CoalesceResult.__doc__ = 'The counts of the groups of duplicate files found, merged and removed, and of failures.'
+
+def duplicate_groups(path):
+	'''
+	Return the sorted lists of the paths of the JSON files below `path` that share the
+	same name within the same top-level directory of `path` (and may therefore hold the
+	same resource).
+	'''
+	groups = defaultdict(list)
+	for p in Path(path).rglob('*.json'):
+		rel = p.relative_to(path)
+		top = rel.parts[0] if len(rel.parts) > 1 else ''
+		groups[(top, p.name)].append(str(p))
+	return [sorted(files) for _, files in sorted(groups.items()) if len(files) > 1]
+
+def merge_group(files):
+	'''
+	Merge the files in `files` that hold the same resource, writing each merged resource
+	to the first of its files and removing the others. Returns the number of merged
+	resources, the number of files removed, and the number of files that could not be
+	read or merged.
+	'''
+	read = reader.Reader()
+	by_id = defaultdict(list)
+	errors = 0
+	for filename in files:
+		with open(filename, 'r') as fh:
+			content = fh.read()
+		try:
+			m = read.read(content)
+			by_id[m.id].append((filename, m))
+		except model.DataError as e:
+			print(f'*** Failed to read CRM data from {filename}: {e}', file=sys.stderr)
+			errors += 1
+
+	merged = 0
+	removed = 0
+	for id, parts in by_id.items():
+		if len(parts) < 2:
+			continue
+		canon_file, n = parts[0]
+		merger = CromObjectMerger()
+		try:
+			for filename, m in parts[1:]:
+				merger.merge(m, n)
+				n = m
+		except model.DataError as e:
+			print(f'Exception caught while merging data from {filename} into {canon_file} ({str(e)})', file=sys.stderr)
+			errors += 1
+			continue
+		d = json.loads(factory.toString(n, False))
+		with open(canon_file, 'w') as data_file:
+			json.dump(d, data_file, indent=2, ensure_ascii=False)
+		for filename, _ in parts[1:]:
+			os.remove(filename)
+			removed += 1
+		merged += 1
+	return merged, removed, errors
+
+def coalesce(path, processes=None, verbose=False):
+	'''
+	Coalesce the duplicate resource files below `path`, merging the groups of duplicates
+	in a pool of `processes` worker processes (or serially if `processes` is 1). Returns
+	a `CoalesceResult`.
+	'''
+	start = time.time()
+	groups = duplicate_groups(path)
+	merged = removed = errors = 0
+	if processes == 1:
+		results = map(merge_group, groups)
+		for m, r, e in results:
+			merged += m
+			removed += r
+			errors += e
+	elif groups:
+		ctx = multiprocessing.get_context('fork')
+		with ctx.Pool(processes) as pool:
+			for i, (m, r, e) in enumerate(pool.imap_unordered(merge_group, groups, chunksize=16), start=1):
+				merged += m
+				removed += r
+				errors += e
+				if verbose and i % 10000 == 0:
+					print(f'[{i}/{len(groups)}] groups coalesced', file=sys.stderr)
+	return CoalesceResult(len(groups), merged, removed, errors, time.time() - start)
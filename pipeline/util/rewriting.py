@@ -2,14 +2,19 @@ import os
 import re
 import sys
 import time
+import uuid
+import base64
 import pprint
 import ujson as json
 import multiprocessing
 from pathlib import Path
 from contextlib import suppress
+from collections import defaultdict
 
+import settings
 from settings import output_file_path
 from pipeline.util import CromObjectMerger
+from pipeline.util.uuid_map import read_uuid_map, write_uuid_map
 from cromulent.model import factory
 from cromulent import model, reader, vocab
 
@@ -41,9 +46,15 @@ def chunks(l, size):
 			yield l[i:i+size]
 
 def rewrite_output_files(r, update_filename=False, parallel=False, concurrency=4, path=None, files=None, **kwargs):
+	'''
+	Rewrite the JSON output files (by default, all those in the output path) with the
+	rewriter `r`, renaming each file by its rewritten UUID if `update_filename` is set.
+
+	When rewriting in parallel with renaming, files are assigned to worker processes by
+	the partition of the file they are written to (see `_rewrite_renaming_parallel`),
+	which requires the rewriter to map each value to the same result in every process.
+	'''
 	print(f'Rewriting JSON output files')
-	if update_filename and parallel:
-		raise Exception('rewrite_output_files cannot be called with both "update_filename" and "parallel" arguments')
 	vocab.add_linked_art_boundary_check()
 	vocab.add_attribute_assignment_check()
 	if not files:
@@ -55,7 +66,9 @@ def rewrite_output_files(r, update_filename=False, parallel=False, concurrency=4
 
 	if 'content_filter_re' in kwargs:
 		print(f'rewriting with content filter: {kwargs["content_filter_re"]}')
-	if parallel:
+	if parallel and update_filename:
+		_rewrite_renaming_parallel(files, r, concurrency, kwargs)
+	elif parallel:
 		pool = multiprocessing.Pool(concurrency)
 
 		partition_size = max(min(25000, int(len(files)/concurrency)), 10)
@@ -66,6 +79,87 @@ def rewrite_output_files(r, update_filename=False, parallel=False, concurrency=4
 	else:
 		_rewrite_output_files(files, r, update_filename, 1, 1, kwargs)
 
+_rewrite_work = None
+
+def _destination_key(filename):
+	# files are named by UUID; a partition holds the files in one directory that share
+	# the first two characters of their names
+	p = Path(filename)
+	return (str(p.parent), p.name[:2])
+
+def _route_files(files):
+	'''
+	Return the `(filename, destination)` pairs of the files in `files` that are to be
+	rewritten, where the destination is the file the rewritten data will be written to.
+	'''
+	r, kwargs = _rewrite_work
+	ignore_errors = kwargs.get('ignore_errors', False)
+	routes = []
+	for f in files:
+		with open(f) as data_file:
+			content = data_file.read()
+		if 'content_filter_re' in kwargs and not re.search(kwargs['content_filter_re'], content):
+			continue
+		try:
+			data = json.loads(content)
+		except ValueError:
+			sys.stderr.write(f'Failed to load JSON during rewriting of {f}\n')
+			if ignore_errors:
+				continue
+			raise
+		destination = f
+		if isinstance(data, dict) and 'id' in data:
+			# the new filename depends only on the rewritten top-level id
+			d = {'id': r.rewrite(data['id'], file=f)}
+			destination = filename_for(d, original_filename=f)
+		routes.append((str(f), str(destination)))
+	return routes
+
+def _rewrite_partition(task):
+	r, kwargs = _rewrite_work
+	files, worker_id, total_workers = task
+	_rewrite_output_files(files, r, True, worker_id, total_workers, kwargs)
+
+def _rewrite_renaming_parallel(files, r, concurrency, kwargs):
+	'''
+	Rewrite and rename `files` in a pool of `concurrency` worker processes.
+
+	A first pass finds the file each input file will be written to. Files are then
+	grouped by the partition of that destination, so that all the files written (and
+	merged) into a destination are handled, in their original order, by a single
+	worker, and no locking is needed between workers. A file that is renamed while
+	another file is renamed to its name is handled by the same worker as that file.
+	'''
+	global _rewrite_work
+	_rewrite_work = (r, kwargs)
+	ctx = multiprocessing.get_context('fork')
+	try:
+		with ctx.Pool(concurrency) as pool:
+			partition_size = max(min(25000, int(len(files)/concurrency)), 10)
+			routes = []
+			for chunk in pool.imap(_route_files, chunks(files, partition_size)):
+				routes.extend(chunk)
+
+			parent = {}
+			def find(k):
+				while parent.get(k, k) != k:
+					k = parent[k]
+				return k
+			destinations = {d for f, d in routes if d != f}
+			for f, d in routes:
+				if d != f and f in destinations:
+					parent[find(_destination_key(f))] = find(_destination_key(d))
+
+			groups = defaultdict(list)
+			for f, d in routes:
+				groups[find(_destination_key(d))].append(f)
+			tasks = [(group, i+1, len(groups)) for i, group in enumerate(groups.values())]
+			print(f'{len(tasks)} worker partitions for {len(routes)} files')
+			for _ in pool.imap_unordered(_rewrite_partition, tasks):
+				pass
+	finally:
+		_rewrite_work = None
+
 def _rewrite_output_files(files, r, update_filename, worker_id, total_workers, kwargs):
 	i = 0
 	if not files:
@@ -175,3 +269,73 @@ class JSONValueRewriter:
 		else:
 			print(f'failed to rewrite JSON value: {d!r}')
 			raise Exception(f'failed to rewrite JSON value: {d!r}')
+
+class UUIDRewriter:
+	'''
+	Rewrites URIs that start with `prefix` to the `urn:uuid:` URIs assigned to them in the
+	`map_file` (keyed by the URI suffix following the prefix, with Base64-encoded UUID
+	values; see `pipeline.util.uuid_map`). URIs that do not have an assigned UUID are rewritten to a v3 UUID based on the
+	hash of the URI.
+	'''
+	def __init__(self, prefix, map_file=None):
+		self.map = {}
+		self.prefix = prefix
+		self.map_file = map_file
+		if map_file:
+			# Load map file for pre-written UUIDs
+			self.map = read_uuid_map(map_file)
+
+	def persist_map(self):
+		# include any assignments appended to the map file since it was loaded
+		mapping = read_uuid_map(self.map_file)
+		mapping.update(self.map)
+		write_uuid_map(self.map_file, mapping)
+
+	def uuid_for(self, uri):
+		'''Return the UUID (as a string) that the URI `uri` is rewritten to.'''
+		if uri.startswith('urn:uuid:'):
+			return uri[len('urn:uuid:'):]
+		if uri.startswith(self.prefix):
+			b64 = self.map.get(uri[len(self.prefix):])
+			if b64:
+				return str(uuid.UUID(bytes=base64.b64decode(b64)))
+		return str(uuid.uuid3(uuid.NAMESPACE_URL, uri))
+
+	def rewrite(self, d, *args, **kwargs):
+		if isinstance(d, dict):
+			return {k: self.rewrite(v, *args, **kwargs) for k, v in d.items()}
+		elif isinstance(d, str):
+			if d.startswith(self.prefix):
+				# URIs that do not have an assigned UUID get a v3 UUID based on the hash of the URI
+				return f'urn:uuid:{self.uuid_for(d)}'
+			return d
+		elif isinstance(d, list):
+			return [self.rewrite(v, *args, **kwargs) for v in d]
+		elif isinstance(d, (int, float)):
+			return d
+		else:
+			print(f'failed to rewrite JSON value: {d!r}')
+			raise Exception(f'failed to rewrite JSON value ({kwargs}): {d!r}')
+
+	def resolve_object(self, model_object):
+		'''
+		Return a copy of the crom object `model_object` with its URIs rewritten, and the
+		UUID of its (rewritten) top-level URI, which names its output file.
+		'''
+		data = self.rewrite(json.loads(factory.toString(model_object, True)))
+		r = reader.Reader(validate_profile=False, validate_props=False)
+		return r.read(data), self.uuid_for(data['id'])
+
+_uuid_rewriter = None
+
+def serialization_uuid_rewriter():
+	'''
+	Return the `UUIDRewriter` used by the output writers to mint the final UUIDs of
+	resources as they are serialized (if `settings.mint_uuids` is set), or `None`.
+	'''
+	global _uuid_rewriter
+	if not settings.mint_uuids:
+		return None
+	if _uuid_rewriter is None or _uuid_rewriter.map_file != settings.uuid_map_file:
+		_uuid_rewriter = UUIDRewriter(settings.uuid_prefix, settings.uuid_map_file)
+	return _uuid_rewriter
@@ -0,0 +1,212 @@
+'''
+Mutable state services that are shared between pipeline nodes (e.g. `post_sale_map` or
+`counts`), typed by how concurrent writes to them are combined:
+
+* `LastWriterMap` - a write replaces any existing value for the key
+* `UnionMap` - values are sets, and writes are added to the existing set
+* `AppendMap` - values are lists, and writes are appended to the existing list
+* `CounterMap` - values are numbers, and writes are added to the existing value
+
+A `StateGroup` holds several such maps as a single service (e.g. `event_properties`).
+
+Nodes (and helpers) should write to these maps with `merge_value`, and list the names
+of the services they write in a `state_writes` class attribute. The maps can then be
+used in one of three ways:
+
+* in-process, as ordinary `dict`s
+* sharded: each worker process runs with its own copy of the maps, and the changes it
+  makes (see `snapshot` and `delta`) are reduced into the parent's maps with `merge`
+* served from a `SharedStateStore`, a local multiprocessing manager process, through
+  which all workers read and write the same maps (see `share`)
+
+Values served from a `SharedStateStore` are pickled; crom objects do not survive
+pickling intact, so only maps of plain values should be served from a store.
+'''
+
+import threading
+from multiprocessing.managers import BaseManager
+
+class SharedMap(dict):
+	'''
+	Base class of shared state maps; subclasses define the merge semantics of writes
+	in `merge_value`.
+	'''
+	_lock = threading.RLock()
+
+	# whether concurrent writes may be merged in any order with the same result
+	commutative = False
+
+	def __reduce__(self):
+		return (type(self), (dict(self),))
+
+	def merge_value(self, key, value):
+		'''Apply a single write of `value` for `key`.'''
+		raise NotImplementedError()
+
+	def merge(self, other):
+		'''Apply all the writes in the map `other` (e.g. the `delta` from a worker).'''
+		for key, value in other.items():
+			self.merge_value(key, value)
+		return self
+
+	def snapshot(self):
+		'''Return a copy of the map that is not affected by later writes.'''
+		return type(self)(self)
+
+	def delta(self, base):
+		'''
+		Return a map of the writes that have been applied since the `snapshot` `base`
+		was taken, such that `base.merge(delta)` is equal to this map.
+		'''
+		return type(self)({k: v for k, v in self.items() if k not in base or base[k] != v})
+
+	def contents(self):
+		'''Return a plain copy of the map (used to read back a map served by a store).'''
+		return dict(self)
+
+class LastWriterMap(SharedMap):
+	'''A map in which a write replaces any existing value.'''
+	def merge_value(self, key, value):
+		self[key] = value
+
+class UnionMap(SharedMap):
+	'''A map of sets, in which a write adds the written values to the existing set.'''
+	commutative = True
+
+	def __missing__(self, key):
+		value = self[key] = set()
+		return value
+
+	def merge_value(self, key, value):
+		with self._lock:
+			self[key].update(value)
+
+	def snapshot(self):
+		return type(self)({k: set(v) for k, v in self.items()})
+
+	def delta(self, base):
+		d = type(self)()
+		for k, v in self.items():
+			added = v - base.get(k, set())
+			if added:
+				d[k] = added
+		return d
+
+class AppendMap(SharedMap):
+	'''A map of lists, in which a write appends the written values to the existing list.'''
+	def __missing__(self, key):
+		value = self[key] = []
+		return value
+
+	def merge_value(self, key, value):
+		with self._lock:
+			self[key].extend(value)
+
+	def snapshot(self):
+		return type(self)({k: list(v) for k, v in self.items()})
+
+	def delta(self, base):
+		# lists are only ever appended to, so the new values are those past the
+		# length of the list in the snapshot
+		d = type(self)()
+		for k, v in self.items():
+			added = v[len(base.get(k, [])):]
+			if added:
+				d[k] = added
+		return d
+
+class CounterMap(SharedMap):
+	'''A map of counts, in which a write adds the written value to the existing count.'''
+	commutative = True
+
+	def __missing__(self, key):
+		return 0
+
+	def merge_value(self, key, value=1):
+		with self._lock:
+			self[key] = self.get(key, 0) + value
+
+	def delta(self, base):
+		d = type(self)()
+		for k, v in self.items():
+			diff = v - base.get(k, 0)
+			if diff:
+				d[k] = diff
+		return d
+
+class StateGroup(dict):
+	'''A named group of shared state maps that is used as a single service.'''
+	def __reduce__(self):
+		return (type(self), (dict(self),))
+
+	def merge(self, other):
+		for name, value in other.items():
+			self[name].merge(value)
+		return self
+
+	def snapshot(self):
+		return type(self)({name: m.snapshot() for name, m in self.items()})
+
+	def delta(self, base):
+		return type(self)({name: m.delta(base[name]) for name, m in self.items()})
+
+	def contents(self):
+		return {name: m.contents() for name, m in self.items()}
+
+	@property
+	def commutative(self):
+		return all(m.commutative for m in self.values())
+
+def is_shared_state(value):
+	'''Return `True` if `value` is a shared state map (or group of maps).'''
+	return isinstance(value, (SharedMap, StateGroup))
+
+def declared_writes(graph):
+	'''
+	Return the set of the names of the services that the nodes of the bonobo `graph`
+	declare (in their `state_writes` attribute) that they write.
+	'''
+	writes = set()
+	for node in getattr(graph, 'nodes', ()):
+		writes.update(getattr(node, 'state_writes', ()))
+	return writes
+
+class SharedStateStore(BaseManager):
+	'''
+	A local server process holding shared state maps, for use by several worker
+	processes at once:
+
+		with SharedStateStore() as store:
+			services['counts'] = store.share(services['counts'])
+			...
+
+	Map proxies support item access, `get`, `in`, `len`, `merge_value`, `merge`, and
+	`contents` (which returns a copy of the whole map).
+	'''
+	def share(self, value):
+		'''
+		Return a proxy for a copy of the shared state `value` held by this (running)
+		store. Groups are shared map by map, and so returned as a `StateGroup` of proxies.
+		'''
+		if isinstance(value, StateGroup):
+			return StateGroup({name: self.share(m) for name, m in value.items()})
+		return getattr(self, type(value).__name__)(dict(value))
+
+for _cls in (LastWriterMap, UnionMap, AppendMap, CounterMap):
+	SharedStateStore.register(
+		_cls.__name__,
+		_cls,
+		exposed=('__getitem__', '__contains__', '__len__', 'get', 'merge_value', 'merge', 'contents')
+	)
+
+def restore_shared(target, proxy):
+	'''
+	Replace the contents of the shared state `target` with those of the map (or group
+	of maps) served by a `SharedStateStore` through `proxy`.
+	'''
+	if isinstance(target, StateGroup):
+		for name, m in target.items():
+			restore_shared(m, proxy[name])
+	else:
+		target.clear()
+		target.update(proxy.contents())
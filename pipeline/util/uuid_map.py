@@ -0,0 +1,182 @@
+'''
+The persistent mapping of `tag:` URIs to the UUIDs assigned to them, and the harvesting
+of the URIs that still need one from the pipeline output.
+
+The mapping is keyed by URI suffix (the part of the URI following the prefix), and is
+stored as a JSON document (an object mapping suffixes to Base64-encoded UUIDs), which is
+the file shared with other tools (and copied to and from S3). New assignments are first
+appended to a compact binary log kept next to it (see `uuid_map_log`), without rewriting
+the existing data, and are folded into the JSON document by `export_uuid_map`. The log
+starts with `MAGIC`, followed by one record per assignment:
+
+  UUID (16 bytes) <> SUFFIX LENGTH (4 bytes, big-endian) <> SUFFIX (UTF-8)
+
+A record that was only partly written (e.g. by an interrupted run) is ignored when the
+log is read, and overwritten by the next append.
+'''
+
+import os
+import re
+import uuid
+import base64
+import struct
+import ujson as json
+import multiprocessing
+from pathlib import Path
+from contextlib import suppress
+
+MAGIC = b'GETTY-PIPELINE-UUID-MAP\x01\n'
+RECORD_HEADER = struct.Struct('>16sI')
+
+def _read_records(fh):
+	'''
+	Yield the complete `(suffix, uuid_bytes, end_offset)` records of the binary log open
+	in `fh` (positioned after the header).
+	'''
+	offset = fh.tell()
+	while True:
+		header = fh.read(RECORD_HEADER.size)
+		if len(header) < RECORD_HEADER.size:
+			return
+		uu, length = RECORD_HEADER.unpack(header)
+		suffix = fh.read(length)
+		if len(suffix) < length:
+			return
+		offset += RECORD_HEADER.size + length
+		yield suffix.decode('utf-8'), uu, offset
+
+def uuid_map_log(filename):
+	'''Return the name of the binary log of new assignments to the mapping in `filename`.'''
+	return f'{filename}.log'
+
+def read_uuid_map(filename):
+	'''
+	Return the mapping (of URI suffixes to Base64-encoded UUIDs) stored in the JSON file
+	`filename`, together with the assignments appended to its binary log, or an empty
+	mapping if neither file exists.
+	'''
+	mapping = {}
+	with suppress(FileNotFoundError):
+		with open(filename, 'rb') as fh:
+			content = fh.read()
+		if content.strip():
+			mapping = json.loads(content)
+	try:
+		fh = open(uuid_map_log(filename), 'rb')
+	except FileNotFoundError:
+		return mapping
+	with fh:
+		if fh.read(len(MAGIC)) == MAGIC:
+			for suffix, uu, _ in _read_records(fh):
+				mapping[suffix] = base64.b64encode(uu).decode('ascii')
+	return mapping
+
+def write_uuid_map(filename, mapping):
+	'''
+	Write `mapping` as the JSON document `filename` (replacing it only once completely
+	written), and remove its binary log, whose assignments `mapping` must include.
+	'''
+	tmp = f'{filename}.tmp'
+	with open(tmp, 'w') as fh:
+		json.dump(mapping, fh)
+	os.replace(tmp, filename)
+	with suppress(FileNotFoundError):
+		os.remove(uuid_map_log(filename))
+
+def export_uuid_map(filename):
+	'''Fold the assignments of the binary log into the JSON mapping file `filename`.'''
+	if os.path.exists(uuid_map_log(filename)):
+		write_uuid_map(filename, read_uuid_map(filename))
+
+class UUIDMapWriter:
+	'''
+	Appends UUID assignments to the binary log of the mapping file `filename` (leaving the
+	JSON document itself unchanged).
+	'''
+	def __init__(self, filename):
+		self.filename = filename
+		log = uuid_map_log(filename)
+		if not os.path.exists(log):
+			with open(log, 'wb') as fh:
+				fh.write(MAGIC)
+		self.fh = open(log, 'r+b')
+		if self.fh.read(len(MAGIC)) != MAGIC:
+			self.fh.close()
+			raise ValueError(f'Not a UUID map log: {log}')
+		# drop any partly written record at the end of the log
+		end = len(MAGIC)
+		for *_, end in _read_records(self.fh):
+			pass
+		self.fh.truncate(end)
+		self.fh.seek(end)
+
+	def _write(self, suffix, uu):
+		key = suffix.encode('utf-8')
+		self.fh.write(RECORD_HEADER.pack(uu, len(key)) + key)
+
+	def append(self, suffix, uu: uuid.UUID):
+		'''Record the assignment of the UUID `uu` to the URI suffix `suffix`.'''
+		self._write(suffix, uu.bytes)
+
+	def flush(self):
+		self.fh.flush()
+
+	def close(self):
+		if self.fh:
+			self.fh.close()
+		self.fh = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+_harvest_state = None
+
+def _init_harvester(prefix, known):
+	global _harvest_state
+	# only JSON string values that start with the prefix (as URIs do) are matched
+	pattern = re.compile(rb'"' + re.escape(prefix.encode('utf-8')) + rb'((?:[^"\\]|\\.)*)"')
+	_harvest_state = (pattern, known, set())
+
+def _harvest_files(files):
+	'''
+	Return the URI suffixes found in `files` that are neither in the known mapping nor
+	already returned by this worker process.
+	'''
+	pattern, known, seen = _harvest_state
+	found = []
+	for f in files:
+		with open(f, 'rb') as fh:
+			content = fh.read()
+		for m in pattern.finditer(content):
+			raw = m.group(1)
+			if b'\\' in raw:
+				# JSON string escapes
+				suffix = json.loads(b'"' + raw + b'"')
+			else:
+				suffix = raw.decode('utf-8')
+			if suffix not in seen and suffix not in known:
+				seen.add(suffix)
+				found.append(suffix)
+	return found
+
+def harvest_uris(prefix, path, known, processes=None, batch_size=256):
+	'''
+	Yield the suffixes of the URIs starting with `prefix` in the JSON files below `path`
+	that are not keys of the `known` mapping, each suffix yielded once.
+
+	Files are scanned as raw bytes (without being parsed) by a single pool of worker
+	processes, each of which only reports the suffixes it has not reported before.
+	'''
+	files = [str(p) for p in Path(path).rglob('*.json')]
+	batches = [files[i:i+batch_size] for i in range(0, len(files), batch_size)]
+	seen = set()
+	ctx = multiprocessing.get_context('fork')
+	with ctx.Pool(processes, initializer=_init_harvester, initargs=(prefix, known)) as pool:
+		for suffixes in pool.imap_unordered(_harvest_files, batches):
+			for suffix in suffixes:
+				if suffix not in seen:
+					seen.add(suffix)
+					yield suffix
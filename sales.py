@@ -43,6 +43,7 @@ if __name__ == '__main__':
 		print_dot = True
 		sys.argv[1:] = [a for a in sys.argv[1:] if a != 'dot']
 	parser = bonobo.get_argument_parser()
+	parser.add_argument('--resume-from', type=int, default=1, metavar='N', help='Resume a previous run with graph component N, using the checkpoint saved after component N-1')
 	with bonobo.parse_args(parser) as options:
 		try:
 			sales_data_path = project_data_path('sales')
@@ -1,84 +1,38 @@
 #!/usr/bin/env python3 -B
 
 '''
-Look at all JSON files in a specified folder. For any that share the value
-of the top-level 'id' key, use `pipeline.util.CromObjectMerger` to merge
-the data, writing the result to the first seen file, and removing the
-second file.
+Look at all JSON files in a specified folder (by default, the whole output tree). For
+any in the same model directory that share the value of the top-level 'id' key, use
+`pipeline.util.CromObjectMerger` to merge the data, writing the result to the first
+seen file, and removing the other files.
+
+  ./scripts/coalesce_json.py [--concurrency N] [PATH ...]
 '''
 
-import os
-import csv
 import sys
-import json
-import uuid
-import pprint
-import itertools
-from pathlib import Path
-from collections import defaultdict, Counter
+import argparse
 
 from settings import output_file_path
-from pipeline.util import CromObjectMerger
-from cromulent.model import factory
-from cromulent import model, vocab, reader
+from pipeline.util.coalesce import coalesce
+from cromulent import vocab
 
 vocab.conceptual_only_parts()
 vocab.add_linked_art_boundary_check()
 vocab.add_attribute_assignment_check()
 
 if __name__ == '__main__':
-	path = sys.argv[1] if len(sys.argv) > 1 else output_file_path
-	files = sorted(Path(path).rglob('*.json'))
-	seen = {}
-
-	read = reader.Reader()
-	coalesce_count = 0
-	print(f'Coalescing JSON files in {path} ...')
-	counter = Counter()
-	files_by_id = defaultdict(list)
-	for filename in files:
-		p = Path(filename)
-		id = p.name
-		counter[id] += 1
-		files_by_id[id].append(p)
+	parser = argparse.ArgumentParser(description='Merge JSON output files that hold the same resource')
+	parser.add_argument('paths', nargs='*', default=[output_file_path], metavar='PATH', help='output directory')
+	parser.add_argument('--concurrency', type=int, default=None, help='number of processes merging files')
+	args = parser.parse_args()
 
-	for id in sorted(counter):
-		count = counter[id]
-		if count > 1:
-			files = files_by_id[id]
-			for filename in files:
-				with open(filename, 'r') as fh:
-					content = fh.read()
-					canon_file = None
-					canon_content = None
-					try:
-						m = read.read(content)
-						id = m.id
-						if id in seen:
-							canon_file = seen[id]
-			# 				print(f'*** {id} already seen in {canon_file} ; merging {filename}')
-							merger = CromObjectMerger()
-							with open(canon_file, 'r') as cfh:
-								canon_content = cfh.read()
-								n = read.read(canon_content)
-								try:
-									merger.merge(m, n)
-								except model.DataError as e:
-									print(f'Exception caught while merging data from {filename} into {canon_file} ({str(e)}):')
-									print(canon_content)
-									print(content)
-									sys.exit(1)
-									raise
-							merged_data = factory.toString(m, False)
-							d = json.loads(merged_data)
-							with open(canon_file, 'w') as data_file:
-								json.dump(d, data_file, indent=2, ensure_ascii=False)
-								os.remove(filename)
-							coalesce_count += 1
-						else:
-							seen[id] = filename
-					except model.DataError as e:
-						print(f'*** Failed to read CRM data from {filename}: {e}')
-						print(f'======= {filename}:\n{content}')
-						print(f'======= {canon_file}:\n{canon_content}')
-	print(f'Coalesced {coalesce_count} JSON files in {path}')
+	failed = False
+	for path in args.paths:
+		print(f'Coalescing JSON files in {path} ...')
+		result = coalesce(path, processes=args.concurrency, verbose=True)
+		print(f'Coalesced {result.removed} JSON files into {result.merged} resources ({result.groups} groups of files with the same name) in {path} ({result.seconds:.1f}s)')
+		if result.errors:
+			print(f'*** {result.errors} files could not be coalesced', file=sys.stderr)
+			failed = True
+	if failed:
+		sys.exit(1)
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3 -B
+
+'''
+Export the resources in the packed segment output of a pipeline run (written with
+GETTY_PIPELINE_OUTPUT_FORMAT=segments) to one JSON file per resource, in the same
+partitioned directory layout as the default file output:
+
+  ./scripts/export_segments.py SEGMENTS_PATH OUTPUT_PATH
+'''
+
+import sys
+import argparse
+
+from pipeline.io.segments import export_segments
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Export segment output to per-resource JSON files')
+	parser.add_argument('path', help='segment output directory')
+	parser.add_argument('output_path', help='directory to write JSON files to')
+	parser.add_argument('--no-partitions', action='store_true', help='do not partition the files of each model by UUID prefix')
+	args = parser.parse_args()
+
+	count = export_segments(args.path, args.output_path, partition_directories=not args.no_partitions)
+	print(f'Exported {count} resources to {args.output_path}', file=sys.stderr)
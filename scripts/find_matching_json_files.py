@@ -0,0 +1,75 @@
+#!/usr/bin/env python3 -B
+
+'''
+Print the paths of the JSON files in PATH that reference (as a value of an "id" member)
+at least one URI that starts with a key of the URI rewrite map in MAP_FILE:
+
+  ./scripts/find_matching_json_files.py [--index INDEX_PATH] MAP_FILE PATH
+
+If the pipeline recorded a URI reference index (GETTY_PIPELINE_URI_INDEX), the files are
+looked up in the index given with --index. Otherwise, all the JSON files in PATH are
+scanned.
+'''
+
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+from pathlib import Path
+
+from pipeline.io.references import ID_RE, URIReferenceIndex
+
+class PrefixMatcher:
+	'''Matches strings that start with any of a set of prefixes.'''
+	def __init__(self, prefixes):
+		self.prefixes = set(prefixes)
+		self.lengths = sorted({len(p) for p in self.prefixes})
+		self.common = os.path.commonprefix(list(self.prefixes)) if self.prefixes else ''
+
+	def matches(self, s):
+		if not s.startswith(self.common):
+			return False
+		return any(s[:l] in self.prefixes for l in self.lengths if l <= len(s))
+
+def json_files(path):
+	for root, dirs, files in os.walk(path):
+		dirs[:] = [d for d in dirs if d != 'tmp']
+		for f in files:
+			if f.endswith('.json'):
+				yield os.path.join(root, f)
+
+_matcher = None
+
+def _init_matcher(prefixes):
+	global _matcher
+	_matcher = PrefixMatcher(prefixes)
+
+def _file_matches(filename):
+	with open(filename, 'r', encoding='utf-8') as fh:
+		content = fh.read()
+	if any(_matcher.matches(uri) for uri in ID_RE.findall(content)):
+		return filename
+	return None
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Find JSON files referencing URIs in a rewrite map')
+	parser.add_argument('map_file', help='JSON URI rewrite map')
+	parser.add_argument('path', help='pipeline output directory')
+	parser.add_argument('--index', default=None, help='URI reference index recorded by the pipeline')
+	parser.add_argument('--concurrency', type=int, default=8, help='number of processes scanning files')
+	args = parser.parse_args()
+
+	with open(args.map_file, 'r') as fh:
+		keys = list(json.load(fh).keys())
+
+	if args.index and os.path.isdir(args.index):
+		root = os.path.realpath(args.path)
+		for location in URIReferenceIndex(args.index).locations(keys, prefix=True):
+			if os.path.realpath(location).startswith(root) and os.path.exists(location):
+				print(location)
+	else:
+		with multiprocessing.Pool(args.concurrency, initializer=_init_matcher, initargs=(keys,)) as pool:
+			for filename in pool.imap_unordered(_file_matches, json_files(args.path), chunksize=256):
+				if filename:
+					print(filename)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3 -B
+
+'''
+Run a pipeline script (e.g. ./sales.py) in a child process, and report its wall-clock
+runtime and peak resident memory.
+
+Any environment variables (e.g. GETTY_PIPELINE_WEAK_PARENTS) are passed through to
+the child process, so that the same run can be compared with different settings:
+
+  GETTY_PIPELINE_WEAK_PARENTS=0 ./scripts/memory_benchmark.py ./sales.py
+  GETTY_PIPELINE_WEAK_PARENTS=1 ./scripts/memory_benchmark.py ./sales.py
+
+With --baseline REV, the same command is first run in a checkout of the git revision
+REV (e.g. the revision before a change), and the two runs are compared:
+
+  ./scripts/memory_benchmark.py --baseline HEAD~1 ./sales.py
+
+Each run writes its output to a new temporary directory (so that neither run merges
+data into the output of the other), which is removed afterwards.
+'''
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+def peak_rss_bytes(usage):
+	# ru_maxrss is reported in kilobytes on linux, but in bytes on macOS
+	if sys.platform == 'darwin':
+		return usage.ru_maxrss
+	return usage.ru_maxrss * 1024
+
+def run(cmd, cwd=None):
+	'''
+	Run `cmd` (in the directory `cwd`) with a temporary output directory, returning its
+	exit status, runtime and peak RSS.
+	'''
+	output = tempfile.mkdtemp(prefix='memory-benchmark-')
+	env = dict(os.environ, GETTY_PIPELINE_OUTPUT=output)
+	try:
+		start = time.time()
+		p = subprocess.Popen(cmd, cwd=cwd, env=env)
+		# wait4 reports the resource usage of this child alone (RUSAGE_CHILDREN would
+		# report the maximum over all children, including an earlier baseline run)
+		_, status, usage = os.wait4(p.pid, 0)
+		elapsed = time.time() - start
+	finally:
+		shutil.rmtree(output, ignore_errors=True)
+	p.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+	return p.returncode, elapsed, peak_rss_bytes(usage)
+
+def report(name, result):
+	status, elapsed, peak = result
+	print(f'{name}:', file=sys.stderr)
+	print(f'- exit status:  {status}', file=sys.stderr)
+	print(f'- runtime:      %.1fs' % (elapsed,), file=sys.stderr)
+	print(f'- peak RSS:     %.1f MB' % (peak / 1048576.0,), file=sys.stderr)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Report the runtime and peak memory of a pipeline run')
+	parser.add_argument('--baseline', default=None, metavar='REV', help='git revision to compare the run with')
+	parser.add_argument('command', nargs=argparse.REMAINDER, metavar='PIPELINE_SCRIPT [ARGS...]')
+	args = parser.parse_args()
+	if not args.command:
+		parser.print_usage(sys.stderr)
+		sys.exit(1)
+
+	cmd = [sys.executable, '-B', *args.command]
+	weak = os.environ.get('GETTY_PIPELINE_WEAK_PARENTS', '0')
+	description = f'{" ".join(args.command)} (GETTY_PIPELINE_WEAK_PARENTS={weak})'
+	baseline = None
+	if args.baseline:
+		checkout = tempfile.mkdtemp(prefix='memory-benchmark-checkout-')
+		subprocess.run(['git', 'worktree', 'add', '--detach', checkout, args.baseline], check=True)
+		try:
+			baseline = run(cmd, cwd=checkout)
+		finally:
+			subprocess.run(['git', 'worktree', 'remove', '--force', checkout])
+		report(f'Memory benchmark of {description} at {args.baseline}', baseline)
+
+	current = run(cmd)
+	report(f'Memory benchmark of {description}', current)
+	if baseline:
+		_, base_elapsed, base_peak = baseline
+		_, elapsed, peak = current
+		print(f'Change from {args.baseline}:', file=sys.stderr)
+		print(f'- runtime:      %+.1fs (%+.1f%%)' % (elapsed - base_elapsed, 100.0 * (elapsed - base_elapsed) / base_elapsed), file=sys.stderr)
+		print(f'- peak RSS:     %+.1f MB (%+.1f%%)' % ((peak - base_peak) / 1048576.0, 100.0 * (peak - base_peak) / base_peak), file=sys.stderr)
+	sys.exit(current[0] or (baseline[0] if baseline else 0))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3 -B
+
+'''
+Write the content-hash manifest of a pipeline output directory, and (given the manifest
+of the previous release) the delta archives of the JSON-LD and N-Quads files that were
+added or changed since then:
+
+  ./scripts/package_release.py [--previous PREVIOUS_MANIFEST] [--delta PREFIX] PATH MANIFEST
+
+The delta archives are written to PREFIX-jsonld-delta.tar.gz and
+PREFIX-nquads-delta.tar.gz, with their members placed under the name of PATH (as in the
+full release archives). Each includes a changes.tsv file listing the added, changed and
+removed files (STATUS <tab> PATH <tab> ID <tab> MODEL <tab> SHA256).
+
+If MANIFEST already exists (from an earlier run over the same PATH), the hashes of the
+files whose size and modification time are unchanged are re-used.
+'''
+
+import os
+import sys
+import time
+import argparse
+
+from pipeline.release import build_manifest, read_manifest, write_manifest, compare_manifests, write_delta_archive
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Write the manifest and delta archives of a pipeline release')
+	parser.add_argument('path', help='pipeline output directory')
+	parser.add_argument('manifest', help='manifest file to write')
+	parser.add_argument('--previous', default=None, help='manifest of the previous release')
+	parser.add_argument('--delta', default=None, metavar='PREFIX', help='path prefix of the delta archives to write')
+	parser.add_argument('--concurrency', type=int, default=None, help='number of processes hashing files')
+	args = parser.parse_args()
+
+	previous = {}
+	if args.previous and os.path.exists(args.previous):
+		previous = read_manifest(args.previous)
+
+	# hashes are only re-used from an earlier manifest of this same directory (e.g. when
+	# packaging a release again); the previous release is a different output tree
+	existing = {}
+	if os.path.exists(args.manifest):
+		existing = read_manifest(args.manifest)
+
+	start = time.time()
+	path = os.path.abspath(args.path)
+	manifest = build_manifest(path, previous=existing, processes=args.concurrency)
+	write_manifest(args.manifest, manifest)
+	print(f'Wrote manifest of {len(manifest)} files in {time.time() - start:.1f}s', file=sys.stderr)
+
+	if args.delta:
+		if not args.previous or not os.path.exists(args.previous):
+			print('No previous manifest; not writing delta archives', file=sys.stderr)
+			sys.exit(1)
+		delta = compare_manifests(previous, manifest)
+		print(f'{len(delta.added)} added, {len(delta.changed)} changed, {len(delta.removed)} removed', file=sys.stderr)
+		arcname = os.path.basename(path)
+		for name, suffix in (('jsonld', '.json'), ('nquads', '.nq')):
+			filename = f'{args.delta}-{name}-delta.tar.gz'
+			count = write_delta_archive(filename, path, delta, previous, manifest, suffixes=(suffix,), arcname=arcname)
+			print(f'Wrote {count} files to {filename}', file=sys.stderr)
@@ -12,6 +12,7 @@ from contextlib import suppress
 
 from settings import output_file_path
 from pipeline.util.rewriting import rewrite_output_files
+from pipeline.util.uuid_map import read_uuid_map, write_uuid_map
 
 class UUIDRewriter:
 	def __init__(self, prefix, map_file=None):
@@ -19,14 +20,11 @@ class UUIDRewriter:
 		self.prefix = prefix
 		self.map_file = map_file
 		if map_file:
-			# Load JSON map file for pre-written UUIDs
-			with suppress(FileNotFoundError):
-				with open(map_file) as fh:
-					self.map = json.load(fh)
+			# Load map file for pre-written UUIDs
+			self.map = read_uuid_map(map_file)
 
 	def persist_map(self):
-		with open(self.map_file, 'w') as fh:
-			json.dump(self.map, fh)
+		write_uuid_map(self.map_file, self.map)
 
 	def rewrite(self, d, *args, **kwargs):
 		if isinstance(d, dict):
@@ -40,10 +38,9 @@ class UUIDRewriter:
 					u = uuid.UUID(bytes=bytes)
 					return f'urn:uuid:{u}'
 				else:
-					uu = str(uuid.uuid4())
-					u = f'urn:uuid:{uu}'
-					self.map[d] = u
-					return u
+					uu = uuid.uuid4()
+					self.map[d] = base64.b64encode(uu.bytes).decode('ascii')
+					return f'urn:uuid:{uu}'
 			return d
 		elif isinstance(d, list):
 			return [self.rewrite(v, *args, **kwargs) for v in d]
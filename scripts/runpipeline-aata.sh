@@ -10,6 +10,9 @@ fi
 PROJECT="aata"
 LIMIT=2500000
 # LIMIT=200
+# set to 1 to derive the ids of sub-objects from their content, so that unchanged
+# resources are serialized identically, and publish only the release delta
+DETERMINISTIC_IDS=${DETERMINISTIC_IDS-0}
 DATETIME=`date -u +"%Y-%m-%dT%H:%M:%SZ"`
 DATE=`date -u +"%Y-%m-%d"`
 LOGFILE="${HOME}/logs/pipeline-${PROJECT}-${DATE}.log"
@@ -20,6 +23,10 @@ DATAPATH="${OUTPUTPATH}/${DATANAME}"
 GITREV=`git rev-parse --short HEAD`
 JSON_TARFILE="${OUTPUTPATH}/${DATANAME}-jsonld.tar.gz"
 NQ_TARFILE="${OUTPUTPATH}/${DATANAME}-nquads.tar.gz"
+JSON_DELTA_TARFILE="${OUTPUTPATH}/${DATANAME}-jsonld-delta.tar.gz"
+NQ_DELTA_TARFILE="${OUTPUTPATH}/${DATANAME}-nquads-delta.tar.gz"
+MANIFEST="${OUTPUTPATH}/${DATANAME}-manifest.tsv"
+PREV_MANIFEST="${OUTPUTPATH}/${PROJECT}-latest-manifest.tsv"
 INFOFILE="${DATAPATH}/pipeline-${PROJECT}-info.txt"
 AWS_OUTPUTPATH="s3://jpgt-or-pvt-semantic/output/${PROJECT}"
 
@@ -33,26 +40,38 @@ echo "Data path    : ${DATAPATH}"          | tee -a $LOGFILE
 echo "JSON Tar file: ${JSON_TARFILE}"      | tee -a $LOGFILE
 echo "NQ Tar file  : ${NQ_TARFILE}"        | tee -a $LOGFILE
 echo "LIMIT        : ${LIMIT}"             | tee -a $LOGFILE
+echo "Determ. ids  : ${DETERMINISTIC_IDS}"  | tee -a $LOGFILE
 
 echo '' > $LOGFILE
 echo "Pipeline ${GITREV}; ${DATETIME}" >> $LOGFILE
 date >> $LOGFILE
 echo "==================================== Starting pipeline docker container" | tee -a $LOGFILE
-time docker run --env GETTY_PIPELINE_COMMON_SERVICE_FILES_PATH=/services/common --env GETTY_PIPELINE_SERVICE_FILES_PATH=/services --env GETTY_PIPELINE_INPUT=/data --env GETTY_PIPELINE_OUTPUT=/output --env GETTY_PIPELINE_TMP_PATH=/output/tmp --env AWS_ACCESS_KEY_ID=$AWS_ACCESS_KEY_ID --env AWS_SECRET_ACCESS_KEY=$AWS_SECRET_ACCESS_KEY -v"$INPUTPATH":/data:Z -v"$DATAPATH":/output:Z -v`pwd`/data:/services:Z -it pipeline make clean "fetch${PROJECT}" $PROJECT nq LIMIT=$LIMIT | tee -a $LOGFILE
+time docker run --env GETTY_PIPELINE_COMMON_SERVICE_FILES_PATH=/services/common --env GETTY_PIPELINE_SERVICE_FILES_PATH=/services --env GETTY_PIPELINE_INPUT=/data --env GETTY_PIPELINE_OUTPUT=/output --env GETTY_PIPELINE_TMP_PATH=/output/tmp --env AWS_ACCESS_KEY_ID=$AWS_ACCESS_KEY_ID --env AWS_SECRET_ACCESS_KEY=$AWS_SECRET_ACCESS_KEY -v"$INPUTPATH":/data:Z -v"$DATAPATH":/output:Z -v`pwd`/data:/services:Z -it pipeline make clean "fetch${PROJECT}" $PROJECT nq LIMIT=$LIMIT DETERMINISTIC_IDS=$DETERMINISTIC_IDS | tee -a $LOGFILE
 echo "==================================== Finished pipeline docker container" | tee -a $LOGFILE
 echo '' >> $LOGFILE
 date >> $LOGFILE
 
 echo "Pipeline ${GITREV}; ${DATETIME}" >> $INFOFILE
 
-tar --exclude 'json_files.txt' --exclude 'meta.nq' --exclude 'all.nq.gz' --exclude='uri_to_uuid_map.json' --exclude='json_files.txt' --exclude='*.nq' -c -C $OUTPUTPATH $DATANAME | pigz > $JSON_TARFILE
-echo "Created ${JSON_TARFILE}" | tee -a $LOGFILE
+if [ -f "$PREV_MANIFEST" ] && [ -z "$FULL_RELEASE" ] && [ "$DETERMINISTIC_IDS" = "1" ]; then
+	# publish only the resources added or changed since the previous release (without
+	# deterministic ids, almost every file changes between runs)
+	PYTHONPATH=`pwd` python3 ./scripts/package_release.py --previous $PREV_MANIFEST --delta "${OUTPUTPATH}/${DATANAME}" $DATAPATH $MANIFEST 2>&1 | tee -a $LOGFILE
+	aws s3 cp $JSON_DELTA_TARFILE "${AWS_OUTPUTPATH}/"
+	aws s3 cp $NQ_DELTA_TARFILE "${AWS_OUTPUTPATH}/"
+else
+	PYTHONPATH=`pwd` python3 ./scripts/package_release.py $DATAPATH $MANIFEST 2>&1 | tee -a $LOGFILE
+	tar --exclude 'json_files.txt' --exclude 'meta.nq' --exclude 'all.nq.gz' --exclude='uri_to_uuid_map.json' --exclude='json_files.txt' --exclude='*.nq' -c -C $OUTPUTPATH $DATANAME | pigz > $JSON_TARFILE
+	echo "Created ${JSON_TARFILE}" | tee -a $LOGFILE
 
-tar --exclude 'json_files.txt' --exclude 'meta.nq' --exclude 'all.nq.gz' --exclude='uri_to_uuid_map.json' --exclude='*.json' --exclude '*.gz' -c -C $OUTPUTPATH $DATANAME | pigz > $NQ_TARFILE
-echo "Created ${NQ_TARFILE}" | tee -a $LOGFILE
+	tar --exclude 'json_files.txt' --exclude 'meta.nq' --exclude 'all.nq.gz' --exclude='uri_to_uuid_map.json' --exclude='*.json' --exclude '*.gz' -c -C $OUTPUTPATH $DATANAME | pigz > $NQ_TARFILE
+	echo "Created ${NQ_TARFILE}" | tee -a $LOGFILE
 
-aws s3 cp $JSON_TARFILE "${AWS_OUTPUTPATH}/"
-aws s3 cp $NQ_TARFILE "${AWS_OUTPUTPATH}/"
+	aws s3 cp $JSON_TARFILE "${AWS_OUTPUTPATH}/"
+	aws s3 cp $NQ_TARFILE "${AWS_OUTPUTPATH}/"
+fi
+aws s3 cp $MANIFEST "${AWS_OUTPUTPATH}/"
+cp $MANIFEST $PREV_MANIFEST
 aws s3 cp "${DATAPATH}/all.nq.gz" "${AWS_OUTPUTPATH}/${PROJECT}-${DATE}-all.nq.gz"
 aws s3 cp "${DATAPATH}/meta.nq.gz" "${AWS_OUTPUTPATH}/${PROJECT}-${DATE}-meta.nq.gz"
 
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3 -B
+
+'''
+Upload the JSON-LD files written by a pipeline run to Arches.
+
+The output directory contains one directory per Arches model, each containing the
+(possibly partitioned) resource files, named by resource UUID. Uploads are run
+concurrently over pooled connections, and the UUIDs of the uploaded resources are
+recorded in a checkpoint file, so that re-running the same command resumes an
+interrupted upload:
+
+  ./scripts/upload_to_arches.py --concurrency 16 --checkpoint /tmp/arches-upload.txt output
+'''
+
+import os
+import sys
+import argparse
+from pathlib import Path
+
+import settings
+from pipeline.io.arches import ArchesClient, ArchesUploader, UploadCheckpoint
+
+def resource_files(path):
+	'''Generate (model, uuid, filename) tuples for the resource files under `path`.'''
+	for model_dir in sorted(p for p in Path(path).iterdir() if p.is_dir()):
+		for filename in sorted(model_dir.rglob('*.json')):
+			yield model_dir.name, filename.stem, filename
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Upload pipeline output to Arches')
+	parser.add_argument('path', nargs='?', default=settings.output_file_path, help='pipeline output directory')
+	parser.add_argument('--endpoint', default=settings.arches_endpoint)
+	parser.add_argument('--auth-endpoint', default=settings.arches_auth_endpoint)
+	parser.add_argument('--username', default=settings.arches_endpoint_username)
+	parser.add_argument('--password', default=settings.arches_endpoint_password)
+	parser.add_argument('--client-id', default=settings.arches_client_id)
+	parser.add_argument('--concurrency', type=int, default=settings.arches_upload_concurrency, help='number of concurrent uploads')
+	parser.add_argument('--max-in-flight', type=int, default=None, help='maximum number of uploads queued at once')
+	parser.add_argument('--retries', type=int, default=5, help='number of times a failed upload is retried')
+	parser.add_argument('--backoff', type=float, default=0.5, help='initial delay (in seconds) before retrying an upload')
+	parser.add_argument('--checkpoint', default=None, help='file recording the uploaded resource UUIDs')
+	parser.add_argument('-v', '--verbose', action='store_true')
+	args = parser.parse_args()
+
+	client = ArchesClient(
+		args.endpoint,
+		args.auth_endpoint,
+		args.username,
+		args.password,
+		args.client_id,
+		pool_size=args.concurrency,
+		retries=args.retries,
+		backoff=args.backoff
+	)
+	checkpoint = UploadCheckpoint(args.checkpoint) if args.checkpoint else None
+	uploader = ArchesUploader(client, concurrency=args.concurrency, max_in_flight=args.max_in_flight, checkpoint=checkpoint, verbose=args.verbose)
+	try:
+		for model, uu, filename in resource_files(args.path):
+			if checkpoint is not None and uu in checkpoint:
+				uploader.skipped += 1
+				continue
+			with open(filename, 'rb') as fh:
+				uploader.submit(model, uu, fh.read())
+	finally:
+		uploader.close()
+
+	if uploader.failed:
+		print(f'{len(uploader.failed)} resources failed to upload:', file=sys.stderr)
+		for uu, error in uploader.failed:
+			print(f'- {uu}: {error}', file=sys.stderr)
+		sys.exit(1)
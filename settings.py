@@ -25,15 +25,57 @@ arches_endpoint_username = os.environ.get('GETTY_PIPELINE_ARCHES_USERNAME', 'adm
 arches_endpoint_password = os.environ.get('GETTY_PIPELINE_ARCHES_PASSWORD', 'admin')
 arches_auth_endpoint = os.environ.get('GETTY_PIPELINE_ARCHES_AUTH_ENDPOINT', 'http://localhost:8001/o/token/')
 arches_client_id = os.environ.get('GETTY_PIPELINE_ARCHES_CLIENT_ID', 'OaGs0HfnBNd2VpI4Hnrc8nhOSTbnV1Q3O1CPjlX6')
+arches_upload_concurrency = int(os.environ.get('GETTY_PIPELINE_ARCHES_CONCURRENCY', 8))
 
 data_path = os.environ.get('GETTY_PIPELINE_INPUT', '/data')
 pipeline_tmp_path = os.environ.get('GETTY_PIPELINE_TMP_PATH', '/tmp')
 pipeline_common_service_files_path = os.environ.get('GETTY_PIPELINE_COMMON_SERVICE_FILES_PATH', os.path.join(data_path, 'common'))
 pipeline_service_files_base_path = os.environ.get('GETTY_PIPELINE_SERVICE_FILES_PATH', data_path)
 output_file_path = os.environ.get('GETTY_PIPELINE_OUTPUT', '/data2/output')
+# directory of the index of URIs referenced by each output file, recorded by the output writers (empty to not record an index; see pipeline.io.references)
+uri_reference_index = os.environ.get('GETTY_PIPELINE_URI_INDEX', '')
+uri_reference_prefix = os.environ.get('GETTY_PIPELINE_URI_INDEX_PREFIX', 'tag:getty.edu,2019:digital:pipeline:')
+# mint the final urn:uuid: URIs of resources (and name output files by them) as they are serialized, instead of in a rewriting pass
+mint_uuids = os.environ.get('GETTY_PIPELINE_MINT_UUIDS', '0') == '1'
+uuid_prefix = os.environ.get('GETTY_PIPELINE_UUID_PREFIX', 'tag:getty.edu,2019:digital:pipeline:REPLACE-WITH-UUID:')
+uuid_map_file = os.environ.get('GETTY_PIPELINE_UUID_MAP', os.path.join(pipeline_tmp_path, 'uri_to_uuid_map.json'))
+# derive the ids of sub-objects that have no URI of their own from their position in the serialized resource, instead of assigning random UUIDs (see pipeline.linkedart)
+deterministic_ids = os.environ.get('GETTY_PIPELINE_DETERMINISTIC_IDS', '0') == '1'
+# maximum number of person and group authority models (and anonymous group names) cached for re-use across occurrences of the same authority (0 to disable the cache)
+person_authority_cache_size = int(os.environ.get('GETTY_PIPELINE_PERSON_CACHE_SIZE', 100000))
+# directory of the input row fingerprints and lineage of incremental runs (empty to always run over all input; see pipeline.incremental)
+incremental_state_path = os.environ.get('GETTY_PIPELINE_INCREMENTAL', '')
+# output format of the serialized resources: 'files' (one JSON file per resource) or 'segments' (packed JSON lines segment files; see pipeline.io.segments)
+output_format = os.environ.get('GETTY_PIPELINE_OUTPUT_FORMAT', 'files')
+output_segment_size = int(os.environ.get('GETTY_PIPELINE_SEGMENT_SIZE', 256 * 1024 * 1024))
+output_segment_compress = os.environ.get('GETTY_PIPELINE_SEGMENT_COMPRESS', '0') == '1'
+# persistent index of the output files (uuid, model, path and label) used by the output browser in wsgi.py, and the minimum number of seconds between its refreshes
+output_index_path = os.environ.get('GETTY_PIPELINE_OUTPUT_INDEX', os.path.join(pipeline_tmp_path, 'output_index.sqlite'))
+output_index_refresh = int(os.environ.get('GETTY_PIPELINE_OUTPUT_INDEX_REFRESH', 30))
 DEBUG = os.environ.get('GETTY_PIPELINE_DEBUG', True)
 SPAM = os.environ.get('GETTY_PIPELINE_VERBOSE', False)
 
+# hold the 'parent_data' links of extracted records weakly (only safe with the serial executor)
+weak_parent_references = bool(int(os.environ.get('GETTY_PIPELINE_WEAK_PARENTS', 0)))
+
+# number of processes used to parse input CSV files concurrently (0 or 1 to parse them serially)
+csv_reader_processes = int(os.environ.get('GETTY_PIPELINE_CSV_PROCESSES', 0))
+
+# maximum number of distinct dimension statements whose parsed data is cached (0 to disable caching)
+dimension_cache_size = int(os.environ.get('GETTY_PIPELINE_DIMENSION_CACHE_SIZE', 100000))
+
+# maximum number of distinct sale prices whose parsed values are cached (0 to disable caching)
+price_cache_size = int(os.environ.get('GETTY_PIPELINE_PRICE_CACHE_SIZE', 10000))
+
+# maximum number of independent graph components that are run concurrently in separate processes (0 or 1 to run them serially)
+component_processes = int(os.environ.get('GETTY_PIPELINE_COMPONENT_PROCESSES', 0))
+
+# number of processes writing the data held by the memory writers to disk at the end of a run, each handling a disjoint set of output partitions (0 or 1 to write serially)
+flush_processes = int(os.environ.get('GETTY_PIPELINE_FLUSH_PROCESSES', 0))
+
+# names of shared state services that concurrent graph components read and write through a shared store process (all other such services are copied to each process and their changes merged afterwards)
+shared_state_store = {name for name in os.environ.get('GETTY_PIPELINE_SHARED_STATE_STORE', '').split(',') if name}
+
 gpi_engine = 'sqlite:///%s/gpi.sqlite' % (data_path,)
 raw_engine = 'sqlite:///%s/raw_gpi.sqlite' % (data_path,)
 
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3 -B
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from pipeline.io.arches import ArchesClient, ArchesUploader, ArchesWriter, UploadCheckpoint
+
+class StubArches(BaseHTTPRequestHandler):
+	'''
+	A stub of the Arches token and resources API. The first access token expires after
+	the first upload, and the first upload of each resource fails with a server error
+	(or, for resources of the 'slow' model, does not respond in time).
+	'''
+	def log_message(self, *args):
+		pass
+
+	def respond(self, status, data=None):
+		body = json.dumps(data or {}).encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_POST(self):
+		server = self.server
+		params = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+		with server.lock:
+			server.token_requests.append(params['grant_type'][0])
+			token = f'token-{len(server.token_requests)}'
+			server.valid_tokens = {token}
+		self.respond(200, {'access_token': token, 'refresh_token': 'refresh'})
+
+	def do_PUT(self):
+		server = self.server
+		body = self.rfile.read(int(self.headers['Content-Length']))
+		token = self.headers['Authorization'].split(' ')[1]
+		with server.lock:
+			if token not in server.valid_tokens:
+				return self.respond(401)
+			first = self.path not in server.failed
+			server.failed.add(self.path)
+		if first and self.path.startswith('/resources/slow/'):
+			time.sleep(0.5)
+		with server.lock:
+			if first:
+				return self.respond(503)
+			server.uploads[self.path] = json.loads(body)
+			if token == 'token-1':
+				server.valid_tokens = set()
+		self.respond(201)
+
+class TestArchesWriter(unittest.TestCase):
+	def setUp(self):
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubArches)
+		self.server.lock = threading.Lock()
+		self.server.token_requests = []
+		self.server.valid_tokens = set()
+		self.server.failed = set()
+		self.server.uploads = {}
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		base = f'http://127.0.0.1:{self.server.server_address[1]}'
+		self.endpoint = f'{base}/resources/'
+		self.auth_endpoint = f'{base}/o/token/'
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def client(self):
+		return ArchesClient(self.endpoint, self.auth_endpoint, 'admin', 'admin', 'client', retries=3, backoff=0.01)
+
+	def test_upload_with_retry_and_refresh(self):
+		uploader = ArchesUploader(self.client(), concurrency=4, max_in_flight=4)
+		for i in range(10):
+			uploader.submit('object', f'uuid-{i}', json.dumps({'id': i}))
+		uploader.close()
+		self.assertEqual(uploader.failed, [])
+		self.assertEqual(uploader.uploaded, 10)
+		self.assertEqual(len(self.server.uploads), 10)
+		self.assertEqual(self.server.uploads['/resources/object/uuid-3'], {'id': 3})
+		self.assertEqual(self.server.token_requests[:2], ['password', 'refresh_token'])
+
+	def test_retry_after_timeout(self):
+		client = ArchesClient(self.endpoint, self.auth_endpoint, 'admin', 'admin', 'client', retries=3, backoff=0.01, timeout=0.2)
+		resp = client.put('slow', 'uuid-1', json.dumps({'id': 1}))
+		self.assertEqual(resp.status_code, 201)
+		self.assertEqual(self.server.uploads, {'/resources/slow/uuid-1': {'id': 1}})
+
+	def test_checkpoint_resume(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			filename = os.path.join(tmp, 'uploaded.txt')
+			with open(filename, 'w') as fh:
+				fh.write('uuid-0\nuuid-1\n')
+			writer = ArchesWriter(endpoint=self.endpoint, auth_endpoint=self.auth_endpoint, concurrency=2, checkpoint=filename)
+			for i in range(4):
+				writer({'_ARCHES_MODEL': 'person', 'uuid': f'uuid-{i}', '_OUTPUT': json.dumps({'id': i})})
+			uploader = writer.flush()
+			self.assertEqual(uploader.skipped, 2)
+			self.assertEqual(set(self.server.uploads), {'/resources/person/uuid-2', '/resources/person/uuid-3'})
+			self.assertEqual(UploadCheckpoint(filename).completed, {f'uuid-{i}' for i in range(4)})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3 -B
+import os
+import tempfile
+import unittest
+from collections import defaultdict
+
+import pipeline.linkedart
+from cromulent import model, vocab
+from cromulent.model import factory
+from pipeline.util.checkpoint import save_checkpoint, load_checkpoint, restore_state
+
+class TestCheckpoint(unittest.TestCase):
+	def test_round_trip(self):
+		ts = model.TimeSpan(ident='')
+		ts.begin_of_the_begin = '1800-01-01T00:00:00Z'
+		person = vocab.Person(ident='tag:example,2020:person', label='Example')
+		place = model.Place(ident='tag:example,2020:place', label='Paris')
+		state = {
+			'component': 2,
+			'services': {
+				'event_properties': {
+					'auction_dates': {'B-A1': (ts, '1800-01-01', None)},
+					'auction_locations': {'B-A1': place},
+					'experts': {'B-A1': [person]},
+					'auction_houses': {'B-A1': [pipeline.linkedart.add_crom_data(data={'label': 'Christie', 'object_type': vocab.AuctionHouseOrg}, what=vocab.AuctionHouseOrg(ident='tag:example,2020:house', label='Christie'))]},
+				},
+				'unique_catalogs': {'owner': {'copy1', 'copy2'}},
+				'counts': {'objects': 3},
+			},
+			'static_instances': {('Group', 'gpi')},
+		}
+		with tempfile.TemporaryDirectory() as tmp:
+			filename = os.path.join(tmp, 'checkpoint.json.gz')
+			save_checkpoint(filename, state)
+			loaded = load_checkpoint(filename)
+
+		self.assertEqual(loaded['component'], 2)
+		self.assertEqual(loaded['static_instances'], {('Group', 'gpi')})
+		services = loaded['services']
+		self.assertEqual(services['unique_catalogs'], {'owner': {'copy1', 'copy2'}})
+		house = services['event_properties']['auction_houses']['B-A1'][0]
+		self.assertIs(house['object_type'], vocab.AuctionHouseOrg)
+		self.assertIs(house['_CROM_FACTORY'], factory)
+		self.assertEqual(house['_LOD_OBJECT'].id, 'tag:example,2020:house')
+		dates = services['event_properties']['auction_dates']['B-A1']
+		self.assertEqual(dates[1:], ('1800-01-01', None))
+		for orig, restored in ((ts, dates[0]), (place, services['event_properties']['auction_locations']['B-A1']), (person, services['event_properties']['experts']['B-A1'][0])):
+			self.assertEqual(factory.toString(restored, compact=True), factory.toString(orig, compact=True))
+
+		target = {
+			'event_properties': {'auction_dates': {}, 'auction_locations': {}, 'experts': defaultdict(list)},
+			'unique_catalogs': defaultdict(set),
+			'counts': defaultdict(int),
+		}
+		for name, value in services.items():
+			restore_state(target[name], value)
+		self.assertIsInstance(target['unique_catalogs'], defaultdict)
+		self.assertEqual(target['unique_catalogs']['owner'], {'copy1', 'copy2'})
+		self.assertEqual(target['counts']['objects'], 3)
+		self.assertEqual(len(target['event_properties']['experts']['B-A1']), 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
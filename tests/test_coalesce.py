@@ -0,0 +1,54 @@
+#!/usr/bin/env python3 -B
+import os
+import json
+import tempfile
+import unittest
+
+from cromulent import model, vocab
+from cromulent.model import factory
+import pipeline.util
+from pipeline.util.coalesce import coalesce, duplicate_groups
+
+PREFIX = 'tag:getty.edu,2019:digital:pipeline:REPLACE-WITH-UUID:'
+
+class TestCoalesce(unittest.TestCase):
+	def write(self, root, rel, obj):
+		filename = os.path.join(root, rel)
+		os.makedirs(os.path.dirname(filename), exist_ok=True)
+		with open(filename, 'w') as fh:
+			fh.write(factory.toString(obj, False))
+		return filename
+
+	def person(self, name=None, note=None):
+		p = model.Person(ident=f'{PREFIX}shared#PERSON,1', label='Greg')
+		if name:
+			p.identified_by = vocab.PrimaryName(ident='', content=name)
+		if note:
+			p.referred_to_by = vocab.Note(ident='', content=note)
+		return p
+
+	def test_coalesce(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			self.write(tmp, 'model-person/a/0001.json', self.person(name='Greg'))
+			self.write(tmp, 'model-person/b/0001.json', self.person(note='First'))
+			self.write(tmp, 'model-person/c/0001.json', self.person(note='Second'))
+			self.write(tmp, 'model-person/c/0002.json', self.person())
+			# files of other model directories are not merged
+			self.write(tmp, 'model-group/a/0001.json', self.person(note='Group'))
+
+			self.assertEqual([[os.path.relpath(f, tmp) for f in g] for g in duplicate_groups(tmp)], [
+				['model-person/a/0001.json', 'model-person/b/0001.json', 'model-person/c/0001.json'],
+			])
+			result = coalesce(tmp, processes=2)
+			self.assertEqual(result[:4], (1, 1, 2, 0))
+
+			files = sorted(os.path.relpath(os.path.join(root, f), tmp) for root, _, fs in os.walk(tmp) for f in fs)
+			self.assertEqual(files, ['model-group/a/0001.json', 'model-person/a/0001.json', 'model-person/c/0002.json'])
+			with open(os.path.join(tmp, 'model-person/a/0001.json')) as fh:
+				data = json.load(fh)
+			self.assertEqual(data['identified_by'][0]['content'], 'Greg')
+			self.assertEqual(sorted(n['content'] for n in data['referred_to_by']), ['First', 'Second'])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3 -B
+import unittest
+from collections import defaultdict
+from unittest import mock
+
+import settings
+from pipeline.projects import PipelineBase, GraphComponent
+
+class StaticInstances:
+	def __init__(self):
+		self.used = set()
+
+class ComponentPipeline(PipelineBase):
+	'''A pipeline whose "graphs" are plain functions called with the services.'''
+	def __init__(self):
+		self.verbose = False
+		self.parallel = False
+		self.static_instances = StaticInstances()
+
+	def run_graph(self, graph, *, services):
+		graph(self, services)
+
+def writes_places(p, services):
+	services['places']['a'] = 'urn:place:a'
+	services['counts']['geog'] += 2
+	p.static_instances.used.add(('Place', 'a'))
+
+def reads_places(name):
+	def _graph(p, services):
+		services[name][name] = services['places'].get('a')
+		services['counts'][name] += 1
+	return _graph
+
+class TestComponentScheduling(unittest.TestCase):
+	def components(self):
+		return [
+			GraphComponent('geog', writes_places, reads={'places'}, writes={'places', 'counts'}),
+			GraphComponent('people', reads_places('people'), reads={'places'}, writes={'people', 'counts'}),
+			GraphComponent('corp', reads_places('corp'), reads={'places'}, writes={'corp', 'counts'}),
+		]
+
+	def test_waves(self):
+		p = ComponentPipeline()
+		waves = p.component_waves(self.components())
+		self.assertEqual([[c.name for c in w] for w in waves], [['geog'], ['people', 'corp']])
+
+		independent = [
+			GraphComponent('a', None, reads=set(), writes={'counts'}),
+			GraphComponent('b', None, reads=set(), writes={'counts'}),
+		]
+		self.assertEqual(len(p.component_waves(independent)), 1)
+
+	def test_concurrent_components(self):
+		p = ComponentPipeline()
+		services = {'places': {}, 'people': {}, 'corp': {}, 'counts': defaultdict(int)}
+		completed = []
+		with mock.patch.object(settings, 'component_processes', 2), mock.patch.object(settings, 'pipeline_tmp_path', '/tmp'):
+			p.run_components(self.components(), services=services, after=lambda c: completed.append(c.name))
+		self.assertEqual(completed, ['geog', 'people', 'corp'])
+		self.assertEqual(services['people'], {'people': 'urn:place:a'})
+		self.assertEqual(services['corp'], {'corp': 'urn:place:a'})
+		self.assertEqual(dict(services['counts']), {'geog': 2, 'people': 1, 'corp': 1})
+		self.assertEqual(p.static_instances.used, {('Place', 'a')})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3 -B
+import os
+import unittest
+import tempfile
+
+import fs.osfs
+import fs.memoryfs
+
+from pipeline.io.csv import CurriedCSVReader, ParallelCSVReader
+from pipeline.record import Record
+
+class TestCurriedCSVReader(unittest.TestCase):
+	def setUp(self):
+		self.fs = fs.memoryfs.MemoryFS()
+		self.fs.writetext('/data.csv', 'a1,b1,c1\na2,"b,2",c2\n')
+		self.names = ['a', 'b', 'c']
+
+	def read(self, **kwargs):
+		reader = CurriedCSVReader(fs='fs', limit=0, field_names=self.names, **kwargs)
+		return list(reader('/data.csv', fs=self.fs))
+
+	def test_all_columns(self):
+		rows = self.read()
+		self.assertIsInstance(rows[0], Record)
+		self.assertEqual(rows, [{'a': 'a1', 'b': 'b1', 'c': 'c1'}, {'a': 'a2', 'b': 'b,2', 'c': 'c2'}])
+
+	def test_projected_columns(self):
+		rows = self.read(columns=['c', 'a'], preserve_fields='csv')
+		self.assertEqual([str(r.pop('csv')) for r in rows], ['a: a1\nb: b1\nc: c1\n', 'a: a2\nb: b,2\nc: c2\n'])
+		self.assertEqual(rows, [{'a': 'a1', 'c': 'c1'}, {'a': 'a2', 'c': 'c2'}])
+
+		rows = self.read(columns=['b'])
+		self.assertEqual(rows, [{'b': 'b1'}, {'b': 'b,2'}])
+
+	def test_short_row(self):
+		self.fs.writetext('/data.csv', 'a1,b1,c1\na2,b2\n')
+		with self.assertWarns(UserWarning), self.assertRaisesRegex(ValueError, r'/data.csv:2'):
+			self.read()
+		with self.assertWarns(UserWarning), self.assertRaises(ValueError):
+			self.read(columns=['a'])
+
+class TestParallelCSVReader(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		for i in range(4):
+			with open(os.path.join(self.tmp.name, f'data_{i}.csv'), 'w') as f:
+				for j in range(250 * (4 - i)):
+					f.write(f'{i},{j}\n')
+		self.fs = fs.osfs.OSFS(self.tmp.name)
+		self.names = ['file', 'row']
+
+	def tearDown(self):
+		self.tmp.cleanup()
+
+	def read(self, **kwargs):
+		reader = ParallelCSVReader(fs='fs', pattern='data_*.csv', field_names=self.names, chunk_size=100, **kwargs)
+		return list(reader(fs=self.fs))
+
+	def test_ordered(self):
+		serial = self.read(limit=0, processes=1)
+		self.assertEqual(len(serial), 2500)
+		self.assertEqual(self.read(limit=0, processes=3), serial)
+		# workers parsing ahead block on their full queues rather than buffering the files
+		self.assertEqual(self.read(limit=0, processes=3, queue_size=1), serial)
+
+	def test_unordered(self):
+		serial = self.read(limit=0, processes=1)
+		for queue_size in (16, 1):
+			rows = self.read(limit=0, processes=3, ordered=False, queue_size=queue_size)
+			self.assertEqual(sorted(rows, key=lambda r: (r['file'], int(r['row']))), serial)
+
+	def test_limit(self):
+		rows = self.read(limit=1100, processes=3)
+		self.assertEqual(len(rows), 1100)
+		self.assertEqual(rows[-1], {'file': '1', 'row': '99'})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3 -B
+import os
+import sys
+import glob
+import filecmp
+import tempfile
+import unittest
+import subprocess
+from unittest import mock
+
+from cromulent import model, vocab
+from cromulent.model import factory
+import settings
+import pipeline.util
+from pipeline.linkedart import assign_deterministic_ids, placeholder_id, is_placeholder_id
+
+PREFIX = 'tag:getty.edu,2019:digital:pipeline:REPLACE-WITH-UUID:sales#'
+
+class TestDeterministicIds(unittest.TestCase):
+	def set_with_bids(self, *amounts):
+		lot = vocab.AuctionLotSet(ident=f'{PREFIX}AUCTION,B-A1,0001', label='Lot B-A1 0001')
+		for value in amounts:
+			bid = model.AttributeAssignment(ident=placeholder_id(), label=f'Bid of {value}')
+			amount = model.MonetaryAmount(ident=placeholder_id(), label=f'{value} francs')
+			amount.value = value
+			bid.assigned = amount
+			lot.attributed_by = bid
+		return lot
+
+	def test_assign(self):
+		with mock.patch.object(settings, 'deterministic_ids', True):
+			first = factory.toString(assign_deterministic_ids(self.set_with_bids(100, 200)), True)
+			second = factory.toString(assign_deterministic_ids(self.set_with_bids(100, 200)), True)
+			self.assertEqual(first, second)
+			self.assertNotIn('AUTO-ID', first)
+
+			lot = assign_deterministic_ids(self.set_with_bids(100, 200))
+			ids = {bid.id for bid in lot.attributed_by} | {bid.assigned[0].id for bid in lot.attributed_by}
+			self.assertEqual(len(ids), 4)
+			self.assertTrue(all(i.startswith('urn:uuid:') for i in ids))
+
+			# parts of the same resource serialized separately (and later merged) keep
+			# distinct ids for distinct objects
+			a = assign_deterministic_ids(self.set_with_bids(100))
+			b = assign_deterministic_ids(self.set_with_bids(300))
+			self.assertNotEqual(a.attributed_by[0].id, b.attributed_by[0].id)
+
+			top = assign_deterministic_ids(model.AttributeAssignment(ident=placeholder_id(), label='Top'))
+			self.assertFalse(is_placeholder_id(top.id))
+
+	def sales_input(self, path):
+		'''
+		Combine the input rows of all the Sales test cases into an input directory for
+		the Sales file pipeline.
+		'''
+		sales = os.path.join(path, 'sales')
+		os.makedirs(sales)
+		for f in glob.glob('data/sales/*'):
+			os.symlink(os.path.abspath(f), os.path.join(sales, os.path.basename(f)))
+		for name in ('sales_catalogs_info', 'sales_descriptions'):
+			os.symlink(os.path.abspath(f'tests/data/sales/{name}_0.csv'), os.path.join(sales, f'{name}_0.csv'))
+			with open(os.path.join(sales, f'{name}.csv'), 'w') as out:
+				for f in sorted(glob.glob(f'tests/data/sales/*/{name}_[!0]*.csv')):
+					with open(f) as fh:
+						content = fh.read()
+					out.write(content if content.endswith('\n') else content + '\n')
+		os.symlink(os.path.abspath('tests/data/sales/sales_contents_0.csv'), os.path.join(sales, 'sales_contents_0.csv'))
+		for f in sorted(glob.glob('tests/data/sales/*/sales_contents_[!0]*.csv')):
+			case = os.path.basename(os.path.dirname(f))
+			os.symlink(os.path.abspath(f), os.path.join(sales, f'sales_contents_{case}-{os.path.basename(f)}'))
+
+	def run_sales(self, path, seed):
+		output = os.path.join(path, f'output-{seed}')
+		tmp = os.path.join(path, f'tmp-{seed}')
+		os.makedirs(os.path.join(tmp, 'pipeline'))
+		os.makedirs(output)
+		env = dict(os.environ,
+			PYTHONHASHSEED=str(seed),
+			QUIET='1',
+			GETTY_PIPELINE_DETERMINISTIC_IDS='1',
+			GETTY_PIPELINE_INPUT=os.path.join(path, 'input'),
+			GETTY_PIPELINE_COMMON_SERVICE_FILES_PATH=os.path.abspath('data/common'),
+			GETTY_PIPELINE_TMP_PATH=tmp,
+			GETTY_PIPELINE_OUTPUT=output,
+		)
+		subprocess.run([sys.executable, '-B', 'sales.py'], env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+		return output
+
+	def assertSameTree(self, a, b):
+		cmp = filecmp.dircmp(a, b)
+		self.assertEqual((cmp.left_only, cmp.right_only), ([], []), cmp.left)
+		_, mismatch, errors = filecmp.cmpfiles(a, b, cmp.common_files, shallow=False)
+		self.assertEqual((mismatch, errors), ([], []), cmp.left)
+		for d in cmp.common_dirs:
+			self.assertSameTree(os.path.join(a, d), os.path.join(b, d))
+
+	def test_reproducible_output(self):
+		# set iteration order (and so the order in which the values of a property are
+		# added) depends on the hash seed of each process
+		with tempfile.TemporaryDirectory() as tmp:
+			self.sales_input(os.path.join(tmp, 'input'))
+			first = self.run_sales(tmp, 1)
+			files = glob.glob(os.path.join(first, '**', '*.json'), recursive=True)
+			self.assertGreater(len(files), 100)
+			for seed in (2, 3, 4):
+				self.assertSameTree(first, self.run_sales(tmp, seed))
+
+	def test_disabled(self):
+		with mock.patch.object(settings, 'deterministic_ids', False):
+			lot = assign_deterministic_ids(self.set_with_bids(100))
+			self.assertTrue(is_placeholder_id(lot.attributed_by[0].id))
+
+
+if __name__ == '__main__':
+	unittest.main()
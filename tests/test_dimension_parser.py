@@ -0,0 +1,58 @@
+#!/usr/bin/env python3 -B
+import json
+import unittest
+
+from cromulent.model import factory
+from cromulent.extract import extract_physical_dimensions
+from pipeline.linkedart import DimensionParser
+
+def without_ids(data):
+	if isinstance(data, dict):
+		return {k: without_ids(v) for k, v in data.items() if k != 'id'}
+	elif isinstance(data, list):
+		return [without_ids(v) for v in data]
+	return data
+
+def serialize(dims):
+	return [without_ids(json.loads(factory.toString(d, compact=True))) for d in dims]
+
+class TestDimensionParser(unittest.TestCase):
+	def setUp(self):
+		self.statements = [
+			('30 x 40', None),
+			('h. 12 in.', None),
+			('30 x 40', 'inches'),
+			('Haut 14 pouces, large 18 pouces', None),
+			('not a dimension', None),
+		]
+
+	def verify(self, parser):
+		for _ in range(2):
+			for dimstr, unit in self.statements:
+				expected = serialize(extract_physical_dimensions(dimstr, default_unit=unit))
+				got = serialize(parser(dimstr, default_unit=unit))
+				self.assertEqual(got, expected)
+
+	def test_uncached(self):
+		parser = DimensionParser(maxsize=0)
+		self.verify(parser)
+		self.assertEqual(parser.hits, 0)
+		self.assertEqual(parser.misses, 10)
+		self.assertEqual(len(parser.cache), 0)
+
+	def test_cached(self):
+		parser = DimensionParser()
+		self.verify(parser)
+		self.assertEqual(parser.hits, 5)
+		self.assertEqual(parser.misses, 5)
+		self.assertEqual(parser.hit_rate(), 0.5)
+
+		# each call constructs new objects
+		d1 = list(parser('30 x 40'))
+		d2 = list(parser('30 x 40'))
+		self.assertEqual(len(d1), 2)
+		self.assertIsNot(d1[0], d2[0])
+
+
+if __name__ == '__main__':
+	unittest.main()
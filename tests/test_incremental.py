@@ -0,0 +1,110 @@
+#!/usr/bin/env python3 -B
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from cromulent import model, vocab
+from cromulent.model import factory
+import settings
+import pipeline.util
+import pipeline.linkedart
+from pipeline.io.file import MergingFileWriter
+from pipeline.util.rewriting import UUIDRewriter
+from pipeline.incremental import IncrementalState, IncrementalRowFilter, lineage_recorder, remove_resources, row_fingerprint, set_active_plan, set_current_row
+
+class TestIncrementalRuns(unittest.TestCase):
+	def run_rows(self, state, rows):
+		'''Model `rows` (mapping keys to the resources they contribute to) as a pipeline run would.'''
+		fingerprints = {k: row_fingerprint([k, *sorted(resources)]) for k, resources in rows.items()}
+		plan = state.plan(fingerprints)
+		node = IncrementalRowFilter(key='star_record_no', rows=plan.rows)
+		with mock.patch.object(settings, 'incremental_state_path', state.directory):
+			for k, resources in rows.items():
+				for data in node({'star_record_no': k}):
+					for uri in resources:
+						lineage_recorder().record('Person', uri)
+		set_current_row(None)
+		state.commit(plan)
+		return plan
+
+	def test_plan(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			state = IncrementalState(tmp)
+			rows = {'1': {'p:a'}, '2': {'p:a', 'p:b'}, '3': {'p:c'}, '4': {'p:d'}}
+			plan = self.run_rows(state, rows)
+			self.assertEqual(plan.rows, {'1', '2', '3', '4'})
+			self.assertEqual(plan.affected, set())
+
+			# unchanged input
+			plan = self.run_rows(state, rows)
+			self.assertEqual(plan.rows, set())
+
+			# row 1 changes (re-modeling row 2, which also contributed to p:a), row 4 is removed
+			rows = {'1': {'p:a', 'p:e'}, '2': {'p:a', 'p:b'}, '3': {'p:c'}}
+			plan = self.run_rows(state, rows)
+			self.assertEqual(plan.rows, {'1', '2'})
+			self.assertEqual(plan.affected, {('Person', 'p:a'), ('Person', 'p:d')})
+
+			lineage = state.lineage()
+			self.assertEqual(set(lineage), {'1', '2', '3'})
+			self.assertEqual(lineage['1'], {('Person', 'p:a'), ('Person', 'p:e')})
+			self.assertEqual(lineage['3'], {('Person', 'p:c')})
+			self.assertFalse([f for f in os.listdir(tmp) if f.startswith('lineage-')])
+
+	def model_rows(self, state, output, rows):
+		'''
+		Write the people of `rows` (mapping keys to `(uri, note)` pairs) to `output`, as an
+		incremental pipeline run would, each note being an attribute assignment with a
+		random id.
+		'''
+		fingerprints = {k: row_fingerprint([k, *(f'{uri} {note}' for uri, note in people)]) for k, people in rows.items()}
+		plan = state.plan(fingerprints)
+		remove_resources(plan.affected, output, UUIDRewriter(settings.uuid_prefix))
+		set_active_plan(plan)
+		node = IncrementalRowFilter(key='star_record_no', rows=plan.rows)
+		writer = MergingFileWriter(directory=output, model='person')
+		with mock.patch.object(settings, 'incremental_state_path', state.directory):
+			for k, people in rows.items():
+				for data in node({'star_record_no': k}):
+					for uri, note in people:
+						p = model.Person(ident=uri, label=uri)
+						p.attributed_by = model.AttributeAssignment(label=note)
+						writer(pipeline.linkedart.add_crom_data(data={}, what=p))
+			set_current_row(None)
+			state.commit(plan)
+		return plan
+
+	def output_files(self, output):
+		files = {}
+		for name in os.listdir(os.path.join(output, 'person')):
+			with open(os.path.join(output, 'person', name)) as fh:
+				data = json.load(fh)
+			files[name] = sorted(a['_label'] for a in data['attributed_by'])
+		return files
+
+	def test_incremental_output(self):
+		rows = {'1': [('p:a', 'one')], '2': [('p:a', 'two'), ('p:b', 'two')], '3': [('p:c', 'three')]}
+		changed = dict(rows, **{'1': [('p:a', 'one (corrected)')]})
+		with tempfile.TemporaryDirectory() as tmp:
+			state = IncrementalState(os.path.join(tmp, 'state'))
+			output = os.path.join(tmp, 'incremental')
+			os.mkdir(output)
+			self.model_rows(state, output, rows)
+			plan = self.model_rows(state, output, changed)
+			self.assertEqual(plan.rows, {'1', '2'})
+			plan = self.model_rows(state, output, changed)
+			self.assertEqual(plan.rows, set())
+
+			full = os.path.join(tmp, 'full')
+			os.mkdir(full)
+			self.model_rows(IncrementalState(os.path.join(tmp, 'full-state')), full, changed)
+			files = self.output_files(full)
+			self.assertEqual(sorted(files.values()), [['one (corrected)', 'two'], ['three'], ['two']])
+			# row 2 is modeled again for p:a, but its note on p:b is not merged in twice
+			self.assertEqual(self.output_files(output), files)
+
+
+if __name__ == '__main__':
+	unittest.main()
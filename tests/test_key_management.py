@@ -0,0 +1,78 @@
+#!/usr/bin/env python3 -B
+import unittest
+
+from pipeline.nodes.basic import KeyManagement, GroupRepeatingKeys, GroupKeys
+
+class TestKeyManagement(unittest.TestCase):
+	def setUp(self):
+		self.node = KeyManagement(
+			drop_empty=True,
+			operations=[
+				{
+					'remove': {'junk'},
+					'rename': {'old': 'new'},
+				},
+				{
+					'group_repeating': {
+						'names': {
+							'prefixes': ('name', 'role'),
+							'rename_keys': {'name': 'label'},
+						}
+					},
+					'group': {
+						'object': {
+							'properties': ('title', 'new', 'missing'),
+							'postprocess': lambda d, p: dict(d, count=len(p['names'])),
+						}
+					}
+				}
+			]
+		)
+
+	def record(self, **kwargs):
+		data = {
+			'junk': 'x',
+			'old': 'o',
+			'title': 'T',
+			'name_1': 'a',
+			'role_1': 'r',
+			'name_2': '',
+			'role_2': '',
+			'name_3': 'c',
+			'other': 'y',
+		}
+		data.update(kwargs)
+		return data
+
+	def test_key_management(self):
+		data = self.node(self.record())
+		self.assertEqual(data, {
+			'other': 'y',
+			'names': [{'label': 'a', 'role': 'r'}, {'label': 'c'}],
+			'object': {'title': 'T', 'new': 'o', 'count': 2},
+		})
+
+	def test_plan_cache(self):
+		self.node(self.record())
+		data = self.node(self.record(title='U', name_1='b'))
+		self.assertEqual(data['names'], [{'label': 'b', 'role': 'r'}, {'label': 'c'}])
+		self.assertEqual(data['object']['title'], 'U')
+		self.assertEqual(len(self.node._plans), 1)
+
+		# records with a different set of keys get their own plan
+		data = self.node(self.record(role_3='q', name_4='d', role_4='s'))
+		self.assertEqual(data['names'], [{'label': 'a', 'role': 'r'}, {'label': 'c', 'role': 'q'}, {'label': 'd', 'role': 's'}])
+		self.assertEqual(len(self.node._plans), 2)
+
+	def test_group_nodes(self):
+		data = {'a_1': '1', 'b_1': '2', 'a_2': '3', 'c': '', 'd': '4'}
+		data = GroupRepeatingKeys(drop_empty=True, mapping={'ab': {'prefixes': ('a', 'b')}})(data)
+		data = GroupKeys(drop_empty=False, mapping={'cd': {'properties': ('c', 'd', 'e')}})(data)
+		self.assertEqual(data, {
+			'ab': [{'a': '1', 'b': '2'}, {'a': '3'}],
+			'cd': {'c': '', 'd': '4', 'e': None},
+		})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3 -B
+import os
+import json
+import tempfile
+import unittest
+
+from pipeline.io.output_index import OutputIndex
+
+class TestOutputIndex(unittest.TestCase):
+	def write(self, path, uu, label, mtime=None):
+		directory = os.path.join(path, uu[:2])
+		os.makedirs(directory, exist_ok=True)
+		filename = os.path.join(directory, f'{uu}.json')
+		with open(filename, 'w') as fh:
+			json.dump({'id': f'urn:uuid:{uu}', '_label': label}, fh)
+		if mtime:
+			os.utime(filename, (mtime, mtime))
+		return filename
+
+	def test_index(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			output = os.path.join(tmp, 'output')
+			people = os.path.join(output, 'model-person')
+			for i, name in enumerate(('Alice', 'Bob', 'Carol', 'Alicia')):
+				self.write(people, f'a{i}000000', name, mtime=1000)
+			objects = os.path.join(output, 'model-object')
+			self.write(objects, 'b0000000', 'Painting', mtime=1000)
+
+			index = OutputIndex(output, os.path.join(tmp, 'index.sqlite'))
+			self.assertEqual(index.refresh(), 5)
+			self.assertEqual(index.models(), [('model-object', 1), ('model-person', 4)])
+			self.assertEqual(index.lookup('a1000000'), ('model-person', 'model-person/a1/a1000000.json', 'Bob'))
+
+			total, files = index.files('model-person', query='ali')
+			self.assertEqual(total, 2)
+			self.assertEqual([label for _, _, label in files], ['Alice', 'Alicia'])
+			total, files = index.files('model-person', offset=1, limit=2)
+			self.assertEqual(total, 4)
+			self.assertEqual([label for _, _, label in files], ['Alicia', 'Bob'])
+
+			# the index persists, and only changed files are updated
+			index.cache_page('model-object/b0/b0000000.json', 1000, '<html/>')
+			index = OutputIndex(output, os.path.join(tmp, 'index.sqlite'))
+			self.assertEqual(index.refresh(), 0)
+			self.assertEqual(index.cached_page('model-object/b0/b0000000.json', 1000), '<html/>')
+
+			self.write(objects, 'b0000000', 'Drawing', mtime=2000)
+			os.remove(os.path.join(people, 'a2', 'a2000000.json'))
+			self.assertEqual(index.refresh(), 2)
+			self.assertEqual(index.lookup('b0000000')[2], 'Drawing')
+			self.assertIsNone(index.lookup('a2000000'))
+			self.assertIsNone(index.cached_page('model-object/b0/b0000000.json', 1000))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3 -B
+import io
+import os
+import re
+import tempfile
+import contextlib
+import unittest
+from unittest import mock
+
+from cromulent import model, vocab
+import settings
+import pipeline.util
+from pipeline.linkedart import add_crom_data
+from pipeline.io.memory import MergingMemoryWriter, flush_memory_writers
+
+PREFIX = 'tag:getty.edu,2019:digital:pipeline:REPLACE-WITH-UUID:sales#'
+
+class TestParallelFlush(unittest.TestCase):
+	def fill(self, directory):
+		os.makedirs(directory, exist_ok=True)
+		people = MergingMemoryWriter(directory=directory, partition_directories=True, model='model-person')
+		groups = MergingMemoryWriter(directory=directory, partition_directories=True, model='model-group')
+		# a second writer of the same model (as in the sales pipeline), holding other
+		# fragments of the same people
+		more_people = MergingMemoryWriter(directory=directory, partition_directories=True, model='model-person')
+		for i in range(40):
+			person = model.Person(ident=f'{PREFIX}PERSON,{i}', label=f'Person {i}')
+			people(add_crom_data(data={}, what=person))
+			# a second fragment of the same resource is merged before flushing
+			person = model.Person(ident=f'{PREFIX}PERSON,{i}')
+			person.identified_by = vocab.PrimaryName(ident='', content=f'Name {i}')
+			people(add_crom_data(data={}, what=person))
+			person = model.Person(ident=f'{PREFIX}PERSON,{i}')
+			person.referred_to_by = vocab.Note(ident='', content=f'Note {i}')
+			more_people(add_crom_data(data={}, what=person))
+			groups(add_crom_data(data={}, what=model.Group(ident=f'{PREFIX}GROUP,{i}', label=f'Group {i}')))
+		return [people, groups, more_people]
+
+	def tree(self, directory):
+		files = {}
+		for dirpath, _, filenames in os.walk(directory):
+			for f in filenames:
+				filename = os.path.join(dirpath, f)
+				with open(filename) as fh:
+					files[os.path.relpath(filename, directory)] = fh.read()
+		return files
+
+	def test_parallel_flush(self):
+		with tempfile.TemporaryDirectory() as tmp, mock.patch.object(settings, 'output_format', 'files'):
+			serial = os.path.join(tmp, 'serial')
+			parallel = os.path.join(tmp, 'parallel')
+			flush_memory_writers(self.fill(serial), processes=1, verbose=False)
+			writers = self.fill(parallel)
+			person_partitions = len(writers[0].partitions())
+			self.assertGreater(person_partitions, 1)
+			log = io.StringIO()
+			with contextlib.redirect_stderr(log):
+				flush_memory_writers(writers, processes=3)
+			# each output partition of a model is written by a single task, even when it
+			# holds data of several writers
+			flushed = re.findall(r'of model (\S+) \(partition (\w+)\)', log.getvalue())
+			self.assertEqual(len(flushed), len(set(flushed)))
+			self.assertEqual(sum(1 for m, _ in flushed if m == 'model-person'), person_partitions)
+			self.assertEqual(writers[0].data, {})
+
+			expected = self.tree(serial)
+			self.assertEqual(len(expected), 80)
+			self.assertTrue(all('Note' in content for f, content in expected.items() if f.startswith('model-person')))
+			self.assertEqual(self.tree(parallel), expected)
+
+
+if __name__ == '__main__':
+	unittest.main()
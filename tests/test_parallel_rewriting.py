@@ -0,0 +1,55 @@
+#!/usr/bin/env python3 -B
+import os
+import json
+import tempfile
+import unittest
+
+from cromulent import model, vocab
+from cromulent.model import factory
+import pipeline.util
+from pipeline.util.rewriting import rewrite_output_files, UUIDRewriter
+
+PREFIX = 'tag:getty.edu,2019:digital:pipeline:REPLACE-WITH-UUID:'
+
+class TestParallelRewriting(unittest.TestCase):
+	def fill(self, directory):
+		for i in range(30):
+			# every third resource is serialized in two fragments, which are merged when
+			# renamed to the same file
+			p = model.Person(ident=f'{PREFIX}shared#PERSON,{i // 2 if i % 3 == 0 else i}', label=f'Person {i}')
+			p.referred_to_by = vocab.Note(ident='', content=f'Note {i}')
+			p.member_of = model.Group(ident=f'{PREFIX}shared#GROUP,{i % 4}')
+			filename = os.path.join(directory, 'model-person', f'file-{i}.json')
+			os.makedirs(os.path.dirname(filename), exist_ok=True)
+			with open(filename, 'w') as fh:
+				fh.write(factory.toString(p, False))
+
+	def tree(self, directory):
+		files = {}
+		for dirpath, _, filenames in os.walk(directory):
+			for f in filenames:
+				filename = os.path.join(dirpath, f)
+				with open(filename) as fh:
+					data = json.load(fh)
+				if 'referred_to_by' in data:
+					data['referred_to_by'].sort(key=lambda n: n['content'])
+				files[os.path.relpath(filename, directory)] = data
+		return files
+
+	def test_parallel_rename(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			serial = os.path.join(tmp, 'serial')
+			parallel = os.path.join(tmp, 'parallel')
+			self.fill(serial)
+			self.fill(parallel)
+			rewrite_output_files(UUIDRewriter(PREFIX), update_filename=True, path=serial)
+			rewrite_output_files(UUIDRewriter(PREFIX), update_filename=True, parallel=True, concurrency=3, path=parallel)
+
+			expected = self.tree(serial)
+			self.assertEqual(len(expected), 25)
+			self.assertFalse([f for f in expected if 'file-' in f])
+			self.assertEqual(self.tree(parallel), expected)
+
+
+if __name__ == '__main__':
+	unittest.main()
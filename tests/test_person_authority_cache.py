@@ -0,0 +1,74 @@
+#!/usr/bin/env python3 -B
+import unittest
+
+from cromulent import model, vocab
+from cromulent.model import factory
+import pipeline.util
+from pipeline.projects import PersonIdentity, UtilityHelper
+
+class TestPersonAuthorityCache(unittest.TestCase):
+	def setUp(self):
+		# registered by PipelineBase
+		if not hasattr(vocab, 'Internal'):
+			vocab.register_instance('function', {'parent': model.Type, 'id': '300444971', 'label': 'Function (general concept)'})
+			vocab.register_vocab_class('Internal', {"parent": model.LinguisticObject, "id":"300444972", "label": "private (general concept)", "metatype": "function"})
+			vocab.register_vocab_class('External', {"parent": model.LinguisticObject, "id":"300444973", "label": "public (general concept)", "metatype": "function"})
+		helper = UtilityHelper('test')
+		self.identity = PersonIdentity(make_shared_uri=helper.make_shared_uri, make_proj_uri=helper.make_proj_uri)
+
+	def test_cache_hits(self):
+		records = [vocab.SalesCatalogText(ident=f'http://example.org/record/{i}') for i in range(3)]
+		people = []
+		for i, record in enumerate(records):
+			data = {'auth_name': 'RUBENS, PETER PAUL', 'name': 'Rubens', 'pi_record_no': f'R{i}'}
+			people.append(self.identity.add_person(data, record=record, relative_id='artist-1', role='artist'))
+			self.assertEqual(data['role_label'], 'artist “RUBENS, PETER PAUL”')
+			self.assertEqual(data['uri'], people[0].id)
+
+		self.assertEqual(dict(self.identity.authority_cache_stats), {'miss': 1, 'hit': 2})
+		# each occurrence is modeled by a new agent, referring only to its own record
+		self.assertEqual(len({id(p) for p in people}), 3)
+		for p, record in zip(people, records):
+			self.assertEqual([r.id for r in p.referred_to_by], [record.id])
+			for name in p.identified_by:
+				self.assertEqual([r.id for r in name.referred_to_by], [record.id])
+		# copies do not share the objects of their models
+		names = [id(n) for p in people for n in p.identified_by]
+		self.assertEqual(len(names), len(set(names)))
+
+	def test_cached_models_are_copied(self):
+		record = vocab.SalesCatalogText(ident='http://example.org/record/0')
+		data = {'auth_name': 'RUBENS, PETER PAUL', 'name': 'Rubens'}
+		first = self.identity.add_person(data, record=record, relative_id='artist-1', role='artist')
+		expected = factory.toString(first, False)
+		names = data['identifiers']
+
+		# changes to a model or its data after it is returned do not reach later occurrences
+		first.referred_to_by = vocab.Note(ident='', content='Only in the first occurrence')
+		first.identified_by[0].content = 'Changed'
+		names.append(vocab.PrimaryName(ident='', content='Extra'))
+
+		data = {'auth_name': 'RUBENS, PETER PAUL', 'name': 'Rubens'}
+		second = self.identity.add_person(data, record=record, relative_id='artist-1', role='artist')
+		self.assertEqual(dict(self.identity.authority_cache_stats), {'miss': 1, 'hit': 1})
+		self.assertEqual(factory.toString(second, False), expected)
+		self.assertIsNot(data['identifiers'], names)
+		self.assertIs(data['_LOD_OBJECT'], second)
+
+	def test_cache_size(self):
+		self.identity.authority_cache_size = 1
+		for auth_name in ('RUBENS, PETER PAUL', 'REMBRANDT', 'RUBENS, PETER PAUL'):
+			self.identity.add_person({'auth_name': auth_name, 'name': auth_name}, relative_id='artist-1')
+		self.assertEqual(dict(self.identity.authority_cache_stats), {'miss': 3})
+		self.assertEqual(len(self.identity.authority_cache), 1)
+
+	def test_uncached_people(self):
+		# people without an authority have record-specific URIs, and are not cached
+		for i in range(2):
+			data = {'name': 'Smith', 'pi_record_no': f'R{i}'}
+			self.identity.add_person(data, relative_id='seller-1')
+		self.assertEqual(sum(self.identity.authority_cache_stats.values()), 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3 -B
+import pickle
+import unittest
+
+from pipeline.nodes.basic import PreserveCSVFields, CSVFieldsText
+
+class TestPreserveCSVFields(unittest.TestCase):
+	def test_ordered(self):
+		data = {'b': 'x', 'a': '1', 'c': 'z'}
+		out, = list(PreserveCSVFields(key='csv', order=['a', 'b', 'd'])(data))
+		text = out['csv']
+		self.assertIsInstance(text, CSVFieldsText)
+		del data['a']
+		data['b'] = 'changed'
+		self.assertEqual(str(text), 'a: 1\nb: x\nd: \n')
+		self.assertEqual(pickle.loads(pickle.dumps(text)), text)
+
+	def test_sorted(self):
+		data = {'b': 'x', 'a': '1'}
+		out, = list(PreserveCSVFields(key='csv', order=[])(data))
+		self.assertEqual(str(out['csv']), 'a: 1\nb: x\n')
+
+
+if __name__ == '__main__':
+	unittest.main()
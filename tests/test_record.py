@@ -0,0 +1,69 @@
+#!/usr/bin/env python3 -B
+import gc
+import pickle
+import unittest
+
+from cromulent import model
+from cromulent.model import factory
+from pipeline.record import Record, child_record
+from pipeline.linkedart import add_crom_data, get_crom_object
+from pipeline.util import ExtractKeyedValues
+
+class TestRecord(unittest.TestCase):
+	def test_dict_api(self):
+		r = Record({'a': 1})
+		o = model.Person(ident='urn:x')
+		add_crom_data(data=r, what=o)
+		self.assertIs(get_crom_object(r), o)
+		self.assertIs(r['_CROM_FACTORY'], factory)
+		self.assertEqual(set(r.keys()), {'a', '_CROM_FACTORY', '_LOD_OBJECT'})
+		self.assertEqual(len(r), 3)
+		self.assertIn('_LOD_OBJECT', r)
+		self.assertEqual(r, {'a': 1, '_CROM_FACTORY': factory, '_LOD_OBJECT': o})
+		self.assertEqual({k: v for k, v in r.items() if k != '_LOD_OBJECT'}, {'a': 1, '_CROM_FACTORY': factory})
+		self.assertEqual(dict(r)['_LOD_OBJECT'], o)
+
+		c = r.copy()
+		self.assertIsInstance(c, Record)
+		self.assertEqual(c, r)
+
+		del r['_LOD_OBJECT']
+		self.assertNotIn('_LOD_OBJECT', r)
+		self.assertIsNone(r.get('_LOD_OBJECT'))
+		self.assertEqual(r.setdefault('_LOD_OBJECT', o), o)
+		self.assertEqual(r.pop('_LOD_OBJECT'), o)
+		with self.assertRaises(KeyError):
+			r['_LOD_OBJECT']
+
+	def test_pickle(self):
+		r = Record({'a': 1, 'parent_data': {'b': 2}})
+		s = pickle.loads(pickle.dumps(r))
+		self.assertIsInstance(s, Record)
+		self.assertEqual(s, r)
+
+	def test_weak_parent(self):
+		parent = Record({'key': [{'a': 1}]})
+		child = child_record({'a': 1}, parent, weak_parent=True)
+		self.assertIs(child['parent_data'], parent)
+		del parent
+		gc.collect()
+		self.assertNotIn('parent_data', child)
+		self.assertEqual(child, {'a': 1})
+
+	def test_strong_parent(self):
+		parent = {'key': [{'a': 1}]}
+		child = child_record({'a': 1}, parent, weak_parent=True)
+		del parent
+		gc.collect()
+		self.assertEqual(child['parent_data'], {'key': [{'a': 1}]})
+
+	def test_extract_without_parent(self):
+		data = Record({'key': [{'a': 1}, {'a': 2}]})
+		children = list(ExtractKeyedValues(key='key', include_parent=False)(data))
+		self.assertEqual(children, [{'a': 1}, {'a': 2}])
+		children = list(ExtractKeyedValues(key='key')(data))
+		self.assertIs(children[0]['parent_data'], data)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3 -B
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+import pipeline.release
+from pipeline.release import build_manifest, read_manifest, write_manifest, compare_manifests, write_delta_archive
+
+class TestReleaseManifest(unittest.TestCase):
+	def write(self, root, rel, content):
+		filename = os.path.join(root, rel)
+		os.makedirs(os.path.dirname(filename), exist_ok=True)
+		with open(filename, 'w') as fh:
+			fh.write(content)
+
+	def test_delta(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			first = os.path.join(tmp, 'sales-2020-01-01')
+			self.write(first, 'model-object/aa/aa01.json', '{"id": "urn:uuid:aa01"}')
+			self.write(first, 'model-object/aa/aa01.nq', '<urn:uuid:aa01> a <Object> .')
+			self.write(first, 'model-person/bb/bb01.json', '{"id": "urn:uuid:bb01"}')
+			self.write(first, 'model-person/bb/bb02.json', '{"id": "urn:uuid:bb02"}')
+			self.write(first, 'tmp/uri_to_uuid_map.json', '{}')
+			self.write(first, 'meta.nq', '')
+
+			previous = build_manifest(first, processes=2)
+			self.assertEqual(sorted(previous), ['model-object/aa/aa01.json', 'model-object/aa/aa01.nq', 'model-person/bb/bb01.json', 'model-person/bb/bb02.json'])
+			self.assertEqual(previous['model-person/bb/bb01.json'][:2], ('bb01', 'model-person'))
+			write_manifest(os.path.join(tmp, 'previous.tsv'), previous)
+			self.assertEqual(read_manifest(os.path.join(tmp, 'previous.tsv')), previous)
+
+			# unchanged files of the same tree are not hashed again
+			with mock.patch.object(pipeline.release, '_hash_file', wraps=pipeline.release._hash_file) as hash_file:
+				self.assertEqual(build_manifest(first, previous=previous, processes=1), previous)
+				hash_file.assert_not_called()
+
+			second = os.path.join(tmp, 'sales-2020-02-01')
+			shutil.copytree(first, second)
+			self.write(second, 'model-person/bb/bb01.json', '{"id": "urn:uuid:bb01", "_label": "Changed"}')
+			os.remove(os.path.join(second, 'model-person/bb/bb02.json'))
+			self.write(second, 'model-person/cc/cc01.json', '{"id": "urn:uuid:cc01"}')
+
+			current = build_manifest(second, processes=1)
+			delta = compare_manifests(previous, current)
+			self.assertEqual(delta.added, ['model-person/cc/cc01.json'])
+			self.assertEqual(delta.changed, ['model-person/bb/bb01.json'])
+			self.assertEqual(delta.removed, ['model-person/bb/bb02.json'])
+
+			archive = os.path.join(tmp, 'delta.tar.gz')
+			count = write_delta_archive(archive, second, delta, previous, current, suffixes=('.json',), arcname='sales-2020-02-01')
+			self.assertEqual(count, 2)
+			with tarfile.open(archive) as tar:
+				self.assertEqual(sorted(tar.getnames()), ['sales-2020-02-01/changes.tsv', 'sales-2020-02-01/model-person/bb/bb01.json', 'sales-2020-02-01/model-person/cc/cc01.json'])
+				changes = tar.extractfile('sales-2020-02-01/changes.tsv').read().decode('utf-8')
+			statuses = [line.split('\t')[:3] for line in changes.splitlines()]
+			self.assertEqual(statuses, [
+				['changed', 'model-person/bb/bb01.json', 'bb01'],
+				['removed', 'model-person/bb/bb02.json', 'bb02'],
+				['added', 'model-person/cc/cc01.json', 'cc01'],
+			])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3 -B
+import unittest
+
+from pipeline.projects.sales import PriceParser
+
+class TestPriceParser(unittest.TestCase):
+	def setUp(self):
+		currencies = {'fl': 'de florins', 'pounds': 'gb pounds'}
+		region_currencies = {'N': {'fl': 'dutch guilder'}}
+		decimalization = {
+			'gb pounds': {'primary_unit': 'pounds', 'subunits': [['shillings', 20], ['pence', 240]]},
+			'dutch guilder': {'primary_unit': 'guilders', 'subunits': [['stuivers', 20]]},
+		}
+		self.parser = PriceParser(currencies, region_currencies, decimalization)
+
+	def test_region_mapping(self):
+		self.assertEqual(self.parser.currency_mapping('N')['fl'], 'dutch guilder')
+		self.assertEqual(self.parser.currency_mapping('B')['fl'], 'de florins')
+		self.assertEqual(self.parser.currencies['fl'], 'de florins')
+
+	def test_parse(self):
+		self.assertEqual(self.parser.parse('10-10-0', 'Pounds', 'B'), ('10.5', '10 pounds, 10 shillings'))
+		self.assertEqual(self.parser.parse('3-5 [?]', 'fl', 'N'), ('3.25', '3 guilders, 5 stuivers'))
+		self.assertIsNone(self.parser.parse('3-x', 'fl', 'N'))
+		with self.assertWarns(UserWarning):
+			self.assertEqual(self.parser.parse('3-5', 'fl', 'B'), ('3-5', '3-5'))
+		self.assertEqual(self.parser.parse('10-10-0', 'Pounds', 'B'), ('10.5', '10 pounds, 10 shillings'))
+		self.assertEqual(self.parser.parse.cache_info().hits, 1)
+
+	def test_bounded_cache(self):
+		parser = PriceParser(self.parser.currencies, {}, self.parser.decimalization, maxsize=2)
+		for i in range(5):
+			parser.parse(f'{i}-0-0', 'pounds', 'B')
+		self.assertEqual(parser.parse.cache_info().currsize, 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3 -B
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from cromulent import vocab
+import settings
+import pipeline.util
+from pipeline.linkedart import add_crom_data
+from pipeline.io.segments import SegmentStore, MergingSegmentWriter, open_output, export_segments, close_stores
+
+class TestSegmentStore(unittest.TestCase):
+	def test_store(self):
+		for compress in (False, True):
+			with tempfile.TemporaryDirectory() as tmp:
+				path = os.path.join(tmp, 'person')
+				store = SegmentStore(path, writable=True, compress=compress, segment_size=40)
+				for i in range(5):
+					store.put(f'uuid-{i}', json.dumps({'id': i}))
+				store.put('uuid-1', json.dumps({'id': 1, 'merged': True}))
+
+				# the records listed in the index are already written to the segment files
+				reader = SegmentStore(path)
+				self.assertEqual(json.loads(reader.get('uuid-1')), {'id': 1, 'merged': True})
+				reader.close()
+
+				self.assertEqual(json.loads(store.get('uuid-1')), {'id': 1, 'merged': True})
+				store.close()
+				self.assertGreater(len(store.segments), 1)
+
+				reopened = open_output(tmp)['person']
+				self.assertEqual(len(reopened), 5)
+				self.assertIn('uuid-4', reopened)
+				self.assertEqual(json.loads(reopened.get('uuid-3')), {'id': 3})
+				self.assertEqual([uu for uu, _ in reopened], ['uuid-0', 'uuid-2', 'uuid-3', 'uuid-4', 'uuid-1'])
+				reopened.close()
+
+	def test_merging_writer_and_export(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			out = os.path.join(tmp, 'segments')
+			writer = MergingSegmentWriter(directory=out, model='person')
+			p1 = vocab.Person(ident='http://example.org/p1', label='Greg')
+			writer(add_crom_data(data={'uuid': '0001'}, what=p1))
+			p2 = vocab.Person(ident='http://example.org/p1', label='Greg')
+			p2.identified_by = vocab.PrimaryName(ident='', content='Gregory Williams')
+			writer(add_crom_data(data={'uuid': '0001'}, what=p2))
+			close_stores()
+
+			files = os.path.join(tmp, 'files')
+			self.assertEqual(export_segments(out, files), 1)
+			with open(os.path.join(files, 'person', '00', '0001.json')) as fh:
+				data = json.load(fh)
+			self.assertEqual(data['id'], 'http://example.org/p1')
+			self.assertEqual(data['identified_by'][0]['content'], 'Gregory Williams')
+
+	def test_concurrent_components(self):
+		with tempfile.TemporaryDirectory() as tmp, mock.patch.object(settings, 'component_processes', 2):
+			with self.assertRaises(ValueError):
+				MergingSegmentWriter(directory=tmp, model='person')
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3 -B
+import unittest
+import multiprocessing
+
+from pipeline.util.state import LastWriterMap, UnionMap, AppendMap, CounterMap, \
+			StateGroup, SharedStateStore, restore_shared
+
+def add_counts(counts, places, n):
+	for i in range(n):
+		counts.merge_value('records', 1)
+	places.merge_value('uri', {f'urn:{n}'})
+
+class TestSharedState(unittest.TestCase):
+	def test_merge_semantics(self):
+		last = LastWriterMap({'a': 1})
+		last.merge_value('a', 2)
+		self.assertEqual(last, {'a': 2})
+
+		union = UnionMap()
+		union.merge_value('a', {1, 2})
+		union['a'].add(3)
+		union.merge_value('a', {2, 4})
+		self.assertEqual(union, {'a': {1, 2, 3, 4}})
+
+		append = AppendMap()
+		append.merge_value('a', [1])
+		append['a'] += [2]
+		self.assertEqual(append, {'a': [1, 2]})
+
+		counts = CounterMap()
+		counts['a'] += 1
+		counts.merge_value('a', 2)
+		counts.merge_value('b')
+		self.assertEqual(counts, {'a': 3, 'b': 1})
+
+	def test_shard_and_reduce(self):
+		state = StateGroup({
+			'houses': AppendMap({'1': ['x']}),
+			'dates': LastWriterMap({'1': 'a'}),
+			'catalogs': UnionMap({'c': {1}}),
+			'counts': CounterMap({'events': 2}),
+		})
+		parent = state.snapshot()
+
+		# a worker starts with a copy of the state, and its changes are merged into the parent
+		base = state.snapshot()
+		state['houses'].merge_value('1', ['y'])
+		state['houses'].merge_value('2', ['z'])
+		state['dates'].merge_value('2', 'b')
+		state['catalogs'].merge_value('c', {1, 2})
+		state['counts'].merge_value('events', 3)
+		delta = state.delta(base)
+		self.assertEqual(delta['counts'], {'events': 3})
+		self.assertEqual(delta['catalogs'], {'c': {2}})
+
+		parent.merge(delta)
+		self.assertEqual(parent, state)
+
+	def test_store(self):
+		ctx = multiprocessing.get_context('fork')
+		with SharedStateStore(ctx=ctx) as store:
+			counts = CounterMap({'records': 1})
+			places = UnionMap()
+			counts_proxy = store.share(counts)
+			places_proxy = store.share(places)
+			procs = [ctx.Process(target=add_counts, args=(counts_proxy, places_proxy, n)) for n in (10, 20)]
+			for p in procs:
+				p.start()
+			for p in procs:
+				p.join()
+			self.assertEqual(counts_proxy['records'], 31)
+			restore_shared(counts, counts_proxy)
+			restore_shared(places, places_proxy)
+		self.assertEqual(counts, {'records': 31})
+		self.assertEqual(places, {'uri': {'urn:10', 'urn:20'}})
+
+
+if __name__ == '__main__':
+	unittest.main()
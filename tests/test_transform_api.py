@@ -0,0 +1,53 @@
+#!/usr/bin/env python3 -B
+import csv
+import json
+import unittest
+from pathlib import Path
+
+from tests import TestKnoedlerPipelineOutput, MODELS
+from pipeline.projects.knoedler import KnoedlerPipeline
+from pipeline.transform import Transformer, _reset_state, _state_contents, _track_state
+from pipeline.util.state import AppendMap, LastWriterMap, StateGroup
+
+class TestTransformAPI(TestKnoedlerPipelineOutput):
+	def read_rows(self, test_name):
+		rows = []
+		for f in sorted(Path(f'tests/data/knoedler/{test_name}').glob('knoedler_ar*')):
+			with open(f, newline='') as fh:
+				rows += list(csv.reader(fh))
+		return rows
+
+	def test_transform(self):
+		expected = self.run_pipeline('ar38')
+		transformer = Transformer(KnoedlerPipeline, data={'header_file': self.data['header_file']}, models=MODELS, debug=True, conceptual_only_parts=True)
+		rows = self.read_rows('ar38')
+		for _ in range(2):
+			# the warm pipeline produces the same output on each call
+			output = json.loads(json.dumps(transformer.transform(data=rows)))
+			self.assertEqual(output, expected)
+
+		with self.assertRaises(ValueError):
+			transformer.transform(contents=rows)
+
+	def test_reset_state(self):
+		state = StateGroup({'houses': AppendMap({'a': ['x'], 'b': ['y']}), 'dates': LastWriterMap({'a': 1})})
+		initial = _state_contents(state)
+		_track_state(state)
+		untouched = dict.__getitem__(state['houses'], 'b')
+
+		state['houses']['a'].append('z')
+		state['houses'].merge_value('c', ['w'])
+		state['dates']['a'] = 2
+		_reset_state(state, initial)
+		self.assertEqual(state.contents(), {'houses': {'a': ['x'], 'b': ['y']}, 'dates': {'a': 1}})
+		# only the values that may have been modified are copied back
+		self.assertIs(dict.__getitem__(state['houses'], 'b'), untouched)
+
+		for value in state['houses'].values():
+			value.append('v')
+		_reset_state(state, initial)
+		self.assertEqual(state.contents(), {'houses': {'a': ['x'], 'b': ['y']}, 'dates': {'a': 1}})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3 -B
+import json
+import time
+import threading
+import unittest
+import multiprocessing
+import urllib.request
+import urllib.error
+
+from tests import TestKnoedlerPipelineOutput, MODELS
+from pipeline.projects.knoedler import KnoedlerPipeline
+from pipeline.transform import Transformer
+from pipeline.server import ServiceBusy, TransformService, make_server, read_csv_rows
+
+class SlowTransformer:
+	def transform(self, delay=0):
+		time.sleep(delay)
+		return {}
+
+class TestTransformServer(TestKnoedlerPipelineOutput):
+	def request(self, server, path, data=None):
+		url = f'http://127.0.0.1:{server.server_address[1]}{path}'
+		body = json.dumps(data).encode('utf-8') if data is not None else None
+		try:
+			with urllib.request.urlopen(urllib.request.Request(url, data=body)) as response:
+				return response.status, json.loads(response.read())
+		except urllib.error.HTTPError as e:
+			return e.code, json.loads(e.read())
+
+	def test_server(self):
+		expected = self.run_pipeline('ar38')
+		transformer = Transformer(KnoedlerPipeline, data={'header_file': self.data['header_file']}, models=MODELS, debug=True, conceptual_only_parts=True)
+		rows = read_csv_rows('tests/data/knoedler/ar38', 'knoedler_ar*')
+
+		service = TransformService(transformer, workers=1, queue_size=0)
+		server = make_server('127.0.0.1:0', service)
+		thread = threading.Thread(target=server.serve_forever, daemon=True)
+		thread.start()
+		try:
+			status, output = self.request(server, '/transform', {'data': rows})
+			self.assertEqual(status, 200)
+			self.assertEqual(output, expected)
+
+			status, output = self.request(server, '/transform', {'contents': rows})
+			self.assertEqual(status, 400)
+
+			# with the only request slot taken, requests are rejected
+			service.slots.acquire()
+			status, output = self.request(server, '/transform', {'data': rows})
+			service.slots.release()
+			self.assertEqual(status, 503)
+
+			status, metrics = self.request(server, '/metrics')
+			self.assertEqual(status, 200)
+			self.assertEqual(metrics['requests'], 2)
+			self.assertEqual(metrics['errors'], 1)
+			self.assertEqual(metrics['rejected'], 1)
+			self.assertEqual(metrics['latency']['count'], 2)
+		finally:
+			server.shutdown()
+			server.server_close()
+			service.close()
+
+	def test_timeout(self):
+		service = TransformService(SlowTransformer(), workers=1, queue_size=0, timeout=0.1)
+		try:
+			with self.assertRaises(multiprocessing.TimeoutError):
+				service.transform({'delay': 1})
+			# the worker is still busy with the timed out request, so its slot is still taken
+			with self.assertRaises(ServiceBusy):
+				service.transform({})
+			time.sleep(1.5)
+			self.assertEqual(service.transform({}), {})
+		finally:
+			service.close()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3 -B
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cromulent import vocab
+import settings
+import pipeline.util
+from pipeline.linkedart import add_crom_data
+from pipeline.io.file import MergingFileWriter
+from pipeline.io.references import URIReferenceIndex
+
+PREFIX = 'tag:getty.edu,2019:digital:pipeline:REPLACE-WITH-UUID:sales#'
+
+class TestURIReferenceIndex(unittest.TestCase):
+	def test_writer_index(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			index_path = os.path.join(tmp, 'index')
+			with mock.patch.object(settings, 'uri_reference_index', index_path):
+				w = MergingFileWriter(directory=tmp, model='object')
+				for i in (1, 2, 3):
+					hmo = vocab.Painting(ident=f'{PREFIX}OBJ,{i}', label=f'Object {i}')
+					if i == 3:
+						hmo.referred_to_by = vocab.Note(ident=f'{PREFIX}OBJ,1-Note', content='Also sold')
+					w(add_crom_data(data={'uuid': f'000{i}'}, what=hmo))
+
+			index = URIReferenceIndex(index_path)
+			files = [os.path.basename(f) for f in index.locations([f'{PREFIX}OBJ,1'])]
+			self.assertEqual(files, ['0001.json'])
+			files = [os.path.basename(f) for f in index.locations([f'{PREFIX}OBJ,1'], prefix=True)]
+			self.assertEqual(files, ['0001.json', '0003.json'])
+			self.assertEqual(index.locations(['http://vocab.getty.edu/aat/300033618']), [])
+
+
+if __name__ == '__main__':
+	unittest.main()
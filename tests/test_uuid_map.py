@@ -0,0 +1,75 @@
+#!/usr/bin/env python3 -B
+import os
+import json
+import uuid
+import base64
+import tempfile
+import unittest
+
+from pipeline.util.uuid_map import read_uuid_map, export_uuid_map, uuid_map_log, harvest_uris, UUIDMapWriter
+from pipeline.util.rewriting import UUIDRewriter
+
+PREFIX = 'tag:getty.edu,2019:digital:pipeline:REPLACE-WITH-UUID:'
+MAPPED = uuid.UUID('981cb8d2-14b8-421a-8a2d-bfdfaaa80f82')
+
+class TestUUIDMap(unittest.TestCase):
+	def write(self, root, rel, data):
+		filename = os.path.join(root, rel)
+		os.makedirs(os.path.dirname(filename), exist_ok=True)
+		with open(filename, 'w') as fh:
+			json.dump(data, fh)
+
+	def test_harvest(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			out = os.path.join(tmp, 'output')
+			for i in range(20):
+				self.write(out, f'model-person/{i:02}/{i}.json', {
+					'id': f'{PREFIX}shared#PERSON,{i}',
+					'member_of': [{'id': f'{PREFIX}shared#GROUP,"Société"'}, {'id': f'{PREFIX}shared#PERSON,1'}],
+					'_label': f'{PREFIX}not a URI reference',
+					'content': f'Copied from {PREFIX}b#2 by hand',
+				})
+			known = {'shared#PERSON,1': base64.b64encode(MAPPED.bytes).decode('ascii')}
+			found = list(harvest_uris(PREFIX, out, known, processes=3, batch_size=4))
+			self.assertEqual(len(found), len(set(found)))
+			expected = {f'shared#PERSON,{i}' for i in range(20) if i != 1} | {'shared#GROUP,"Société"', 'not a URI reference'}
+			self.assertEqual(set(found), expected)
+
+	def test_append(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			map_file = os.path.join(tmp, 'uri_to_uuid_map.json')
+			legacy = {'aata#PERSON,1': base64.b64encode(MAPPED.bytes).decode('ascii')}
+			with open(map_file, 'w') as fh:
+				json.dump(legacy, fh)
+
+			# new assignments are appended to the log, leaving the JSON file unchanged
+			new = uuid.uuid4()
+			with UUIDMapWriter(map_file) as w:
+				w.append('aata#PERSON,2', new)
+			with open(map_file) as fh:
+				self.assertEqual(json.load(fh), legacy)
+			log = uuid_map_log(map_file)
+			size = os.path.getsize(log)
+
+			# a partly written record is dropped
+			with open(log, 'ab') as fh:
+				fh.write(b'\x00' * 10)
+			with UUIDMapWriter(map_file) as w:
+				w.append('aata#PERSON,3', MAPPED)
+			self.assertEqual(os.path.getsize(log), size + 20 + len('aata#PERSON,3'))
+
+			mapping = read_uuid_map(map_file)
+			self.assertEqual(sorted(mapping), ['aata#PERSON,1', 'aata#PERSON,2', 'aata#PERSON,3'])
+			r = UUIDRewriter(PREFIX, map_file)
+			self.assertEqual(r.uuid_for(f'{PREFIX}aata#PERSON,1'), str(MAPPED))
+			self.assertEqual(r.uuid_for(f'{PREFIX}aata#PERSON,2'), str(new))
+
+			# exporting folds the log into the JSON file
+			export_uuid_map(map_file)
+			self.assertFalse(os.path.exists(log))
+			with open(map_file) as fh:
+				self.assertEqual(json.load(fh), mapping)
+			self.assertEqual(read_uuid_map(map_file), mapping)
+
+if __name__ == '__main__':
+	unittest.main()
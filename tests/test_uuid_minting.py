@@ -0,0 +1,46 @@
+#!/usr/bin/env python3 -B
+import os
+import json
+import uuid
+import base64
+import tempfile
+import unittest
+from unittest import mock
+
+from cromulent import vocab
+import settings
+import pipeline.util
+from pipeline.linkedart import add_crom_data
+from pipeline.io.file import MergingFileWriter
+
+PREFIX = 'tag:getty.edu,2019:digital:pipeline:REPLACE-WITH-UUID:'
+MAPPED = uuid.UUID('981cb8d2-14b8-421a-8a2d-bfdfaaa80f82')
+
+class TestUUIDMinting(unittest.TestCase):
+	def test_minted_output(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			map_file = os.path.join(tmp, 'uri_to_uuid_map.json')
+			with open(map_file, 'w') as fh:
+				json.dump({'aata#PERSON,1': base64.b64encode(MAPPED.bytes).decode('ascii')}, fh)
+
+			out = os.path.join(tmp, 'output')
+			os.mkdir(out)
+			with mock.patch.multiple(settings, mint_uuids=True, uuid_map_file=map_file):
+				w = MergingFileWriter(directory=out, model='person', partition_directories=True)
+				p = vocab.Person(ident=f'{PREFIX}aata#PERSON,1', label='Greg')
+				w(add_crom_data(data={'uuid': '0001'}, what=p))
+				p = vocab.Person(ident=f'{PREFIX}aata#PERSON,1', label='Greg')
+				p.referred_to_by = vocab.Note(ident=f'{PREFIX}aata#NOTE,1', content='Note')
+				w(add_crom_data(data={'uuid': '0001'}, what=p))
+
+			files = [os.path.relpath(os.path.join(root, f), out) for root, _, fs in os.walk(out) for f in fs]
+			self.assertEqual(files, [f'person/98/{MAPPED}.json'])
+			with open(os.path.join(out, files[0])) as fh:
+				data = json.load(fh)
+			self.assertEqual(data['id'], f'urn:uuid:{MAPPED}')
+			note_uu = uuid.uuid3(uuid.NAMESPACE_URL, f'{PREFIX}aata#NOTE,1')
+			self.assertEqual(data['referred_to_by'][0]['id'], f'urn:uuid:{note_uu}')
+
+
+if __name__ == '__main__':
+	unittest.main()
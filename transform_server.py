@@ -0,0 +1,98 @@
+#!/usr/bin/env python3 -B
+
+'''
+Serve a warm pipeline that models the input rows POSTed to it (see `pipeline.server`):
+
+  ./transform_server.py [--listen HOST:PORT|SOCKET_PATH] [--workers N] [--queue N] PROJECT
+
+PROJECT is one of `sales`, `knoedler` or `people`. For the sales pipeline, the auction
+events and catalogs in the project data directory are loaded at startup, so that
+requests may consist of sales contents rows alone.
+'''
+
+import sys
+import time
+import argparse
+
+from pipeline.projects.sales import SalesPipeline
+from pipeline.projects.knoedler import KnoedlerPipeline
+from pipeline.projects.people import PeoplePipeline
+from pipeline.transform import Transformer
+from pipeline.server import TransformService, make_server, read_csv_rows
+from settings import project_data_path, arches_models, DEBUG
+
+PROJECTS = {
+	'sales': {
+		'class': SalesPipeline,
+		'sources': {
+			'catalogs': {
+				'header_file': 'sales_catalogs_info_0.csv',
+				'files_pattern': 'sales_catalogs_info.csv',
+			},
+			'auction_events': {
+				'header_file': 'sales_descriptions_0.csv',
+				'files_pattern': 'sales_descriptions.csv',
+			},
+			'contents': {
+				'header_file': 'sales_contents_0.csv',
+			},
+		},
+		'preload': ('auction_events', 'catalogs'),
+	},
+	'knoedler': {
+		'class': KnoedlerPipeline,
+		'sources': {
+			'data': {
+				'header_file': 'knoedler_0.csv',
+			},
+		},
+		'conceptual_only_parts': True,
+	},
+	'people': {
+		'class': PeoplePipeline,
+		'sources': {
+			'contents': {
+				'header_file': 'people_authority_0.csv',
+			},
+		},
+	},
+}
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Serve a warm pipeline that models POSTed input rows')
+	parser.add_argument('project', choices=sorted(PROJECTS), help='pipeline project')
+	parser.add_argument('--listen', default='127.0.0.1:8087', help='HOST:PORT to listen on, or the path of a Unix socket')
+	parser.add_argument('--workers', type=int, default=2, help='number of worker processes modeling requests')
+	parser.add_argument('--queue', type=int, default=8, help='number of requests that may wait for a free worker')
+	parser.add_argument('--timeout', type=float, default=60, help='seconds to wait for a request to be modeled')
+	parser.add_argument('--verbose', action='store_true', help='log each request')
+	args = parser.parse_args()
+
+	project = PROJECTS[args.project]
+	data_path = project_data_path(args.project)
+	sources = {name: {k: v for k, v in source.items() if k != 'files_pattern'} for name, source in project['sources'].items()}
+
+	start = time.time()
+	transformer = Transformer(
+		project['class'],
+		data_path,
+		conceptual_only_parts=project.get('conceptual_only_parts', False),
+		models=arches_models,
+		debug=DEBUG,
+		**sources
+	)
+	preload = {name: read_csv_rows(data_path, project['sources'][name]['files_pattern']) for name in project.get('preload', ())}
+	if preload:
+		transformer.preload(**preload)
+	print(f'Loaded the {args.project} pipeline in {time.time() - start:.1f}s', file=sys.stderr)
+
+	service = TransformService(transformer, workers=args.workers, queue_size=args.queue, timeout=args.timeout)
+	server = make_server(args.listen, service, verbose=args.verbose)
+	print(f'Listening on {args.listen}', file=sys.stderr)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		service.close()
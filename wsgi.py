@@ -6,17 +6,22 @@ import json
 import uuid
 import pathlib
 import itertools
+from urllib.parse import quote
 import settings
 import pprint
 from unidecode import unidecode
 from contextlib import suppress
 from pipeline.util import truncate_with_ellipsis
+from pipeline.io.output_index import OutputIndex
 from flask import Flask, escape, request
 
+PAGE_SIZE = 100
+
 class Builder:
-	def __init__(self, path):
+	def __init__(self, path, index):
 		self.counter = itertools.count()
 		self.path = path
+		self.index = index
 		self.seen = set()
 		self.class_styles = {
 					"HumanMadeObject": "object",
@@ -69,11 +74,11 @@ class Builder:
 		if uri.startswith('urn:uuid:'):
 			label = f'#{next(self.counter)}'
 			uu = uri[9:]
-			with suppress(StopIteration):
-				file = next(self.path.rglob(f'{uu}.json'))
-				if file:
-					label = self.normalize_string(label_from_file(file))
-					link = f'/{file.relative_to(self.path.parent)}'
+			entry = self.index.lookup(uu)
+			if entry:
+				_, path, file_label = entry
+				label = self.normalize_string(file_label)
+				link = f'/{self.path.name}/{path}'
 			return label, link
 		elif uri.startswith('http://vocab.getty.edu/'):
 			uri = uri.replace('http://vocab.getty.edu/', '')
@@ -185,36 +190,48 @@ class Builder:
 		'''.strip()
 		return s
 
-def label_from_file(p):
-	with open(p, 'r') as fh:
-		j = json.load(fh)
-		return j.get('_label', '')
-
 app = Flask(__name__)
 output_path = pathlib.Path(settings.output_file_path)
+index = OutputIndex(output_path, settings.output_index_path, settings.output_index_refresh)
 
 @app.route(f'/{output_path.name}/<string:model>/<path:file>')
 def render_file(model, file):
 	p = output_path / model / file
-	with open(p, 'r') as fh:
-		j = json.load(fh)
+	path = f'{model}/{file}'
+	index.refresh()
+	mtime = p.stat().st_mtime
+	page = index.cached_page(path, mtime)
+	if page is None:
+		with open(p, 'r') as fh:
+			j = json.load(fh)
 		title = j.get('_label', 'Model')
-		b = Builder(output_path)
-		return b.write_html(j, title=title)
+		b = Builder(output_path, index)
+		page = b.write_html(j, title=title)
+		index.cache_page(path, mtime, page)
+	return page
 
 @app.route(f'/{output_path.name}/<string:model>')
 def list_files(model):
-	p = output_path / model
-	files = p.rglob('*.json')
-	items = sorted([(label_from_file(s) or str(s), s.relative_to(output_path.parent)) for s in files])
-	items_html = ''.join([f'<li><a href="/{s}">{truncate_with_ellipsis(label, 100) or label}</a></li>\n' for label, s in items])
-	return f'<ul>{items_html}</ul>'
+	index.refresh()
+	query = request.args.get('q', '')
+	page = max(request.args.get('page', 1, type=int), 1)
+	total, files = index.files(model, query=query or None, offset=(page - 1) * PAGE_SIZE, limit=PAGE_SIZE)
+	pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+	items_html = ''.join([f'<li><a href="/{output_path.name}/{path}">{escape(truncate_with_ellipsis(label, 100) or label or uu)}</a></li>\n' for uu, path, label in files])
+	search_html = f'<form method="get"><input type="text" name="q" value="{escape(query)}"/> <input type="submit" value="Search"/></form>'
+	nav = []
+	if page > 1:
+		nav.append(f'<a href="?q={quote(query)}&amp;page={page - 1}">previous</a>')
+	nav.append(f'page {page} of {pages} ({total} files)')
+	if page < pages:
+		nav.append(f'<a href="?q={quote(query)}&amp;page={page + 1}">next</a>')
+	nav_html = f'<p>{" | ".join(nav)}</p>'
+	return f'{search_html}{nav_html}<ul>{items_html}</ul>{nav_html}'
 
 @app.route('/')
 def list_models():
-	p = output_path
-	models = [s.relative_to(output_path.parent) for s in p.glob('*') if s.is_dir()]
+	index.refresh()
 	names = {v: k for k, v in settings.arches_models.items()}
-	items = sorted([(names.get(s.name, str(s)), s) for s in models])
-	items_html = ''.join([f'<li><a href="/{s}">{label}</a></li>\n' for label, s in items])
+	items = sorted([(names.get(model, model), model, count) for model, count in index.models()])
+	items_html = ''.join([f'<li><a href="/{output_path.name}/{model}">{label}</a> ({count})</li>\n' for label, model, count in items])
 	return f'<ul>{items_html}</ul>'